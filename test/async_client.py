@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+New API平台异步客户端
+基于 aiohttp 的连接池客户端，复用 APIConfig 配置：
+- 有上限的 keep-alive 连接池（max_connections）
+- 可配置的并发上限（max_concurrency）
+- gather 风格的批量请求接口
+
+配合现有测试器的 build_request / parse_response，
+ParaformerTester、CosyVoiceTester、TextEmbeddingTester 可以并行运行，
+全量测试耗时从各请求耗时之和降低到约等于最慢的单次请求。
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+from dataclasses import dataclass
+
+import aiohttp
+
+from test_new_api_models import (
+    APIConfig,
+    ParaformerTester,
+    CosyVoiceTester,
+    TextEmbeddingTester,
+    TestRunner,
+    DEFAULT_EMBEDDING_TEXTS,
+    print_results,
+)
+from latency_metrics import MetricsRecorder, now_ns, ns_to_seconds, request_model
+from metrics_exporter import GATEWAY_METRICS, GatewayMetrics
+from traffic_capture import capture_from_env
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class APIResponse:
+    """异步请求的响应，接口与 requests.Response 的常用部分保持一致"""
+    status_code: int
+    headers: Dict[str, str]
+    content: bytes
+    elapsed: float = 0.0
+    url: str = ""
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+@dataclass
+class PoolConfig:
+    """连接池配置"""
+    max_connections: int = 32          # 连接池总上限
+    max_connections_per_host: int = 0  # 单主机上限，0 表示不单独限制
+    max_concurrency: int = 16          # 同时在途的请求数上限
+    keepalive_timeout: float = 30.0    # 空闲连接保活时间（秒）
+
+def _build_form_data(files: Dict[str, Any], data: Optional[Dict[str, Any]] = None) -> aiohttp.FormData:
+    """把 requests 风格的 files/data 参数转换为 aiohttp.FormData"""
+    form = aiohttp.FormData()
+    for name, value in (data or {}).items():
+        form.add_field(name, str(value))
+    for name, value in files.items():
+        if not isinstance(value, tuple):
+            form.add_field(name, value)
+            continue
+        filename, content = value[0], value[1]
+        content_type = value[2] if len(value) > 2 else None
+        if filename is None:
+            # (None, value) 形式表示普通表单字段
+            form.add_field(name, content if isinstance(content, (bytes, str)) else str(content))
+        else:
+            form.add_field(name, content, filename=filename, content_type=content_type)
+    return form
+
+async def _on_connection_create_start(session, trace_config_ctx, params):
+    trace_config_ctx.connect_start = now_ns()
+
+async def _on_connection_create_end(session, trace_config_ctx, params):
+    """新建连接（含 TLS 握手）的耗时记入请求计时器；复用连接时不会触发"""
+    timer = trace_config_ctx.trace_request_ctx
+    if timer is not None:
+        timer.connected(now_ns() - trace_config_ctx.connect_start)
+
+async def _on_request_chunk_sent(session, trace_config_ctx, params):
+    timer = trace_config_ctx.trace_request_ctx
+    if timer is not None:
+        timer.bytes_sent += len(params.chunk)
+
+class AsyncNewAPIClient:
+    """New API平台的异步OpenAI兼容客户端"""
+
+    def __init__(self, config: APIConfig, pool: Optional[PoolConfig] = None,
+                 metrics: Optional[MetricsRecorder] = None, exporter: Optional[GatewayMetrics] = None):
+        self.config = config
+        self.pool = pool or PoolConfig()
+        self.metrics = metrics if metrics is not None else MetricsRecorder()
+        self.exporter = exporter or GATEWAY_METRICS  # Prometheus 指标
+        self.capture = capture_from_env()            # 设置 NEW_API_CAPTURE 时录制请求
+        self.headers = {
+            "Authorization": f"Bearer {config.api_key}",
+            "Content-Type": "application/json"
+        }
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> "AsyncNewAPIClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """创建连接池（在事件循环内调用）"""
+        if self._session is not None:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.pool.max_connections,
+            limit_per_host=self.pool.max_connections_per_host,
+            keepalive_timeout=self.pool.keepalive_timeout,
+        )
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_start.append(_on_connection_create_start)
+        trace_config.on_connection_create_end.append(_on_connection_create_end)
+        trace_config.on_request_chunk_sent.append(_on_request_chunk_sent)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.config.timeout),
+            trace_configs=[trace_config],
+        )
+        self._semaphore = asyncio.Semaphore(self.pool.max_concurrency)
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            raise RuntimeError("客户端尚未打开，请使用 async with 或先调用 open()")
+        return self._session
+
+    def _url(self, endpoint: str) -> str:
+        return f"{self.config.base_url.rstrip('/')}/{endpoint.lstrip('/')}"
+
+    async def request(self, method: str, endpoint: str, **kwargs) -> APIResponse:
+        """发送HTTP请求，接受 requests 风格的 json/files/data/headers/params/timeout 参数"""
+        url = self._url(endpoint)
+        model = request_model(kwargs)
+        captured = self.capture.describe_request(method, endpoint, kwargs) if self.capture else None
+        headers = dict(kwargs.pop('headers', self.headers))
+        timeout = kwargs.pop('timeout', None)
+        files = kwargs.pop('files', None)
+
+        if files is not None:
+            kwargs['data'] = _build_form_data(files, kwargs.pop('data', None))
+            # multipart 请求的 Content-Type 由 aiohttp 生成
+            headers.pop('Content-Type', None)
+        if timeout is not None:
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+
+        async with self._semaphore:
+            logger.info(f"发送请求: {method} {url}")
+            # 计时从拿到并发许可后开始，不包含排队时间
+            timer = self.metrics.timer(model, endpoint)
+            self.exporter.request_started(model, endpoint)
+            status, received = 'error', 0
+            try:
+                async with self.session.request(method, url, headers=headers, trace_request_ctx=timer, **kwargs) as resp:
+                    timer.first_byte()
+                    content = await resp.read()
+                    response = APIResponse(
+                        status_code=resp.status,
+                        headers=dict(resp.headers),
+                        content=content,
+                        elapsed=timer.finish(),
+                        url=url,
+                    )
+                status, received = str(response.status_code), len(content)
+            except asyncio.TimeoutError:
+                status = 'timeout'
+                raise
+            finally:
+                elapsed = ns_to_seconds(now_ns() - timer.start_ns)
+                self.exporter.request_finished(model, endpoint, status, elapsed, timer.bytes_sent, received)
+                if captured is not None:
+                    self.capture.record_http(captured, timer.start_ns, status, elapsed, received)
+
+        if response.status_code != 200:
+            logger.error(f"请求失败: {response.status_code} - {response.text}")
+
+        return response
+
+    async def gather(self, calls: Iterable[Tuple[str, str, Dict[str, Any]]], return_exceptions: bool = True) -> List[Any]:
+        """批量并发发送 (method, endpoint, kwargs) 请求，结果顺序与输入一致"""
+        tasks = [self.request(method, endpoint, **kwargs) for method, endpoint, kwargs in calls]
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+
+    async def embeddings(self, texts: List[str], model: str = "text-embedding-v4", encoding_format: str = "base64"):
+        """请求文本嵌入并解码；base64 格式在 NumPy 可用时返回 (n, dim) 的 float32 矩阵"""
+        from embedding_codec import decode_embeddings
+
+        response = await self.request('POST', '/v1/embeddings', json={
+            'model': model,
+            'input': texts,
+            'encoding_format': encoding_format
+        })
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        return decode_embeddings(response.json().get('data', []), encoding_format)
+
+async def _run_tester(tester, build_args: tuple, parse_args: tuple = ()) -> Dict[str, Any]:
+    """用异步客户端执行测试器的 build_request / parse_response"""
+    try:
+        method, endpoint, kwargs = tester.build_request(*build_args)
+        start_time = time.perf_counter()
+        response = await tester.client.request(method, endpoint, **kwargs)
+        return tester.parse_response(response, time.perf_counter() - start_time, *parse_args)
+    except Exception as e:
+        logger.error(f"测试 {tester.model} 时发生异常: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e),
+            'model': tester.model
+        }
+
+async def _run_embedding_tester(tester: TextEmbeddingTester, texts: List[str]) -> Dict[str, Any]:
+    """嵌入测试：先查缓存，只请求未命中的文本"""
+    hits, misses = tester.lookup_cache(texts)
+    if not misses:
+        result = {'success': True, 'status_code': 200, 'response_time': 0.0, 'model': tester.model}
+    else:
+        result = await _run_tester(tester, (misses,), (misses,))
+    return tester.merge_cached(result, texts, hits)
+
+class AsyncTestRunner(TestRunner):
+    """并发测试运行器：三个模型测试同时进行"""
+
+    def __init__(self, config: APIConfig, pool: Optional[PoolConfig] = None, embedding_cache=None):
+        super().__init__(config, embedding_cache)
+        self.pool = pool or PoolConfig()
+
+    async def arun_all_tests(self, audio_file: str = None, test_text: str = None, embedding_texts: List[str] = None) -> Dict[str, Any]:
+        """并发运行所有模型测试"""
+        logger.info("开始并发运行全部模型测试")
+
+        test_text = test_text or "你好，这是CosyVoice语音合成测试。"
+        embedding_texts = embedding_texts or DEFAULT_EMBEDDING_TEXTS
+        voice = "zh-CN-XiaoxiaoNeural"
+
+        # 与同步客户端共用延迟记录，报告中一并输出
+        async with AsyncNewAPIClient(self.config, self.pool, metrics=self.client.metrics) as client:
+            paraformer_tester = ParaformerTester(client)
+            start_time = time.perf_counter()
+            try:
+                results = await asyncio.gather(
+                    _run_tester(paraformer_tester, (audio_file,)),
+                    _run_tester(CosyVoiceTester(client), (test_text, voice), (test_text, voice)),
+                    _run_embedding_tester(TextEmbeddingTester(client, cache=self.embedding_cache), embedding_texts),
+                )
+            finally:
+                paraformer_tester.close()
+            logger.info(f"并发测试完成，总耗时: {time.perf_counter() - start_time:.2f}秒")
+
+        self.results.extend(results)
+        return self.generate_report()
+
+    def run_all_tests(self, audio_file: str = None, test_text: str = None, embedding_texts: List[str] = None) -> Dict[str, Any]:
+        """同步入口，内部使用 asyncio.run"""
+        return asyncio.run(self.arun_all_tests(audio_file, test_text, embedding_texts))
+
+def main():
+    """主函数"""
+    print("🚀 New API 平台模型并发测试脚本")
+    print("支持模型: paraformer-realtime-8k-v2, cosyvoice-v2, text-embedding-v4")
+    print("-" * 60)
+
+    config = APIConfig(
+        base_url=os.getenv("NEW_API_BASE_URL", "http://127.0.0.1:3000"),
+        api_key=os.getenv("NEW_API_KEY", "sk-WFXP99kKWeu9BhV3UiypR6wj2tb2x5d08TLGWgiLHiDG9r8Q"),
+        timeout=60
+    )
+
+    runner = AsyncTestRunner(config, PoolConfig(max_connections=8, max_concurrency=8))
+
+    try:
+        report = runner.run_all_tests(
+            test_text='欢迎使用New API平台，这是一个语音合成测试。',
+            embedding_texts=[
+                'New API平台提供多种AI模型服务',
+                '语音识别和语音合成技术',
+                '文本嵌入向量化处理'
+            ]
+        )
+        print_results(report)
+    except KeyboardInterrupt:
+        print("\n\n⏹️  测试被用户中断")
+    except Exception as e:
+        logger.error(f"测试过程中发生异常: {str(e)}")
+        print(f"\n❌ 测试失败: {str(e)}")
+
+if __name__ == "__main__":
+    main()
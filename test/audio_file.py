@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存映射音频文件
+长录音（例如数小时的呼叫中心录音）不再整体读入内存：
+- mmap 只读映射文件，由操作系统按需换页
+- 解析 WAV 的 RIFF 块结构，定位 fmt / data 块
+- data 属性是整个文件的 memoryview，可直接作为 HTTP multipart 的文件内容
+- pcm 属性是 data 块的 memoryview，切片即可得到实时 WebSocket 帧，不复制数据
+"""
+
+import io
+import os
+import mmap
+import struct
+import logging
+from pathlib import Path
+from typing import Iterator, Optional, Union
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# WAV 编码格式
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+@dataclass
+class WavInfo:
+    """WAV 文件头信息"""
+    audio_format: int
+    num_channels: int
+    sample_rate: int
+    bits_per_sample: int
+    data_offset: int
+    data_size: int
+
+    @property
+    def sample_width(self) -> int:
+        return self.bits_per_sample // 8
+
+    @property
+    def bytes_per_second(self) -> int:
+        return self.sample_rate * self.num_channels * self.sample_width
+
+    @property
+    def duration(self) -> float:
+        return self.data_size / self.bytes_per_second if self.bytes_per_second else 0.0
+
+def parse_wav_header(buffer) -> WavInfo:
+    """
+    遍历 RIFF 块解析 WAV 头，支持 LIST 等附加块和 WAVE_FORMAT_EXTENSIBLE。
+    流式写出的文件 data 块长度可能为 0 或 0xFFFFFFFF，此时按文件剩余长度计算。
+    """
+    view = memoryview(buffer)
+    try:
+        if len(view) < 12 or view[0:4] != b'RIFF' or view[8:12] != b'WAVE':
+            raise ValueError("不是有效的 WAV 文件（缺少 RIFF/WAVE 标识）")
+
+        fmt = None
+        offset = 12
+        while offset + 8 <= len(view):
+            chunk_id = bytes(view[offset:offset + 4])
+            chunk_size = struct.unpack_from('<I', view, offset + 4)[0]
+            body = offset + 8
+
+            if chunk_id == b'fmt ':
+                audio_format, channels, sample_rate, _, _, bits = struct.unpack_from('<HHIIHH', view, body)
+                if audio_format == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                    # 扩展格式的真实编码在 SubFormat GUID 的前两个字节
+                    audio_format = struct.unpack_from('<H', view, body + 24)[0]
+                fmt = (audio_format, channels, sample_rate, bits)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError("WAV 文件的 data 块出现在 fmt 块之前")
+                available = len(view) - body
+                if chunk_size == 0 or chunk_size > available:
+                    chunk_size = available
+                return WavInfo(*fmt, data_offset=body, data_size=chunk_size)
+
+            # 块按 2 字节对齐
+            offset = body + chunk_size + (chunk_size & 1)
+
+        raise ValueError("WAV 文件中没有找到 data 块")
+    finally:
+        view.release()
+
+class MappedReader(io.RawIOBase):
+    """映射区域上的只读文件对象，供需要 read()/readinto() 的上传接口使用"""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = min(len(buffer), len(self._view) - self._pos)
+        if n <= 0:
+            return 0
+        buffer[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def getbuffer(self) -> memoryview:
+        """整个映射区域（与 io.BytesIO.getbuffer 一致），不复制数据"""
+        return self._view
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+class MappedAudioFile:
+    """只读内存映射的音频文件"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._data: Optional[memoryview] = None   # 整个文件的视图，打开时创建一次
+        self._pcm: Optional[memoryview] = None    # data 块的视图
+        self.info: Optional[WavInfo] = None
+        self.size = 0
+
+    def __enter__(self) -> "MappedAudioFile":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self) -> "MappedAudioFile":
+        if self._mmap is not None:
+            return self
+        self._file = open(self.path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        if self.size == 0:
+            # 空文件无法映射
+            self._mmap = b''
+        else:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+        try:
+            self.info = parse_wav_header(self._mmap)
+        except ValueError:
+            # 非 WAV 文件按原始 PCM 处理
+            self.info = None
+        self._data = memoryview(self._mmap)
+        self._pcm = (self._data[self.info.data_offset:self.info.data_offset + self.info.data_size]
+                     if self.info is not None else self._data)
+        logger.info(f"映射音频文件: {self.path} ({self.size} 字节"
+                    f"{f', {self.info.sample_rate}Hz, {self.info.duration:.1f}秒' if self.info else ''})")
+        return self
+
+    def close(self):
+        """释放缓存的 memoryview 并关闭映射"""
+        for view in (self._pcm, self._data):
+            if view is not None:
+                view.release()
+        self._data = self._pcm = None
+        if isinstance(self._mmap, mmap.mmap):
+            try:
+                self._mmap.close()
+            except BufferError:
+                logger.warning(f"{self.path} 仍有未释放的切片，映射将在回收时关闭")
+        self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _check_open(self):
+        if self._data is None:
+            raise RuntimeError("音频文件尚未打开")
+
+    @property
+    def is_wav(self) -> bool:
+        return self.info is not None
+
+    @property
+    def data(self) -> memoryview:
+        """整个文件（含文件头），用于 HTTP 上传"""
+        self._check_open()
+        return self._data
+
+    @property
+    def pcm(self) -> memoryview:
+        """音频采样数据（WAV 的 data 块；非 WAV 文件为整个文件）"""
+        self._check_open()
+        return self._pcm
+
+    def reader(self, pcm_only: bool = False) -> MappedReader:
+        """返回映射区域上的文件对象"""
+        return MappedReader(self.pcm if pcm_only else self.data)
+
+    def slices(self, chunk_bytes: int) -> Iterator[memoryview]:
+        """按固定大小切分 PCM，每个切片都是映射上的视图"""
+        pcm = self.pcm
+        for offset in range(0, len(pcm), chunk_bytes):
+            yield pcm[offset:offset + chunk_bytes]
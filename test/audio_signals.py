@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PCM16 测试信号生成器
+生成任意采样率的单声道 16-bit little-endian PCM：
+- sine：正弦波
+- chirp：线性扫频
+- noise：白噪声（固定种子，结果可复现）
+- silence：静音
+- speech_like：类语音信号（基频 + 谐波 + 音节包络 + 停顿）
+
+安装 NumPy 时走向量化路径，否则回退到标准库 array；
+生成结果按参数缓存，多个会话/长时间压测复用同一块缓冲区。
+"""
+
+import sys
+import math
+import random
+from array import array
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 16-bit 有符号最大值
+PCM16_MAX = 32767
+
+# 缓存的缓冲区数量上限
+CACHE_SIZE = 64
+
+def _num_samples(duration: float, sample_rate: int) -> int:
+    return int(sample_rate * duration)
+
+def _array_to_bytes(samples: array) -> bytes:
+    """array('h') 转为 little-endian 字节"""
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return samples.tobytes()
+
+def _numpy_to_bytes(samples) -> bytes:
+    """浮点样本（已缩放到 PCM16 范围）转为 little-endian 字节"""
+    return np.clip(samples, -PCM16_MAX, PCM16_MAX).astype('<i2').tobytes()
+
+@lru_cache(maxsize=CACHE_SIZE)
+def sine(frequency: float = 440.0, duration: float = 2.0, sample_rate: int = 16000, amplitude: float = 0.5) -> bytes:
+    """正弦波"""
+    n = _num_samples(duration, sample_rate)
+    scale = PCM16_MAX * amplitude
+
+    if np is not None:
+        t = np.arange(n, dtype=np.float64)
+        return _numpy_to_bytes(scale * np.sin(2 * np.pi * frequency / sample_rate * t))
+
+    # 整数频率时信号以 sample_rate / gcd(frequency, sample_rate) 个样本为周期，只计算一个周期再重复
+    if float(frequency).is_integer() and frequency > 0:
+        period = sample_rate // math.gcd(int(frequency), sample_rate)
+    else:
+        period = n
+    step = 2 * math.pi * frequency / sample_rate
+    one_period = array('h', (int(scale * math.sin(step * i)) for i in range(min(period, n))))
+    repeats, tail = divmod(n, len(one_period)) if one_period else (0, 0)
+    samples = one_period * repeats + one_period[:tail]
+    return _array_to_bytes(samples)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def chirp(start_frequency: float = 200.0, end_frequency: float = 4000.0, duration: float = 2.0,
+          sample_rate: int = 16000, amplitude: float = 0.5) -> bytes:
+    """线性扫频信号"""
+    n = _num_samples(duration, sample_rate)
+    scale = PCM16_MAX * amplitude
+    k = (end_frequency - start_frequency) / duration if duration > 0 else 0.0
+
+    if np is not None:
+        t = np.arange(n, dtype=np.float64) / sample_rate
+        return _numpy_to_bytes(scale * np.sin(2 * np.pi * (start_frequency * t + 0.5 * k * t * t)))
+
+    samples = array('h', (
+        int(scale * math.sin(2 * math.pi * (start_frequency * t + 0.5 * k * t * t)))
+        for t in (i / sample_rate for i in range(n))
+    ))
+    return _array_to_bytes(samples)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def noise(duration: float = 2.0, sample_rate: int = 16000, amplitude: float = 0.3, seed: int = 0) -> bytes:
+    """均匀分布白噪声，相同种子生成相同数据"""
+    n = _num_samples(duration, sample_rate)
+    scale = PCM16_MAX * amplitude
+
+    if np is not None:
+        rng = np.random.default_rng(seed)
+        return _numpy_to_bytes(rng.uniform(-scale, scale, n))
+
+    rng = random.Random(seed)
+    samples = array('h', (int(rng.uniform(-scale, scale)) for _ in range(n)))
+    return _array_to_bytes(samples)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def silence(duration: float = 2.0, sample_rate: int = 16000) -> bytes:
+    """静音"""
+    return bytes(_num_samples(duration, sample_rate) * 2)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def speech_like(duration: float = 2.0, sample_rate: int = 16000, amplitude: float = 0.5,
+                pitch: float = 150.0, syllable_rate: float = 4.0, seed: int = 0) -> bytes:
+    """
+    类语音信号：带颤音的基频及其衰减谐波，乘以按音节节奏起伏的包络，
+    并随机插入停顿，能量分布和断续特征接近真实语音，便于触发 VAD
+    """
+    n = _num_samples(duration, sample_rate)
+    scale = PCM16_MAX * amplitude
+    harmonics = (1.0, 0.6, 0.35, 0.2, 0.1)
+    norm = sum(harmonics)
+    rng = random.Random(seed)
+    # 每个音节是否为停顿（约 20% 的音节静音）
+    syllables = int(duration * syllable_rate) + 1
+    voiced = [rng.random() > 0.2 for _ in range(syllables)]
+
+    if np is not None:
+        t = np.arange(n, dtype=np.float64) / sample_rate
+        # 5 Hz 颤音对基频做 ±3% 调制，相位取积分
+        phase = 2 * np.pi * pitch * (t - 0.03 / (2 * np.pi * 5.0) * np.cos(2 * np.pi * 5.0 * t))
+        signal = sum(weight * np.sin((index + 1) * phase) for index, weight in enumerate(harmonics)) / norm
+        envelope = np.sin(np.pi * ((t * syllable_rate) % 1.0)) ** 2
+        envelope *= np.asarray(voiced, dtype=np.float64)[(t * syllable_rate).astype(np.int64)]
+        return _numpy_to_bytes(scale * signal * envelope)
+
+    samples = array('h', bytes(n * 2))
+    for i in range(n):
+        t = i / sample_rate
+        position = t * syllable_rate
+        if not voiced[int(position)]:
+            continue
+        phase = 2 * math.pi * pitch * (t - 0.03 / (2 * math.pi * 5.0) * math.cos(2 * math.pi * 5.0 * t))
+        value = sum(weight * math.sin((index + 1) * phase) for index, weight in enumerate(harmonics)) / norm
+        samples[i] = int(scale * value * math.sin(math.pi * (position % 1.0)) ** 2)
+    return _array_to_bytes(samples)
+
+def wav_header(sample_rate: int, num_channels: int, bits_per_sample: int, data_size: int) -> bytes:
+    """创建 44 字节的 PCM WAV 文件头"""
+    byte_rate = sample_rate * num_channels * bits_per_sample // 8
+    block_align = num_channels * bits_per_sample // 8
+
+    header = b'RIFF'
+    header += (36 + data_size).to_bytes(4, byteorder='little')
+    header += b'WAVE'
+    header += b'fmt '
+    header += (16).to_bytes(4, byteorder='little')  # fmt chunk size
+    header += (1).to_bytes(2, byteorder='little')   # audio format (PCM)
+    header += num_channels.to_bytes(2, byteorder='little')
+    header += sample_rate.to_bytes(4, byteorder='little')
+    header += byte_rate.to_bytes(4, byteorder='little')
+    header += block_align.to_bytes(2, byteorder='little')
+    header += bits_per_sample.to_bytes(2, byteorder='little')
+    header += b'data'
+    header += data_size.to_bytes(4, byteorder='little')
+
+    return header
+
+def to_wav(pcm: bytes, sample_rate: int = 16000) -> bytes:
+    """给单声道 PCM16 数据加上 WAV 文件头"""
+    return wav_header(sample_rate, 1, 16, len(pcm)) + pcm
+
+def clear_cache():
+    """清空所有生成器的缓存"""
+    for generator in (sine, chirp, noise, silence, speech_like):
+        generator.cache_clear()
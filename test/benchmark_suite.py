@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试套件
+按固定的工作负载矩阵（模型 × 请求体大小 × 并发数）运行压测，
+结果按网关版本（仓库根目录的 VERSION 文件）存入基线库，升级网关后与旧版本基线对比：
+- 每个矩阵单元保存延迟样本和逐秒吞吐样本
+- 用 bootstrap 重采样计算 p50/p99 延迟和吞吐变化的置信区间
+- 变化幅度超过阈值且置信区间不包含 0 时判定为回归，命令行以非零状态码退出，可直接用作 CI 门禁
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Callable, Sequence, Tuple
+from dataclasses import dataclass, field
+
+import audio_signals
+from test_new_api_models import (
+    APIConfig,
+    ParaformerTester,
+    CosyVoiceTester,
+    TextEmbeddingTester,
+)
+from async_client import AsyncNewAPIClient, PoolConfig
+from load_runner import LoadConfig, LoadRunner, RequestFactory
+from latency_metrics import percentile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+VERSION_FILE = Path(__file__).resolve().parent.parent / "VERSION"
+
+# 各模型的请求体规格：名称 -> 参数
+#   paraformer：音频时长（秒），cosyvoice：文本字数，embedding：(条数, 每条字数)
+PAYLOADS: Dict[str, Dict[str, Any]] = {
+    "paraformer-realtime-8k-v2": {"small": 1.0, "medium": 5.0, "large": 30.0},
+    "cosyvoice-v2": {"small": 20, "medium": 200, "large": 1000},
+    "text-embedding-v4": {"small": (1, 20), "medium": (10, 200), "large": (10, 2000)},
+}
+
+SAMPLE_TEXT = "New API平台提供语音识别、语音合成和文本嵌入等多种模型服务。"
+
+def read_version(path: Path = VERSION_FILE) -> str:
+    """读取网关版本号"""
+    try:
+        return path.read_text(encoding='utf-8').strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+def _repeat_text(length: int) -> str:
+    return (SAMPLE_TEXT * (length // len(SAMPLE_TEXT) + 1))[:length]
+
+def build_payload_factory(client, model: str, payload: str) -> RequestFactory:
+    """按模型和请求体规格构建请求工厂；语音识别的流式请求体每次请求重新构建"""
+    spec = PAYLOADS[model][payload]
+    if model == "paraformer-realtime-8k-v2":
+        audio = audio_signals.to_wav(audio_signals.speech_like(spec, 8000), 8000)
+        tester = ParaformerTester(client)
+        return lambda: tester.build_request(audio_data=audio)
+    if model == "cosyvoice-v2":
+        request = CosyVoiceTester(client).build_request(_repeat_text(spec))
+    elif model == "text-embedding-v4":
+        count, length = spec
+        texts = [f"{i}. {_repeat_text(length)}" for i in range(count)]
+        request = TextEmbeddingTester(client).build_request(texts)
+    else:
+        raise ValueError(f"不支持的模型: {model}")
+    return lambda: request
+
+@dataclass(frozen=True)
+class WorkloadCell:
+    """工作负载矩阵中的一个单元"""
+    model: str
+    payload: str
+    concurrency: int
+
+    @property
+    def cell_id(self) -> str:
+        return f"{self.model}|{self.payload}|c{self.concurrency}"
+
+@dataclass
+class BenchmarkConfig:
+    """基准测试配置"""
+    models: List[str] = field(default_factory=lambda: list(PAYLOADS))
+    payloads: List[str] = field(default_factory=lambda: ["small", "medium", "large"])
+    concurrencies: List[int] = field(default_factory=lambda: [1, 4, 16])
+    duration: float = 15.0            # 每个单元的压测时长（秒）
+    warmup: float = 2.0               # 每个单元正式计时前的预热时长（秒），结果不计入
+    max_samples: int = 2000           # 每个单元最多保存的延迟样本数
+    bootstrap_resamples: int = 1000
+    confidence: float = 0.95
+    min_effect: float = 0.05          # 相对变化超过该比例才可能判定为回归
+    seed: int = 0
+
+    def cells(self) -> List[WorkloadCell]:
+        return [WorkloadCell(model, payload, concurrency)
+                for model in self.models
+                for payload in self.payloads if payload in PAYLOADS.get(model, {})
+                for concurrency in self.concurrencies]
+
+class BaselineStore:
+    """按版本保存的基线：<root>/<version>.json"""
+
+    def __init__(self, root="test_outputs/benchmarks"):
+        self.root = Path(root)
+
+    def path(self, version: str) -> Path:
+        return self.root / f"{version}.json"
+
+    def save(self, run: Dict[str, Any]) -> Path:
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.path(run['version'])
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(run, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info(f"💾 基线已保存: {path}")
+        return path
+
+    def load(self, version: str) -> Dict[str, Any]:
+        with open(self.path(version), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def versions(self) -> List[str]:
+        """已保存的版本，按保存时间排序"""
+        if not self.root.exists():
+            return []
+        return [p.stem for p in sorted(self.root.glob('*.json'), key=lambda p: p.stat().st_mtime)]
+
+    def latest_other(self, version: str) -> Optional[str]:
+        """除当前版本外最近保存的基线"""
+        others = [v for v in self.versions() if v != version]
+        return others[-1] if others else None
+
+# ---- 统计 ----
+
+def _p50(values: Sequence[float]) -> float:
+    return percentile(sorted(values), 50)
+
+def _p99(values: Sequence[float]) -> float:
+    return percentile(sorted(values), 99)
+
+def _mean(values: Sequence[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+# 指标名 -> (样本字段, 统计函数, NumPy 百分位（None 表示均值）, 数值越大越差)
+METRICS: Dict[str, Tuple[str, Callable, Optional[float], bool]] = {
+    'latency_p50_ms': ('latency_samples', _p50, 50, True),
+    'latency_p99_ms': ('latency_samples', _p99, 99, True),
+    'throughput_rps': ('throughput_samples', _mean, None, False),
+}
+
+def bootstrap_difference(baseline: Sequence[float], current: Sequence[float], statistic: Callable,
+                         np_percentile: Optional[float], resamples: int, confidence: float,
+                         seed: int) -> Dict[str, float]:
+    """两组样本统计量之差（current - baseline）的 bootstrap 置信区间"""
+    base_value = statistic(baseline)
+    current_value = statistic(current)
+    alpha = (1 - confidence) / 2
+
+    if np is not None:
+        rng = np.random.default_rng(seed)
+        base = np.asarray(baseline, dtype=float)
+        cur = np.asarray(current, dtype=float)
+        base_samples = base[rng.integers(0, len(base), (resamples, len(base)))]
+        cur_samples = cur[rng.integers(0, len(cur), (resamples, len(cur)))]
+        if np_percentile is None:
+            diffs = cur_samples.mean(axis=1) - base_samples.mean(axis=1)
+        else:
+            # 与 load_runner.percentile 相同的最近秩法
+            def rank_of(n: int) -> int:
+                return min(n, max(1, math.ceil(np_percentile / 100.0 * n))) - 1
+            diffs = (np.sort(cur_samples, axis=1)[:, rank_of(len(cur))]
+                     - np.sort(base_samples, axis=1)[:, rank_of(len(base))])
+        low, high = np.quantile(diffs, [alpha, 1 - alpha])
+    else:
+        rng = random.Random(seed)
+        diffs = sorted(statistic(rng.choices(current, k=len(current)))
+                       - statistic(rng.choices(baseline, k=len(baseline)))
+                       for _ in range(resamples))
+        low = percentile(diffs, alpha * 100)
+        high = percentile(diffs, (1 - alpha) * 100)
+
+    return {
+        'baseline': round(base_value, 3),
+        'current': round(current_value, 3),
+        'difference': round(current_value - base_value, 3),
+        'ci_low': round(float(low), 3),
+        'ci_high': round(float(high), 3),
+        'relative_change': round((current_value - base_value) / base_value, 4) if base_value else 0.0,
+    }
+
+def compare_runs(baseline_run: Dict[str, Any], current_run: Dict[str, Any],
+                 config: BenchmarkConfig) -> Dict[str, Any]:
+    """逐单元对比两次运行，返回对比结果和回归列表"""
+    comparisons = []
+    regressions = []
+    for cell_id, current in current_run['cells'].items():
+        baseline = baseline_run['cells'].get(cell_id)
+        if baseline is None:
+            continue
+        cell = {'cell': cell_id, 'metrics': {}}
+        for index, (name, (sample_key, statistic, np_pct, higher_is_worse)) in enumerate(METRICS.items()):
+            if not baseline.get(sample_key) or not current.get(sample_key):
+                continue
+            result = bootstrap_difference(baseline[sample_key], current[sample_key], statistic, np_pct,
+                                          config.bootstrap_resamples, config.confidence, config.seed + index)
+            worse = result['relative_change'] > config.min_effect if higher_is_worse \
+                else result['relative_change'] < -config.min_effect
+            significant = result['ci_low'] > 0 if higher_is_worse else result['ci_high'] < 0
+            result['regression'] = bool(worse and significant)
+            cell['metrics'][name] = result
+            if result['regression']:
+                regressions.append(f"{cell_id} {name}: {result['baseline']} -> {result['current']} "
+                                   f"({result['relative_change'] * 100:+.1f}%, "
+                                   f"{int(config.confidence * 100)}% CI [{result['ci_low']}, {result['ci_high']}])")
+        comparisons.append(cell)
+
+    return {
+        'baseline_version': baseline_run['version'],
+        'current_version': current_run['version'],
+        'confidence': config.confidence,
+        'min_effect': config.min_effect,
+        'cells': comparisons,
+        'regressions': regressions,
+        'passed': not regressions,
+    }
+
+# ---- 执行 ----
+
+class BenchmarkSuite:
+    """运行工作负载矩阵"""
+
+    def __init__(self, api_config: APIConfig, config: Optional[BenchmarkConfig] = None,
+                 version: Optional[str] = None):
+        self.api_config = api_config
+        self.config = config or BenchmarkConfig()
+        self.version = version or read_version()
+        self.rng = random.Random(self.config.seed)
+
+    async def _run_cell(self, client: AsyncNewAPIClient, cell: WorkloadCell) -> Dict[str, Any]:
+        factory = build_payload_factory(client, cell.model, cell.payload)
+
+        if self.config.warmup > 0:
+            await LoadRunner(client, LoadConfig(virtual_users=cell.concurrency, duration=self.config.warmup)).run(factory)
+
+        load_config = LoadConfig(virtual_users=cell.concurrency, duration=self.config.duration)
+        stats = await LoadRunner(client, load_config).run(factory)
+        summary = stats.summary(1.0)
+
+        latencies = [round(lat * 1000, 3) for _, lat, status in stats.samples if status == '200']
+        if len(latencies) > self.config.max_samples:
+            latencies = self.rng.sample(latencies, self.config.max_samples)
+        # 逐秒成功请求数作为吞吐样本（最后一个不完整的区间不计入）
+        throughput = [point['requests'] - point['errors'] for point in summary['time_series']
+                      if point['t'] + 1.0 <= summary['duration']]
+
+        logger.info(f"📏 {cell.cell_id}: {summary['requests_per_second']} req/s, "
+                    f"p50 {summary['latency']['p50_ms']}ms, p99 {summary['latency']['p99_ms']}ms")
+        return {
+            'model': cell.model,
+            'payload': cell.payload,
+            'concurrency': cell.concurrency,
+            'summary': {k: v for k, v in summary.items() if k != 'time_series'},
+            'latency_samples': latencies,
+            'throughput_samples': throughput,
+        }
+
+    async def arun(self) -> Dict[str, Any]:
+        cells = self.config.cells()
+        max_concurrency = max(self.config.concurrencies)
+        logger.info(f"🏁 基准测试 {self.version}: {len(cells)} 个单元，每个 {self.config.duration}秒")
+        pool = PoolConfig(max_connections=max_concurrency, max_concurrency=max_concurrency)
+        results = {}
+        async with AsyncNewAPIClient(self.api_config, pool) as client:
+            for cell in cells:
+                results[cell.cell_id] = await self._run_cell(client, cell)
+        return {
+            'version': self.version,
+            'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'base_url': self.api_config.base_url,
+            'config': {
+                'duration': self.config.duration,
+                'warmup': self.config.warmup,
+                'concurrencies': self.config.concurrencies,
+                'payloads': self.config.payloads,
+            },
+            'cells': results,
+        }
+
+    def run(self) -> Dict[str, Any]:
+        return asyncio.run(self.arun())
+
+def print_comparison(comparison: Dict[str, Any]):
+    """打印对比结果"""
+    print("\n" + "=" * 60)
+    print(f"📊 基准对比: {comparison['baseline_version']} -> {comparison['current_version']}")
+    print("=" * 60)
+    for cell in comparison['cells']:
+        print(f"\n🔹 {cell['cell']}")
+        for name, result in cell['metrics'].items():
+            flag = "❌ 回归" if result['regression'] else "✅"
+            print(f"   {flag} {name}: {result['baseline']} -> {result['current']} "
+                  f"({result['relative_change'] * 100:+.1f}%, CI [{result['ci_low']}, {result['ci_high']}])")
+    print("\n" + "=" * 60)
+    if comparison['passed']:
+        print("🎉 未发现显著回归")
+    else:
+        print(f"⚠️  发现 {len(comparison['regressions'])} 项显著回归:")
+        for line in comparison['regressions']:
+            print(f"   - {line}")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="New API 基准测试套件")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help="运行工作负载矩阵")
+    run_parser.add_argument('--base-url', default=os.getenv("NEW_API_BASE_URL", "http://127.0.0.1:3000"))
+    run_parser.add_argument('--version', default=None, help="网关版本，默认读取 VERSION 文件")
+    run_parser.add_argument('--model', action='append', help="只测指定模型，可重复")
+    run_parser.add_argument('--payload', action='append', help="只测指定请求体规格（small/medium/large），可重复")
+    run_parser.add_argument('--concurrency', type=int, action='append', help="并发数，可重复")
+    run_parser.add_argument('--duration', type=float, default=15.0)
+    run_parser.add_argument('--warmup', type=float, default=2.0)
+    run_parser.add_argument('--save', action='store_true', help="保存为当前版本的基线")
+    run_parser.add_argument('--compare-to', default=None, help="对比的基线版本，默认为最近保存的其他版本")
+
+    compare_parser = sub.add_parser('compare', help="对比两个已保存的基线")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+
+    sub.add_parser('list', help="列出已保存的基线版本")
+
+    for p in (run_parser, compare_parser):
+        p.add_argument('--min-effect', type=float, default=0.05, help="判定回归的最小相对变化")
+        p.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--store', default="test_outputs/benchmarks", help="基线目录")
+    args = parser.parse_args()
+
+    store = BaselineStore(args.store)
+    if args.command == 'list':
+        for version in store.versions():
+            print(version)
+        return
+
+    config = BenchmarkConfig(min_effect=args.min_effect, confidence=args.confidence)
+    if args.command == 'compare':
+        comparison = compare_runs(store.load(args.baseline), store.load(args.current), config)
+    else:
+        if args.model:
+            config.models = args.model
+        if args.payload:
+            config.payloads = args.payload
+        if args.concurrency:
+            config.concurrencies = args.concurrency
+        config.duration = args.duration
+        config.warmup = args.warmup
+
+        api_config = APIConfig(
+            base_url=args.base_url,
+            api_key=os.getenv("NEW_API_KEY", "sk-WFXP99kKWeu9BhV3UiypR6wj2tb2x5d08TLGWgiLHiDG9r8Q"),
+            timeout=60
+        )
+        current = BenchmarkSuite(api_config, config, args.version).run()
+        baseline_version = args.compare_to or store.latest_other(current['version'])
+        if args.save:
+            store.save(current)
+        if baseline_version is None:
+            print("📝 没有可对比的其他版本基线" + ("，已保存当前结果" if args.save else "，使用 --save 保存为基线"))
+            return
+        comparison = compare_runs(store.load(baseline_version), current, config)
+
+    print_comparison(comparison)
+    sys.exit(0 if comparison['passed'] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自适应并发探测：自动寻找网关的饱和拐点
+对每个模型以闭环虚拟用户（load_runner.LoadRunner）逐档施压，每档观察 p99 延迟和错误率：
+- step：并发按倍数递增，越过拐点后在最后一个健康档和第一个不健康档之间二分细化
+- aimd：健康时加性增加并发，不健康时乘性减少，回退若干次后停止
+
+健康判定：错误率（含 429/5xx/超时）不超过上限，且 p99 不超过 --p99-ms
+（未指定时取最低并发档 p99 的 --latency-factor 倍）。
+拐点：比任何不健康档都低的健康档中，吞吐达到最大吞吐 (1 - plateau_tolerance) 的最小并发——
+再加并发只会增加排队延迟而不会增加吞吐。拐点处的吞吐可直接作为渠道限速的参考值。
+
+用法：
+    python3 concurrency_finder.py --workload embedding --workload tts --step-duration 10
+    python3 concurrency_finder.py --strategy aimd --workload image --step-duration 60 --p99-ms 30000
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import logging
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+
+from test_new_api_models import APIConfig
+from async_client import AsyncNewAPIClient, PoolConfig
+from load_runner import LoadConfig, LoadRunner, RequestFactory, build_model_factories
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 工作负载 -> 模型
+WORKLOADS = {
+    'embedding': 'text-embedding-v4',
+    'tts': 'cosyvoice-v2',
+    'asr': 'paraformer-realtime-8k-v2',
+    'image': 'wanx2.1-t2i-turbo',
+}
+
+def image_request_factory(model: str = WORKLOADS['image'], prompt: str = "一只可爱的小猫在花园里玩耍") -> RequestFactory:
+    """与 WanxModelTester.test_image_generation 相同的请求体"""
+    request = ('POST', '/v1/images/generations', {'json': {
+        "model": model,
+        "prompt": prompt,
+        "n": 1,
+        "size": "1024x1024",
+        "quality": "standard",
+        "response_format": "url"
+    }})
+    return lambda: request
+
+@dataclass
+class FinderConfig:
+    """并发探测配置"""
+    strategy: str = "step"                 # step | aimd
+    start: int = 1                         # 起始并发
+    max_concurrency: int = 256             # 并发上限
+    step_duration: float = 10.0            # 每档持续时间（秒）
+    cooldown: float = 1.0                  # 档间间隔（秒）
+    growth_factor: float = 2.0             # step：每档并发乘数
+    refine_steps: int = 3                  # step：越过拐点后的二分细化次数
+    additive_increase: int = 2             # aimd：加性增量
+    decrease_factor: float = 0.5           # aimd：乘性减少系数
+    aimd_backoffs: int = 3                 # aimd：回退次数达到后停止
+    max_steps: int = 20                    # 每个模型最多测量的档数
+    p99_limit_ms: Optional[float] = None   # p99 上限（毫秒），None 表示相对最低并发档
+    latency_factor: float = 3.0            # 相对模式下 p99 上限 = 最低并发档 p99 × 该倍数
+    max_error_rate: float = 0.01           # 错误率上限
+    plateau_tolerance: float = 0.05        # 吞吐增长低于该比例视为平台期
+    min_requests: int = 20                 # 每档样本数低于该值时在结果中标记
+
+    def __post_init__(self):
+        if self.strategy not in ('step', 'aimd'):
+            raise ValueError(f"未知策略 {self.strategy}，可选: step, aimd")
+
+@dataclass
+class StepResult:
+    """一档并发的测量结果"""
+    concurrency: int
+    requests: int = 0
+    goodput: float = 0.0                   # 每秒成功请求数
+    p50_ms: float = 0.0
+    p99_ms: float = 0.0
+    error_rate: float = 0.0
+    healthy: bool = True
+    reason: str = ""
+    low_sample: bool = False
+    errors_by_status: Dict[str, int] = field(default_factory=dict)
+
+class ConcurrencyFinder:
+    """单个模型的并发拐点搜索"""
+
+    def __init__(self, client: AsyncNewAPIClient, config: FinderConfig):
+        self.client = client
+        self.config = config
+        self.p99_limit_ms: Optional[float] = config.p99_limit_ms
+
+    async def measure(self, factory: RequestFactory, concurrency: int) -> StepResult:
+        """以给定并发闭环压测一档"""
+        load_config = LoadConfig(virtual_users=concurrency, duration=self.config.step_duration)
+        stats = await LoadRunner(self.client, load_config).run(factory)
+        summary = stats.summary()
+        total = summary['total_requests']
+        step = StepResult(
+            concurrency=concurrency,
+            requests=total,
+            goodput=round(summary['successful_requests'] / max(summary['duration'], 1e-9), 2),
+            p50_ms=summary['latency']['p50_ms'],
+            p99_ms=summary['latency']['p99_ms'],
+            error_rate=round(summary['failed_requests'] / total, 4) if total else 1.0,
+            low_sample=total < self.config.min_requests,
+            errors_by_status=summary['errors_by_status'],
+        )
+        self._judge(step)
+        logger.info(f"   并发 {concurrency:>4}: {step.goodput} req/s, p50 {step.p50_ms}ms, p99 {step.p99_ms}ms, "
+                    f"错误率 {step.error_rate:.2%} {'✅' if step.healthy else '❌ ' + step.reason}")
+        if self.config.cooldown > 0:
+            await asyncio.sleep(self.config.cooldown)
+        return step
+
+    def _judge(self, step: StepResult):
+        """按错误率和 p99 判定健康；第一档确定相对 p99 上限"""
+        if step.requests == 0 or step.error_rate > self.config.max_error_rate:
+            step.healthy, step.reason = False, f"错误率 {step.error_rate:.2%}"
+            return
+        if self.p99_limit_ms is None:
+            self.p99_limit_ms = round(step.p99_ms * self.config.latency_factor, 2)
+            logger.info(f"   p99 上限取基线 {step.p99_ms}ms × {self.config.latency_factor} = {self.p99_limit_ms}ms")
+        if step.p99_ms > self.p99_limit_ms:
+            step.healthy, step.reason = False, f"p99 {step.p99_ms}ms > {self.p99_limit_ms}ms"
+
+    async def _search_step(self, factory: RequestFactory) -> List[StepResult]:
+        config = self.config
+        steps: List[StepResult] = []
+        concurrency = config.start
+        last_good: Optional[StepResult] = None
+        first_bad: Optional[int] = None
+        plateaus = 0
+        while len(steps) < config.max_steps:
+            step = await self.measure(factory, concurrency)
+            steps.append(step)
+            if not step.healthy:
+                first_bad = concurrency
+                break
+            if last_good is not None and step.goodput < last_good.goodput * (1 + config.plateau_tolerance):
+                plateaus += 1
+                if plateaus >= 2:
+                    logger.info("   吞吐连续两档不再增长，停止加压")
+                    break
+            else:
+                plateaus = 0
+            last_good = step
+            if concurrency >= config.max_concurrency:
+                break
+            concurrency = min(config.max_concurrency, max(concurrency + 1, math.ceil(concurrency * config.growth_factor)))
+
+        # 在最后一个健康档和第一个不健康档之间二分
+        if first_bad is not None and last_good is not None:
+            low, high = last_good.concurrency, first_bad
+            for _ in range(config.refine_steps):
+                middle = (low + high) // 2
+                if middle in (low, high) or len(steps) >= config.max_steps:
+                    break
+                step = await self.measure(factory, middle)
+                steps.append(step)
+                if step.healthy:
+                    low = middle
+                else:
+                    high = middle
+        return steps
+
+    async def _search_aimd(self, factory: RequestFactory) -> List[StepResult]:
+        config = self.config
+        steps: List[StepResult] = []
+        concurrency = config.start
+        backoffs = 0
+        while len(steps) < config.max_steps and backoffs < config.aimd_backoffs:
+            step = await self.measure(factory, concurrency)
+            steps.append(step)
+            if step.healthy:
+                concurrency = min(config.max_concurrency, concurrency + config.additive_increase)
+            else:
+                backoffs += 1
+                concurrency = max(1, math.floor(concurrency * config.decrease_factor))
+        return steps
+
+    def knee(self, steps: List[StepResult]) -> Optional[StepResult]:
+        """低于所有不健康档的健康档中，吞吐接近最大值的最小并发"""
+        saturated = min((s.concurrency for s in steps if not s.healthy), default=math.inf)
+        candidates = [s for s in steps if s.healthy and s.concurrency < saturated]
+        if not candidates:
+            return None
+        best = max(s.goodput for s in candidates)
+        return min((s for s in candidates if s.goodput >= best * (1 - self.config.plateau_tolerance)),
+                   key=lambda s: s.concurrency)
+
+    async def find(self, model: str, factory: RequestFactory) -> Dict[str, Any]:
+        """搜索一个模型的拐点并汇总"""
+        logger.info(f"🔍 {model}: {self.config.strategy} 策略，每档 {self.config.step_duration}s")
+        search = self._search_step if self.config.strategy == 'step' else self._search_aimd
+        steps = await search(factory)
+        knee = self.knee(steps)
+        saturated = min((s.concurrency for s in steps if not s.healthy), default=None)
+        return {
+            'model': model,
+            'strategy': self.config.strategy,
+            'knee': asdict(knee) if knee is not None else None,
+            'saturated_at': saturated,
+            'p99_limit_ms': self.p99_limit_ms,
+            'max_error_rate': self.config.max_error_rate,
+            'steps': [asdict(s) for s in steps],
+        }
+
+async def find_knees(api_config: APIConfig, config: FinderConfig, workloads: List[str],
+                     audio_file: str = None) -> List[Dict[str, Any]]:
+    """依次探测每个工作负载，返回每个模型的拐点报告"""
+    pool = PoolConfig(max_connections=config.max_concurrency, max_concurrency=config.max_concurrency)
+    results = []
+    async with AsyncNewAPIClient(api_config, pool) as client:
+        with build_model_factories(client, audio_file=audio_file) as factories:
+            factories[WORKLOADS['image']] = image_request_factory()
+            for workload in workloads:
+                model = WORKLOADS[workload]
+                # 每个模型重新确定相对 p99 上限
+                report = await ConcurrencyFinder(client, config).find(model, factories[model])
+                report['workload'] = workload
+                results.append(report)
+    return results
+
+def print_knees(results: List[Dict[str, Any]]):
+    print("\n" + "=" * 60)
+    print("📈 并发拐点")
+    print("=" * 60)
+    for result in results:
+        knee = result['knee']
+        print(f"\n{result['workload']} ({result['model']}, {result['strategy']})")
+        if knee is None:
+            print(f"   ❌ 最低并发档已不健康: {result['steps'][0]['reason'] if result['steps'] else '无数据'}")
+            continue
+        print(f"   拐点并发: {knee['concurrency']}  吞吐: {knee['goodput']} req/s  "
+              f"p50 {knee['p50_ms']}ms  p99 {knee['p99_ms']}ms  错误率 {knee['error_rate']:.2%}")
+        if result['saturated_at'] is not None:
+            print(f"   饱和于并发 {result['saturated_at']}（p99 上限 {result['p99_limit_ms']}ms，"
+                  f"错误率上限 {result['max_error_rate']:.2%}）")
+        else:
+            print(f"   测试范围内未饱和（p99 上限 {result['p99_limit_ms']}ms）")
+        if knee['low_sample']:
+            print(f"   ⚠️ 拐点档样本数 {knee['requests']} 偏少，建议加大 --step-duration")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="自适应并发探测：寻找各模型的饱和拐点")
+    parser.add_argument('--base-url', default=os.getenv("NEW_API_BASE_URL", "http://127.0.0.1:3000"))
+    parser.add_argument('--workload', action='append', choices=list(WORKLOADS),
+                        help="只探测指定工作负载，可重复（默认全部）")
+    parser.add_argument('--strategy', choices=('step', 'aimd'), default="step")
+    parser.add_argument('--start', type=int, default=1)
+    parser.add_argument('--max-concurrency', type=int, default=256)
+    parser.add_argument('--step-duration', type=float, default=10.0, help="每档持续时间（秒）")
+    parser.add_argument('--growth-factor', type=float, default=2.0, help="step 策略每档并发乘数")
+    parser.add_argument('--additive-increase', type=int, default=2, help="aimd 策略加性增量")
+    parser.add_argument('--p99-ms', type=float, default=None, help="p99 上限（毫秒），默认相对最低并发档")
+    parser.add_argument('--latency-factor', type=float, default=3.0)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--audio-file', default=None, help="语音识别负载使用的音频文件")
+    parser.add_argument('--output', default=None, help="报告输出路径")
+    args = parser.parse_args()
+
+    api_config = APIConfig(
+        base_url=args.base_url,
+        api_key=os.getenv("NEW_API_KEY", "sk-WFXP99kKWeu9BhV3UiypR6wj2tb2x5d08TLGWgiLHiDG9r8Q"),
+        timeout=60
+    )
+    try:
+        config = FinderConfig(
+            strategy=args.strategy,
+            start=args.start,
+            max_concurrency=args.max_concurrency,
+            step_duration=args.step_duration,
+            growth_factor=args.growth_factor,
+            additive_increase=args.additive_increase,
+            p99_limit_ms=args.p99_ms,
+            latency_factor=args.latency_factor,
+            max_error_rate=args.max_error_rate,
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    workloads = args.workload or list(WORKLOADS)
+    try:
+        results = asyncio.run(find_knees(api_config, config, workloads, audio_file=args.audio_file))
+    except KeyboardInterrupt:
+        print("\n\n⏹️  探测被用户中断")
+        return
+
+    print_knees(results)
+    output = args.output or f"test_outputs/concurrency_knee_{int(time.time())}.json"
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'config': asdict(config), 'results': results, 'test_time': time.strftime("%Y-%m-%d %H:%M:%S")},
+                  f, ensure_ascii=False, indent=2)
+    print(f"\n📄 报告已保存至: {output}")
+
+if __name__ == "__main__":
+    main()
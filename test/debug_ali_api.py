@@ -9,6 +9,9 @@ import os
 import requests
 import json
 import time
+import asyncio
+
+from task_tracker import BackoffPolicy, wait_for_tasks
 
 def test_ali_direct_api():
     """直接测试阿里云API"""
@@ -105,21 +108,21 @@ def test_ali_direct_api():
                     task_id = result["output"]["task_id"]
                     print(f"\n2️⃣ 查询任务状态 (Task ID: {task_id})")
                     
-                    # 等待一段时间
-                    time.sleep(5)
-                    
-                    status_response = requests.get(
-                        f"https://dashscope.aliyuncs.com/api/v1/tasks/{task_id}",
-                        headers=headers,
-                        timeout=30
-                    )
+                    # 指数退避轮询，任务进入终态即返回
+                    start_time = time.time()
+                    outcome = asyncio.run(wait_for_tasks(
+                        "https://dashscope.aliyuncs.com",
+                        ali_api_key,
+                        [task_id],
+                        BackoffPolicy(initial_delay=1.0, max_delay=10.0, timeout=300)
+                    ))
+                    status_result = outcome['results'][task_id]
                     
-                    print(f"   📊 状态查询状态码: {status_response.status_code}")
-                    if status_response.status_code == 200:
-                        status_result = status_response.json()
+                    print(f"   ⏱️  轮询耗时: {time.time() - start_time:.2f}秒，查询 {outcome['stats']['polls']} 次")
+                    if isinstance(status_result, dict):
                         print(f"   📄 任务状态: {json.dumps(status_result, indent=2, ensure_ascii=False)}")
                     else:
-                        print(f"   ❌ 状态查询失败: {status_response.text}")
+                        print(f"   ❌ 状态查询失败: {status_result}")
                 break  # 找到可用的模型就停止测试
                 
             else:
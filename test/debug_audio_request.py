@@ -79,5 +79,36 @@ def test_audio_transcription():
     except Exception as e:
         print(f"   异常: {str(e)}")
 
+    # 方式3: 内置流式 multipart 编码器（chunked 传输）
+    print("\n3. 内置流式 multipart 编码器:")
+    try:
+        from multipart_stream import post_multipart
+        
+        audio_file = os.getenv("TEST_AUDIO_FILE")
+        file_source = audio_file if audio_file and os.path.exists(audio_file) else audio_data
+        
+        def on_progress(sent, total):
+            print(f"   上传进度: {sent}/{total} 字节")
+        
+        response, timings = post_multipart(
+            url,
+            fields={
+                'file': ('test.wav', file_source, 'audio/wav'),
+                'model': 'paraformer-realtime-8k-v2',
+                'response_format': 'json',
+                'language': 'zh'
+            },
+            headers={'Authorization': f'Bearer {API_KEY}'},
+            timeout=30,
+            progress_callback=on_progress
+        )
+        print(f"   状态码: {response.status_code}")
+        print(f"   上传耗时: {timings['upload_time']:.3f}秒")
+        print(f"   服务端处理耗时: {timings['server_time']:.3f}秒")
+        print(f"   响应: {response.text}")
+        
+    except Exception as e:
+        print(f"   异常: {str(e)}")
+
 if __name__ == "__main__":
     test_audio_transcription() 
\ No newline at end of file
@@ -2,12 +2,28 @@
 # -*- coding: utf-8 -*-
 """
 简单的 WebSocket 连接调试脚本
+握手由 realtime_pool.open_realtime_session 完成，分别输出 DNS、TCP 建连、
+WebSocket 升级、session.created、session.updated 各阶段耗时
 """
 
 import asyncio
-import websockets
 import json
 import os
+from dataclasses import asdict
+
+from realtime_pool import open_realtime_session
+
+BASE_URL = os.getenv("NEW_API_BASE_URL", "http://127.0.0.1:3000")
+HANDSHAKE_TIMEOUT = float(os.getenv("REALTIME_HANDSHAKE_TIMEOUT", "10"))
+
+# 握手完成后发送的会话更新
+SESSION_UPDATE = {
+    "modalities": ["text", "audio"],
+    "instructions": "你是一个语音助手。",
+    "voice": "alloy",
+    "input_audio_format": "pcm16",
+    "output_audio_format": "pcm16"
+}
 
 async def test_model_connection(model_name):
     """测试特定模型的连接"""
@@ -15,52 +31,27 @@ async def test_model_connection(model_name):
     
     print(f"\n🔍 测试模型: {model_name}")
     print("-" * 50)
+    print(f"连接到: {BASE_URL} /v1/realtime?model={model_name}")
     
     # 使用子协议认证
     try:
-        ws_url = f"ws://127.0.0.1:3000/v1/realtime?model={model_name}"
-        subprotocols = [
-            "realtime",
-            f"openai-insecure-api-key.{api_key}",
-            "openai-beta.realtime-v1"
-        ]
-        print(f"连接到: {ws_url}")
-        
-        async with websockets.connect(ws_url, subprotocols=subprotocols) as websocket:
-            print("✅ WebSocket 连接成功")
-            
-            # 等待服务器消息
-            try:
-                response = await asyncio.wait_for(websocket.recv(), timeout=3.0)
-                print(f"收到响应: {response}")
-                
-                # 尝试发送会话更新
-                session_update = {
-                    "type": "session.update",
-                    "session": {
-                        "modalities": ["text", "audio"],
-                        "instructions": "你是一个语音助手。",
-                        "voice": "alloy",
-                        "input_audio_format": "pcm16",
-                        "output_audio_format": "pcm16"
-                    }
-                }
-                
-                await websocket.send(json.dumps(session_update))
-                print("✅ 会话更新消息已发送")
-                
-                # 等待更多响应
-                try:
-                    response2 = await asyncio.wait_for(websocket.recv(), timeout=3.0)
-                    print(f"收到会话更新响应: {response2}")
-                except asyncio.TimeoutError:
-                    print("⏰ 等待会话更新响应超时")
-                    
-            except asyncio.TimeoutError:
-                print("⏰ 等待初始响应超时")
-            
+        session = await open_realtime_session(BASE_URL, api_key, model_name,
+                                              session_update=SESSION_UPDATE, timeout=HANDSHAKE_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"⏰ 握手超时（{HANDSHAKE_TIMEOUT}秒）")
+        return
     except Exception as e:
         print(f"❌ 连接失败: {e}")
+        return
+    
+    print("✅ WebSocket 连接成功，会话更新已确认")
+    for event in session.events:
+        print(f"收到响应: {json.dumps(event, ensure_ascii=False)}")
+    
+    phases = dict(asdict(session.timing), total=session.timing.total)
+    print("⏱️  握手耗时: " + "  ".join(f"{phase} {value * 1000:.3f}ms"
+                                    for phase, value in phases.items() if value is not None))
+    await session.close()
 
 async def test_websocket_connection():
     """测试 WebSocket 连接"""
@@ -74,4 +65,4 @@ async def test_websocket_connection():
 if __name__ == "__main__":
     print("🚀 WebSocket 连接调试工具")
     print("="*50)
-    asyncio.run(test_websocket_connection()) 
\ No newline at end of file
+    asyncio.run(test_websocket_connection())
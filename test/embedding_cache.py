@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化嵌入向量缓存
+- 按内容寻址：键为 (model, encoding_format, 规范化文本) 的 SHA-256
+- 向量存放在内存映射的 float32 文件中，每个键占一个固定槽位
+- 小索引文件（JSON）按 LRU 顺序记录 键 -> 槽位
+- 条目数超过上限时淘汰最久未使用的条目并复用其槽位
+- 命中/未命中/淘汰计数可写入 TestRunner 报告
+
+重复的回归测试对同一语料几乎不再消耗上游配额。
+"""
+
+import os
+import re
+import sys
+import json
+import mmap
+import hashlib
+import logging
+import unicodedata
+from array import array
+from pathlib import Path
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Sequence, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_text(text: str) -> str:
+    """NFC 规范化、去掉首尾空白并合并连续空白"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+def cache_key(model: str, encoding_format: str, text: str) -> str:
+    """缓存键"""
+    payload = f"{model}\x00{encoding_format}\x00{normalize_text(text)}".encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+class EmbeddingCache:
+    """基于内存映射 float32 文件的 LRU 嵌入缓存"""
+
+    INDEX_FILE = 'index.json'
+    VECTOR_FILE = 'vectors.f32'
+
+    def __init__(self, directory: Union[str, Path] = "test_outputs/embedding_cache", max_entries: int = 100000):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self.dimension = 0
+        self.capacity = 0                 # 向量文件当前可容纳的槽位数
+        self.entries: "OrderedDict[str, int]" = OrderedDict()  # 键 -> 槽位，末尾为最近使用
+        self.free_slots: List[int] = []
+        self.hits = self.misses = self.evictions = 0
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._load()
+
+    # ---- 持久化 ----
+
+    def _load(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        index_path = self.directory / self.INDEX_FILE
+        vector_path = self.directory / self.VECTOR_FILE
+        if index_path.exists() and vector_path.exists():
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                self.dimension = index['dimension']
+                self.entries = OrderedDict((key, slot) for key, slot in index['entries'])
+                used = set(self.entries.values())
+                slots = os.path.getsize(vector_path) // (self.dimension * 4) if self.dimension else 0
+                self.free_slots = [slot for slot in range(slots) if slot not in used]
+                self._open_vectors(slots)
+                logger.info(f"加载嵌入缓存: {len(self.entries)} 条，维度 {self.dimension}")
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"嵌入缓存索引损坏，重新创建: {str(e)}")
+                self.entries.clear()
+                self.free_slots.clear()
+                self.dimension = 0
+
+    def _open_vectors(self, slots: int):
+        """打开（必要时扩容）向量文件并重新映射"""
+        if self._mmap is not None:
+            self._mmap.close()
+        if self._file is None:
+            path = self.directory / self.VECTOR_FILE
+            self._file = open(path, 'r+b' if path.exists() else 'w+b')
+        size = slots * self.dimension * 4
+        if os.fstat(self._file.fileno()).st_size < size:
+            self._file.truncate(size)
+        self.capacity = slots
+        self._mmap = mmap.mmap(self._file.fileno(), size) if size else None
+
+    def _grow(self):
+        """槽位用完时容量翻倍（不超过 max_entries）"""
+        old = self.capacity
+        new = min(max(old * 2, 1024), self.max_entries)
+        self._open_vectors(new)
+        self.free_slots.extend(range(new - 1, old - 1, -1))
+
+    def flush(self):
+        """写回向量和索引（索引先写临时文件再替换，避免中途中断损坏）"""
+        if self._mmap is not None:
+            self._mmap.flush()
+        index_path = self.directory / self.INDEX_FILE
+        tmp_path = index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'dimension': self.dimension, 'entries': list(self.entries.items())}, f)
+        os.replace(tmp_path, index_path)
+
+    def close(self):
+        self.flush()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "EmbeddingCache":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # ---- 读写 ----
+
+    def _read_slot(self, slot: int) -> List[float]:
+        start = slot * self.dimension * 4
+        data = array('f')
+        data.frombytes(self._mmap[start:start + self.dimension * 4])
+        if sys.byteorder == 'big':
+            data.byteswap()
+        return data.tolist()
+
+    def _write_slot(self, slot: int, vector: Sequence[float]):
+        start = slot * self.dimension * 4
+        if np is not None and isinstance(vector, np.ndarray):
+            data = np.ascontiguousarray(vector, dtype='<f4')
+            self._mmap[start:start + self.dimension * 4] = memoryview(data).cast('B')
+            return
+        data = array('f', vector)
+        if sys.byteorder == 'big':
+            data.byteswap()
+        self._mmap[start:start + self.dimension * 4] = data.tobytes()
+
+    def get(self, model: str, encoding_format: str, text: str) -> Optional[List[float]]:
+        """查询向量，命中时刷新 LRU 顺序"""
+        key = cache_key(model, encoding_format, text)
+        slot = self.entries.get(key)
+        if slot is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return self._read_slot(slot)
+
+    def put(self, model: str, encoding_format: str, text: str, vector: Sequence[float]):
+        """写入向量，超过上限时淘汰最久未使用的条目"""
+        if not self.dimension:
+            self.dimension = len(vector)
+        elif len(vector) != self.dimension:
+            logger.warning(f"向量维度 {len(vector)} 与缓存维度 {self.dimension} 不一致，跳过缓存")
+            return
+
+        key = cache_key(model, encoding_format, text)
+        slot = self.entries.get(key)
+        if slot is None:
+            if len(self.entries) >= self.max_entries:
+                _, slot = self.entries.popitem(last=False)
+                self.evictions += 1
+            else:
+                if not self.free_slots:
+                    self._grow()
+                slot = self.free_slots.pop()
+        self.entries[key] = slot
+        self.entries.move_to_end(key)
+        self._write_slot(slot, vector)
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率等统计，用于测试报告"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'dimension': self.dimension,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': f"{(self.hits / lookups * 100):.1f}%" if lookups else "0%",
+            'size_bytes': self.capacity * self.dimension * 4,
+        }
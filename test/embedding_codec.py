@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+嵌入向量解码
+encoding_format="float" 时响应是 JSON 浮点数组，解析开销大、体积约为二进制的 4 倍；
+encoding_format="base64" 时每个向量是 little-endian float32 的 base64 字符串，
+解码后通过缓冲区视图直接得到 float32 数组，不构造 Python float 列表。
+"""
+
+import sys
+import json
+import time
+import base64
+import binascii
+from array import array
+from typing import Any, Dict, List, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ENCODING_FORMATS = ("float", "base64")
+
+def decode_embedding(value: Any, encoding_format: str = "float"):
+    """
+    解码单个向量
+    - base64：NumPy 可用时返回建立在解码字节上的只读 float32 视图，否则返回 array('f')
+    - float：原样返回列表
+    """
+    if encoding_format != "base64":
+        return value
+    raw = binascii.a2b_base64(value)
+    if np is not None:
+        return np.frombuffer(raw, dtype='<f4')
+    vector = array('f')
+    vector.frombytes(raw)
+    if sys.byteorder == 'big':
+        vector.byteswap()
+    return vector
+
+def decode_embeddings(items: Sequence[Dict[str, Any]], encoding_format: str = "float"):
+    """
+    按 index 顺序解码响应中的全部向量
+    base64 且 NumPy 可用时，所有向量解码进同一块缓冲区，返回 (n, dim) 的 float32 矩阵
+    """
+    items = sorted(items, key=lambda item: item.get('index', 0))
+    if encoding_format == "base64" and np is not None and items:
+        raw = b''.join(binascii.a2b_base64(item['embedding']) for item in items)
+        return np.frombuffer(raw, dtype='<f4').reshape(len(items), -1)
+    return [decode_embedding(item['embedding'], encoding_format) for item in items]
+
+def vector_preview(vector, size: int = 5) -> List[float]:
+    """向量前几个维度（转换为 Python float，便于写入 JSON 报告）"""
+    return [float(x) for x in vector[:size]]
+
+def parse_embedding_response(content: bytes, encoding_format: str = "float") -> Dict[str, Any]:
+    """
+    解析完整响应并把向量转为 float32，记录 JSON 解析和向量解码两部分耗时
+    float 格式同样转为 float32，保证两种格式的结果可以直接对比
+    """
+    start = time.perf_counter()
+    data = json.loads(content)
+    json_done = time.perf_counter()
+    items = data.get('data', [])
+    if encoding_format == "base64":
+        vectors = decode_embeddings(items, encoding_format)
+    elif np is not None:
+        vectors = np.asarray([item['embedding'] for item in items], dtype='<f4')
+    else:
+        vectors = [array('f', item['embedding']) for item in items]
+    end = time.perf_counter()
+    return {
+        'vectors': vectors,
+        'usage': data.get('usage', {}),
+        'json_parse_time': json_done - start,
+        'decode_time': end - json_done,
+        'parse_time': end - start,
+    }
+
+def encode_embedding_base64(vector: Sequence[float]) -> str:
+    """把向量编码为 base64 float32（与上游格式一致，模拟服务端使用）"""
+    if np is not None:
+        return base64.b64encode(np.asarray(vector, dtype='<f4').tobytes()).decode('ascii')
+    data = array('f', vector)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return base64.b64encode(data.tobytes()).decode('ascii')
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量文本嵌入流水线
+在 TextEmbeddingTester 的请求格式之上处理任意规模的语料：
+1. 从文件（每行一条，或 .jsonl 的 text 字段）或迭代器读取语料
+2. 完全相同的文本只请求一次
+3. 边读边按条数 / 估算 token 数 / 字节数上限把文本打包成批次（text-embedding-v4 单批最多 10 条）
+4. 批次经有界队列交给固定数量的工作协程，用 AsyncNewAPIClient 发送（默认 base64 编码），
+   429/5xx 按 Retry-After 或指数退避重试，连接错误和超时按指数退避重试；语料读取不会领先发送太多，大语料不必先整体载入
+5. 向量写入紧凑的 float32 文件（<prefix>.f32）并附带索引（<prefix>.json）
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple, Union
+from dataclasses import dataclass
+
+import aiohttp
+
+from test_new_api_models import APIConfig, TextEmbeddingTester
+from async_client import AsyncNewAPIClient, PoolConfig
+from embedding_codec import decode_embeddings
+from rate_limit import parse_retry_after
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class BatchLimits:
+    """批次上限（默认值对应 text-embedding-v4）"""
+    max_items: int = 10          # 单批最多条数
+    max_tokens: int = 8192       # 单批估算 token 上限
+    max_bytes: int = 256 * 1024  # 单批请求体字节上限
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文约 1 字 1 token，英文约 3~4 字符 1 token，按 UTF-8 字节数/3 偏保守估计"""
+    return len(text.encode('utf-8')) // 3 + 1
+
+def read_corpus(source: Union[str, Path, Iterable[str]]) -> Iterator[str]:
+    """读取语料：文件路径（.jsonl 取 text 字段，其余按行）或字符串迭代器"""
+    if not isinstance(source, (str, Path)):
+        for text in source:
+            yield text
+        return
+
+    path = Path(source)
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line.strip():
+                continue
+            if path.suffix == '.jsonl':
+                yield json.loads(line)['text']
+            else:
+                yield line
+
+def iter_batches(items: Iterable[Tuple[int, str]], limits: BatchLimits) -> Iterator[List[Tuple[int, str]]]:
+    """按上限把 (行号, 文本) 逐批打包（保持顺序，超限的单条文本单独成批），边读边产出"""
+    current: List[Tuple[int, str]] = []
+    tokens = size = 0
+    for row, text in items:
+        text_tokens = estimate_tokens(text)
+        text_bytes = len(text.encode('utf-8'))
+        if current and (len(current) >= limits.max_items
+                        or tokens + text_tokens > limits.max_tokens
+                        or size + text_bytes > limits.max_bytes):
+            yield current
+            current, tokens, size = [], 0, 0
+        current.append((row, text))
+        tokens += text_tokens
+        size += text_bytes
+    if current:
+        yield current
+
+def pack_batches(texts: List[str], limits: BatchLimits) -> List[List[int]]:
+    """按上限把文本下标打包为批次"""
+    return [[row for row, _ in batch] for batch in iter_batches(enumerate(texts), limits)]
+
+class EmbeddingStore:
+    """float32 向量存储：<prefix>.f32 为按行排列的 little-endian float32，<prefix>.json 为索引"""
+
+    def __init__(self, prefix: Union[str, Path]):
+        self.prefix = Path(prefix)
+        self.vector_path = self.prefix.with_suffix('.f32')
+        self.index_path = self.prefix.with_suffix('.json')
+        self.dimension = 0
+        self.rows = 0
+        self._file = None
+
+    def create(self, dimension: int, rows: int = 0):
+        """按维度创建文件；行数未知时随写入增长，关闭时补齐到 rows 行"""
+        self.prefix.parent.mkdir(parents=True, exist_ok=True)
+        self.rows, self.dimension = rows, dimension
+        self._file = open(self.vector_path, 'w+b')
+        self._file.truncate(rows * dimension * 4)
+
+    def write(self, row: int, vector: Iterable[float]):
+        """写入一行向量（float32 ndarray 直接写出其缓冲区）"""
+        self.rows = max(self.rows, row + 1)
+        if np is not None and isinstance(vector, np.ndarray):
+            data = np.ascontiguousarray(vector, dtype='<f4')
+            if data.size != self.dimension:
+                raise ValueError(f"向量维度 {data.size} 与存储维度 {self.dimension} 不一致")
+            self._file.seek(row * self.dimension * 4)
+            self._file.write(memoryview(data).cast('B'))
+            return
+        data = array('f', vector)
+        if len(data) != self.dimension:
+            raise ValueError(f"向量维度 {len(data)} 与存储维度 {self.dimension} 不一致")
+        if data.itemsize != 4:
+            raise RuntimeError("当前平台的 array('f') 不是 32 位浮点")
+        if sys.byteorder == 'big':
+            data.byteswap()
+        self._file.seek(row * self.dimension * 4)
+        self._file.write(data.tobytes())
+
+    def close(self, index: Dict[str, Any]):
+        """写入索引并关闭向量文件（末尾失败的行补零）"""
+        if self._file is not None:
+            self._file.truncate(self.rows * self.dimension * 4)
+            self._file.close()
+            self._file = None
+        index = dict(index, dimension=self.dimension, rows=self.rows, dtype='<f4')
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, prefix: Union[str, Path]):
+        """读取存储，返回 (向量矩阵, 索引)；有 NumPy 时为只读 memmap"""
+        store = cls(prefix)
+        with open(store.index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        shape = (index['rows'], index['dimension'])
+        if np is not None:
+            return np.memmap(store.vector_path, dtype='<f4', mode='r', shape=shape), index
+        data = array('f')
+        with open(store.vector_path, 'rb') as f:
+            data.frombytes(f.read())
+        return data, index
+
+class EmbeddingPipeline:
+    """去重、打包、并发请求并落盘的嵌入流水线"""
+
+    def __init__(self, config: APIConfig, limits: Optional[BatchLimits] = None, concurrency: int = 8,
+                 max_retries: int = 3, store_texts: bool = True, cache=None, encoding_format: str = "base64"):
+        self.config = config
+        self.encoding_format = encoding_format
+        self.cache = cache  # 可选的 embedding_cache.EmbeddingCache
+        self.limits = limits or BatchLimits()
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.store_texts = store_texts
+        self.stats = {'requests': 0, 'retries': 0, 'failed_batches': 0, 'prompt_tokens': 0}
+
+    async def _embed_batch(self, tester: TextEmbeddingTester, texts: List[str]):
+        """请求一个批次，按响应中的 index 排序返回向量（base64 格式直接解码为 float32）"""
+        method, endpoint, kwargs = tester.build_request(texts)
+        for attempt in range(self.max_retries + 1):
+            self.stats['requests'] += 1
+            try:
+                response = await tester.client.request(method, endpoint, **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # 连接失败、连接被重置、超时等传输层错误与 429/5xx 一样退避重试
+                if attempt == self.max_retries:
+                    raise
+                self.stats['retries'] += 1
+                logger.warning(f"⚠️ 批次请求出错，{0.5 * 2 ** attempt:.1f}秒后重试: {type(e).__name__}: {e}")
+                await asyncio.sleep(0.5 * 2 ** attempt)
+                continue
+            if response.status_code == 200:
+                data = response.json()
+                self.stats['prompt_tokens'] += data.get('usage', {}).get('prompt_tokens', 0)
+                vectors = decode_embeddings(data.get('data', []), tester.encoding_format)
+                if len(vectors) != len(texts):
+                    raise RuntimeError(f"返回向量数 {len(vectors)} 与输入 {len(texts)} 不一致")
+                return vectors
+            if (response.status_code != 429 and response.status_code < 500) or attempt == self.max_retries:
+                raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+            self.stats['retries'] += 1
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            await asyncio.sleep(retry_after if retry_after is not None else 0.5 * 2 ** attempt)
+        raise RuntimeError("重试次数耗尽")
+
+    async def arun(self, corpus: Union[str, Path, Iterable[str]], output_prefix: Union[str, Path]) -> Dict[str, Any]:
+        """执行流水线，返回统计信息"""
+        start_time = time.perf_counter()
+
+        # 去重：unique_ids 为唯一文本 -> 行号（插入顺序即行号顺序），positions 为每条语料对应的行号
+        unique_ids: Dict[str, int] = {}
+        positions = array('l')
+        failed_rows: List[int] = []
+        counts = {'cache_hits': 0, 'batches': 0}
+        store = EmbeddingStore(output_prefix)
+
+        def save(row: int, vector):
+            if store.dimension == 0:
+                store.create(len(vector))
+            store.write(row, vector)
+
+        pool = PoolConfig(max_connections=self.concurrency, max_concurrency=self.concurrency)
+        async with AsyncNewAPIClient(self.config, pool) as client:
+            tester = TextEmbeddingTester(client, cache=self.cache, encoding_format=self.encoding_format)
+
+            def pending_texts() -> Iterator[Tuple[int, str]]:
+                """逐条读取语料，缓存命中的文本直接落盘，只产出需要请求的新文本"""
+                for text in read_corpus(corpus):
+                    row = unique_ids.get(text)
+                    if row is not None:
+                        positions.append(row)
+                        continue
+                    row = unique_ids[text] = len(unique_ids)
+                    positions.append(row)
+                    vector = self.cache.get(tester.model, tester.encoding_format, text) if self.cache is not None else None
+                    if vector is not None:
+                        counts['cache_hits'] += 1
+                        save(row, vector)
+                    else:
+                        yield row, text
+
+            # 队列有界：工作协程都忙时读取暂停，内存中最多积压 2 * concurrency 个批次
+            queue: asyncio.Queue = asyncio.Queue(maxsize=2 * self.concurrency)
+
+            async def produce():
+                try:
+                    for batch in iter_batches(pending_texts(), self.limits):
+                        counts['batches'] += 1
+                        await queue.put(batch)
+                finally:
+                    for _ in range(self.concurrency):
+                        await queue.put(None)
+
+            async def work():
+                while True:
+                    batch = await queue.get()
+                    if batch is None:
+                        return
+                    rows = [row for row, _ in batch]
+                    texts = [text for _, text in batch]
+                    try:
+                        vectors = await self._embed_batch(tester, texts)
+                    except Exception as e:
+                        logger.error(f"批次失败（{len(batch)} 条）: {str(e)}")
+                        self.stats['failed_batches'] += 1
+                        failed_rows.extend(rows)
+                        continue
+                    for row, text, vector in zip(rows, texts, vectors):
+                        save(row, vector)
+                        if self.cache is not None:
+                            self.cache.put(tester.model, tester.encoding_format, text, vector)
+
+            await asyncio.gather(produce(), *(work() for _ in range(self.concurrency)))
+            logger.info(f"📚 语料 {len(positions)} 条，去重后 {len(unique_ids)} 条，"
+                        f"缓存命中 {counts['cache_hits']} 条，打包为 {counts['batches']} 个批次")
+
+        elapsed = time.perf_counter() - start_time
+        result = {
+            'model': tester.model,
+            'corpus_size': len(positions),
+            'unique_texts': len(unique_ids),
+            'duplicates_skipped': len(positions) - len(unique_ids),
+            **counts,
+            'failed_rows': len(failed_rows),
+            'elapsed': round(elapsed, 3),
+            'texts_per_second': round(len(unique_ids) / elapsed, 1) if elapsed > 0 else 0.0,
+            **self.stats,
+        }
+        if self.cache is not None:
+            self.cache.flush()
+        if store.dimension:
+            store.rows = len(unique_ids)
+            index = {'model': tester.model, 'positions': positions.tolist(), 'failed_rows': sorted(failed_rows)}
+            if self.store_texts:
+                index['texts'] = list(unique_ids)
+            store.close(index)
+            result.update({'dimension': store.dimension, 'vector_file': str(store.vector_path),
+                           'index_file': str(store.index_path)})
+        logger.info(f"✅ 嵌入完成: {result['unique_texts']} 条，耗时 {result['elapsed']}秒，"
+                    f"{result['texts_per_second']} 条/秒")
+        return result
+
+    def run(self, corpus: Union[str, Path, Iterable[str]], output_prefix: Union[str, Path]) -> Dict[str, Any]:
+        """同步入口"""
+        return asyncio.run(self.arun(corpus, output_prefix))
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="批量文本嵌入流水线")
+    parser.add_argument('corpus', help="语料文件：每行一条，或 .jsonl 的 text 字段")
+    parser.add_argument('--output', default="test_outputs/embeddings", help="输出前缀")
+    parser.add_argument('--base-url', default=os.getenv("NEW_API_BASE_URL", "http://127.0.0.1:3000"))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--max-items', type=int, default=10)
+    parser.add_argument('--max-tokens', type=int, default=8192)
+    parser.add_argument('--cache-dir', default=None, help="嵌入缓存目录，不设置则不使用缓存")
+    parser.add_argument('--encoding-format', choices=['float', 'base64'], default='base64',
+                        help="向量编码格式，base64 响应更小且可直接解码为 float32")
+    args = parser.parse_args()
+
+    config = APIConfig(
+        base_url=args.base_url,
+        api_key=os.getenv("NEW_API_KEY", "sk-WFXP99kKWeu9BhV3UiypR6wj2tb2x5d08TLGWgiLHiDG9r8Q"),
+        timeout=60
+    )
+    cache = None
+    if args.cache_dir:
+        from embedding_cache import EmbeddingCache
+        cache = EmbeddingCache(args.cache_dir)
+    pipeline = EmbeddingPipeline(config, BatchLimits(max_items=args.max_items, max_tokens=args.max_tokens),
+                                 concurrency=args.concurrency, cache=cache,
+                                 encoding_format=args.encoding_format)
+    result = pipeline.run(args.corpus, args.output)
+    if cache is not None:
+        result['embedding_cache'] = cache.stats()
+        cache.close()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成图像下载流水线
+用户看到的端到端延迟包括图像生成和图像下载两部分，这里补上下载阶段：
+- 有上限的线程池并行下载，共享 keep-alive 连接池
+- 流式写入 .part 临时文件，不在内存中缓存整张图
+- 连接中断后用 Range 请求续传（206 追加写入，服务端不支持 Range 时返回 200 则重新下载）
+- 边写边计算 SHA-256，按内容去重：文件以内容哈希命名，相同图像只保留一份
+- 记录每张图的首字节时间、下载耗时和吞吐
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import logging
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any
+
+import requests
+
+from stream_download import stream_to_file
+from latency_metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.webp', '.gif', '.bmp')
+
+class ImageDownloader:
+    """并行、可续传、按内容去重的图像下载器"""
+
+    def __init__(self, output_dir="test_outputs/images", workers: int = 8, max_retries: int = 2,
+                 timeout: float = 60, chunk_size: int = 64 * 1024,
+                 session: Optional[requests.Session] = None):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.workers = workers
+        self.max_retries = max_retries
+        self.timeout = timeout
+        # 按固定块读取：chunk_size=None 时连接中断会丢掉整个响应体，无法续传
+        self.chunk_size = chunk_size
+        self.session = session or requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(workers, requests.adapters.DEFAULT_POOLSIZE))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.by_hash: Dict[str, Path] = {}  # 内容哈希 -> 已保存的文件
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _suffix(url: str) -> str:
+        suffix = Path(urlparse(url).path).suffix.lower()
+        return suffix if suffix in IMAGE_SUFFIXES else '.png'
+
+    def _part_path(self, url: str) -> Path:
+        """同一 URL 的临时文件名固定，中断后再次下载可以续传"""
+        return self.output_dir / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]}.part"
+
+    def download(self, url: str) -> Dict[str, Any]:
+        """下载单张图像，返回下载统计"""
+        part_path = self._part_path(url)
+        result = {'url': url, 'success': False, 'attempts': 0, 'resumed_from': 0}
+        start_time = time.perf_counter()
+        first_byte = None
+
+        for attempt in range(self.max_retries + 1):
+            result['attempts'] = attempt + 1
+            offset = part_path.stat().st_size if part_path.exists() else 0
+            headers = {'Range': f'bytes={offset}-'} if offset else {}
+            request_start = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+                with response:
+                    if response.status_code == 416 and offset:
+                        # 临时文件已经完整
+                        hasher = self._hash_file(part_path)
+                        break
+                    if response.status_code == 206 and offset:
+                        mode, hasher = 'ab', self._hash_file(part_path)
+                        result['resumed_from'] = offset
+                    elif response.status_code == 200:
+                        mode, hasher, offset = 'wb', hashlib.sha256(), 0
+                    else:
+                        result.update({'status_code': response.status_code, 'error': response.text[:200]})
+                        return self._finish(result, start_time)
+                    result['status_code'] = response.status_code
+
+                    stats = stream_to_file(response, part_path, request_start, self.chunk_size,
+                                           mode=mode, hasher=hasher)
+                    if first_byte is None and stats.time_to_first_byte is not None:
+                        first_byte = request_start - start_time + stats.time_to_first_byte
+
+                    expected = response.headers.get('Content-Length')
+                    if expected is not None and stats.bytes_written < int(expected):
+                        raise requests.exceptions.ChunkedEncodingError(
+                            f"响应体不完整: {stats.bytes_written}/{expected} 字节")
+                break
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout) as e:
+                logger.warning(f"⚠️  下载中断（第 {attempt + 1} 次）: {url} - {str(e)}")
+                result['error'] = str(e)
+        else:
+            return self._finish(result, start_time)
+
+        digest = hasher.hexdigest()
+        size = part_path.stat().st_size
+        with self._lock:
+            existing = self.by_hash.get(digest)
+            if existing is not None:
+                part_path.unlink()
+                result['duplicate_of'] = str(existing)
+                path = existing
+            else:
+                path = self.output_dir / f"{digest[:16]}{self._suffix(url)}"
+                os.replace(part_path, path)
+                self.by_hash[digest] = path
+
+        result.pop('error', None)
+        result.update({
+            'success': True,
+            'path': str(path),
+            'sha256': digest,
+            'bytes': size,
+            'time_to_first_byte': round(first_byte, 4) if first_byte is not None else None,
+        })
+        return self._finish(result, start_time)
+
+    @staticmethod
+    def _hash_file(path: Path):
+        """续传前先对已下载部分计算摘要"""
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(block)
+        return hasher
+
+    @staticmethod
+    def _finish(result: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - start_time
+        result['download_time'] = round(elapsed, 4)
+        if result.get('success'):
+            result['bytes_per_second'] = round(result['bytes'] / elapsed, 1) if elapsed > 0 else 0.0
+            logger.info(f"🖼️  下载完成: {result['path']} ({result['bytes']} 字节，{elapsed:.2f}秒)")
+        else:
+            logger.error(f"❌ 下载失败: {result['url']} - {result.get('error', result.get('status_code'))}")
+        return result
+
+    def download_all(self, urls: List[str]) -> Dict[str, Any]:
+        """并行下载一组 URL（相同 URL 只下载一次），返回汇总统计"""
+        unique_urls = list(dict.fromkeys(url for url in urls if url))
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            results = list(executor.map(self.download, unique_urls))
+        wall_time = time.perf_counter() - start_time
+
+        succeeded = [r for r in results if r['success']]
+        latencies = sorted(r['download_time'] for r in succeeded)
+        total_bytes = sum(r['bytes'] for r in succeeded if 'duplicate_of' not in r)
+        summary = {
+            'total_urls': len(urls),
+            'unique_urls': len(unique_urls),
+            'downloaded': len(succeeded),
+            'failed': len(results) - len(succeeded),
+            'duplicate_images': sum(1 for r in succeeded if 'duplicate_of' in r),
+            'resumed': sum(1 for r in succeeded if r['resumed_from']),
+            'total_bytes': total_bytes,
+            'wall_time': round(wall_time, 3),
+            'bytes_per_second': round(total_bytes / wall_time, 1) if wall_time > 0 else 0.0,
+            'download_time_p50': percentile(latencies, 50),
+            'download_time_p90': percentile(latencies, 90),
+            'download_time_max': latencies[-1] if latencies else 0.0,
+            'results': results,
+        }
+        logger.info(f"📥 下载 {summary['downloaded']}/{summary['unique_urls']} 张，"
+                    f"重复 {summary['duplicate_images']} 张，耗时 {summary['wall_time']}秒")
+        return summary
+
+def main():
+    """主函数：下载命令行或文件中给出的图像 URL"""
+    parser = argparse.ArgumentParser(description="并行、可续传的图像下载")
+    parser.add_argument('urls', nargs='*', help="图像 URL")
+    parser.add_argument('--url-file', help="每行一个 URL 的文件")
+    parser.add_argument('--output-dir', default="test_outputs/images")
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    urls = list(args.urls)
+    if args.url_file:
+        with open(args.url_file, 'r', encoding='utf-8') as f:
+            urls.extend(line.strip() for line in f if line.strip())
+    if not urls:
+        parser.print_help()
+        sys.exit(1)
+
+    summary = ImageDownloader(args.output_dir, workers=args.workers).download_all(urls)
+    print(json.dumps({k: v for k, v in summary.items() if k != 'results'}, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+延迟直方图与分阶段计时
+各测试器原来用 time.time() 记录一个保留两位小数的 response_time，再取平均值，
+既看不到尾延迟，墙上时钟也可能回拨。这里提供统一的延迟记录方式：
+- 计时使用单调时钟 time.perf_counter_ns()，纳秒精度
+- LatencyHistogram：HDR 风格的对数-线性分桶，相对误差有上界（默认 < 0.8%），可合并
+- 直方图序列化为稀疏桶的变长整数编码 + base64，报告中体积很小，读回后仍可合并
+- MetricsRecorder：按 (模型, 接口, 阶段) 分别记录 connect / ttfb / body / total 四个阶段
+SLO 以 p99 为准，报告中给出 p50 / p90 / p99 / p999，而不只是平均值。
+"""
+
+import re
+import math
+import time
+import base64
+import threading
+from typing import Dict, Iterable, List, Optional, Any, Tuple
+
+# 阶段名称：建立连接、首字节（响应头到达）、响应体传输、总耗时
+PHASES = ('connect', 'ttfb', 'body', 'total')
+
+DEFAULT_PRECISION_BITS = 8  # 每个 2 的幂区间划分为 128 个子桶，相对误差 < 1/128
+
+def now_ns() -> int:
+    """单调时钟，纳秒"""
+    return time.perf_counter_ns()
+
+def ns_to_seconds(value_ns: int) -> float:
+    return value_ns / 1e9
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩法计算百分位（输入需已排序）"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def _encode_varints(values: Iterable[int]) -> bytes:
+    out = bytearray()
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+def _decode_varints(data: bytes) -> List[int]:
+    values, value, shift = [], 0, 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value, shift = 0, 0
+    if shift:
+        raise ValueError("变长整数编码被截断")
+    return values
+
+class LatencyHistogram:
+    """HDR 风格的延迟直方图（单位：纳秒）"""
+
+    def __init__(self, precision_bits: int = DEFAULT_PRECISION_BITS):
+        if not 2 <= precision_bits <= 16:
+            raise ValueError("precision_bits 取值范围为 2-16")
+        self.precision_bits = precision_bits
+        self._sub_count = 1 << precision_bits
+        self._half = self._sub_count >> 1
+        self.counts: Dict[int, int] = {}  # 桶序号 -> 次数，只保存非空桶
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = 0
+        self.max_ns = 0
+        self._lock = threading.Lock()
+
+    # ---- 分桶 ----
+
+    def _index(self, value: int) -> int:
+        """小于 2^precision_bits 的值逐个分桶，更大的值按 2 的幂分组后再线性划分"""
+        if value < self._sub_count:
+            return value
+        shift = value.bit_length() - self.precision_bits
+        return shift * self._half + (value >> shift)
+
+    def _bounds(self, index: int) -> Tuple[int, int]:
+        """桶所覆盖的 [下界, 上界] 值"""
+        if index < self._sub_count:
+            return index, index
+        shift = index // self._half - 1
+        sub = index - shift * self._half
+        return sub << shift, ((sub + 1) << shift) - 1
+
+    # ---- 记录与合并 ----
+
+    def record_ns(self, value_ns: int, count: int = 1):
+        value_ns = max(0, int(value_ns))
+        index = self._index(value_ns)
+        with self._lock:
+            self.counts[index] = self.counts.get(index, 0) + count
+            if self.count == 0 or value_ns < self.min_ns:
+                self.min_ns = value_ns
+            if value_ns > self.max_ns:
+                self.max_ns = value_ns
+            self.count += count
+            self.total_ns += value_ns * count
+
+    def record_seconds(self, seconds: float):
+        self.record_ns(round(seconds * 1e9))
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """把另一个直方图的计数累加进来（精度必须一致），返回 self"""
+        if other.precision_bits != self.precision_bits:
+            raise ValueError(f"直方图精度不一致: {self.precision_bits} != {other.precision_bits}")
+        if other.count == 0:
+            return self
+        with self._lock:
+            for index, count in other.counts.items():
+                self.counts[index] = self.counts.get(index, 0) + count
+            self.min_ns = other.min_ns if self.count == 0 else min(self.min_ns, other.min_ns)
+            self.max_ns = max(self.max_ns, other.max_ns)
+            self.count += other.count
+            self.total_ns += other.total_ns
+        return self
+
+    # ---- 查询 ----
+
+    def percentile_ns(self, pct: float) -> int:
+        """最近秩分位数；返回所在桶的上界（并限制在 [min, max] 内），不会低估尾延迟"""
+        if self.count == 0:
+            return 0
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(self._bounds(index)[1], self.min_ns), self.max_ns)
+        return self.max_ns
+
+    def mean_ns(self) -> float:
+        return self.total_ns / self.count if self.count else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        """毫秒单位的分位数汇总"""
+        ms = lambda value: round(value / 1e6, 3)
+        return {
+            'count': self.count,
+            'min_ms': ms(self.min_ns),
+            'mean_ms': ms(self.mean_ns()),
+            'p50_ms': ms(self.percentile_ns(50)),
+            'p90_ms': ms(self.percentile_ns(90)),
+            'p99_ms': ms(self.percentile_ns(99)),
+            'p999_ms': ms(self.percentile_ns(99.9)),
+            'max_ms': ms(self.max_ns),
+        }
+
+    # ---- 序列化 ----
+
+    def to_dict(self) -> Dict[str, Any]:
+        """紧凑序列化：非空桶按 (序号差值, 次数) 做变长整数编码后 base64"""
+        pairs, previous = [], 0
+        for index in sorted(self.counts):
+            pairs.extend((index - previous, self.counts[index]))
+            previous = index
+        return {
+            'precision_bits': self.precision_bits,
+            'count': self.count,
+            'sum_ns': self.total_ns,
+            'min_ns': self.min_ns,
+            'max_ns': self.max_ns,
+            'buckets': base64.b64encode(_encode_varints(pairs)).decode('ascii'),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        histogram = cls(data.get('precision_bits', DEFAULT_PRECISION_BITS))
+        values = _decode_varints(base64.b64decode(data.get('buckets', '')))
+        if len(values) % 2:
+            raise ValueError("直方图桶数据不完整")
+        index = 0
+        for i in range(0, len(values), 2):
+            index += values[i]
+            histogram.counts[index] = values[i + 1]
+        histogram.count = data.get('count', sum(histogram.counts.values()))
+        histogram.total_ns = data.get('sum_ns', 0)
+        histogram.min_ns = data.get('min_ns', 0)
+        histogram.max_ns = data.get('max_ns', 0)
+        return histogram
+
+# 路径中的任务 ID 之类的长标识统一替换，避免每个任务一个标签
+_ID_SEGMENT = re.compile(r'^(?=.*\d)[0-9a-zA-Z_-]{16,}$')
+
+def endpoint_label(endpoint: str) -> str:
+    """把请求路径规整为接口标签，例如 /api/v1/tasks/<task_id> -> /api/v1/tasks/{id}"""
+    path = '/' + endpoint.split('?', 1)[0].strip('/')
+    return '/'.join('{id}' if _ID_SEGMENT.match(segment) else segment for segment in path.split('/'))
+
+def request_model(kwargs: Dict[str, Any]) -> str:
+    """从 requests 风格的请求参数中取出模型名（json / files / data / 流式 multipart），取不到时返回 unknown"""
+    payload = kwargs.get('json')
+    if isinstance(payload, dict) and payload.get('model'):
+        return str(payload['model'])
+    files = kwargs.get('files')
+    if isinstance(files, dict) and 'model' in files:
+        value = files['model']
+        value = value[1] if isinstance(value, tuple) else value
+        return value.decode('utf-8') if isinstance(value, bytes) else str(value)
+    data = kwargs.get('data')
+    # 流式 multipart 编码器的表单字段在 fields 属性上
+    data = getattr(data, 'fields', data)
+    if isinstance(data, dict) and data.get('model'):
+        return str(data['model'])
+    return 'unknown'
+
+MetricKey = Tuple[str, str, str]  # (模型, 接口, 阶段)
+
+class RequestTimer:
+    """单次请求的分阶段计时：开始时创建，依次标记连接建立、首字节和结束"""
+
+    def __init__(self, recorder: "MetricsRecorder", model: str, endpoint: str):
+        self.recorder = recorder
+        self.model = model
+        self.endpoint = endpoint
+        self.start_ns = now_ns()
+        self.connect_ns: Optional[int] = None
+        self.first_byte_ns: Optional[int] = None
+        self.end_ns: Optional[int] = None
+        self.bytes_sent = 0  # 请求体字节数，由传输层回调累加
+
+    def connected(self, duration_ns: Optional[int] = None):
+        """连接建立完成；可以直接给出连接耗时（例如来自 aiohttp 的 trace 回调）"""
+        self.connect_ns = duration_ns if duration_ns is not None else now_ns() - self.start_ns
+
+    def first_byte(self):
+        self.first_byte_ns = now_ns()
+
+    def finish(self) -> float:
+        """记录各阶段耗时，返回总耗时（秒）"""
+        self.end_ns = now_ns()
+        record = self.recorder.record_ns
+        if self.connect_ns is not None:
+            record(self.model, self.endpoint, 'connect', self.connect_ns)
+        if self.first_byte_ns is not None:
+            record(self.model, self.endpoint, 'ttfb', self.first_byte_ns - self.start_ns)
+            record(self.model, self.endpoint, 'body', self.end_ns - self.first_byte_ns)
+        total = self.end_ns - self.start_ns
+        record(self.model, self.endpoint, 'total', total)
+        return ns_to_seconds(total)
+
+class MetricsRecorder:
+    """按 (模型, 接口, 阶段) 维护延迟直方图，线程安全"""
+
+    def __init__(self, precision_bits: int = DEFAULT_PRECISION_BITS):
+        self.precision_bits = precision_bits
+        self.histograms: Dict[MetricKey, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, model: str, endpoint: str, phase: str) -> LatencyHistogram:
+        key = (model, endpoint_label(endpoint), phase)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram(self.precision_bits)
+            return histogram
+
+    def record_ns(self, model: str, endpoint: str, phase: str, value_ns: int):
+        self.histogram(model, endpoint, phase).record_ns(value_ns)
+
+    def timer(self, model: str, endpoint: str) -> RequestTimer:
+        return RequestTimer(self, model, endpoint)
+
+    def merge(self, other: "MetricsRecorder") -> "MetricsRecorder":
+        for (model, endpoint, phase), histogram in list(other.histograms.items()):
+            self.histogram(model, endpoint, phase).merge(histogram)
+        return self
+
+    def __bool__(self) -> bool:
+        return bool(self.histograms)
+
+    def _sorted_items(self) -> List[Tuple[MetricKey, LatencyHistogram]]:
+        phase_order = {phase: i for i, phase in enumerate(PHASES)}
+        with self._lock:
+            items = list(self.histograms.items())
+        return sorted(items, key=lambda item: (item[0][0], item[0][1], phase_order.get(item[0][2], len(PHASES)), item[0][2]))
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """{模型: {接口: {阶段: 分位数汇总}}}"""
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (model, endpoint, phase), histogram in self._sorted_items():
+            result.setdefault(model, {}).setdefault(endpoint, {})[phase] = histogram.summary()
+        return result
+
+    def to_dict(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """{模型: {接口: {阶段: 序列化直方图}}}，写入报告，事后可以读回合并"""
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (model, endpoint, phase), histogram in self._sorted_items():
+            result.setdefault(model, {}).setdefault(endpoint, {})[phase] = histogram.to_dict()
+        return result
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Dict[str, Dict[str, Any]]]) -> "MetricsRecorder":
+        recorder = cls()
+        for model, endpoints in data.items():
+            for endpoint, phases in endpoints.items():
+                for phase, serialized in phases.items():
+                    histogram = LatencyHistogram.from_dict(serialized)
+                    recorder.precision_bits = histogram.precision_bits
+                    recorder.histograms[(model, endpoint, phase)] = histogram
+        return recorder
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+New API平台压测模式
+基于 AsyncNewAPIClient，对每个模型驱动 N 个虚拟用户：
+- 闭环模式：每个虚拟用户发完一个请求再发下一个
+- 开环模式：按固定到达率（或泊松到达）发请求，延迟从计划发送时间算起，
+  避免 coordinated omission
+- 按持续时间或总请求数停止
+
+报告内容：每秒请求数、p50/p90/p99/p999 延迟（HDR 直方图，可合并）、按状态码的错误分布、时间序列
+"""
+
+import os
+import time
+import random
+import asyncio
+import argparse
+import logging
+from typing import Dict, Iterator, List, Optional, Any, Callable, Tuple
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import audio_signals
+from test_new_api_models import (
+    APIConfig,
+    ParaformerTester,
+    CosyVoiceTester,
+    TextEmbeddingTester,
+    DEFAULT_EMBEDDING_TEXTS,
+)
+from async_client import AsyncNewAPIClient, PoolConfig
+from latency_metrics import LatencyHistogram, percentile
+
+logger = logging.getLogger(__name__)
+
+# 请求工厂：返回 (method, endpoint, kwargs)
+RequestFactory = Callable[[], Tuple[str, str, Dict[str, Any]]]
+
+@dataclass
+class LoadConfig:
+    """压测配置"""
+    virtual_users: int = 10                # 闭环模式下的并发用户数；开环模式下的在途请求上限
+    duration: Optional[float] = 30.0       # 持续时间（秒），None 表示只按请求数停止
+    total_requests: Optional[int] = None   # 总请求数上限
+    arrival_rate: Optional[float] = None   # 开环到达率（请求/秒），None 表示闭环
+    poisson_arrivals: bool = False         # 开环模式下使用泊松到达间隔
+    ramp_up: float = 0.0                   # 闭环模式下虚拟用户的爬坡时间（秒）
+    time_series_interval: float = 1.0      # 时间序列的统计粒度（秒）
+
+    def __post_init__(self):
+        if self.duration is None and self.total_requests is None:
+            raise ValueError("duration 和 total_requests 至少需要设置一个")
+
+@dataclass
+class LoadStats:
+    """压测过程中的原始样本"""
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    # (开始偏移秒, 延迟秒, 状态)
+    samples: List[Tuple[float, float, str]] = field(default_factory=list)
+    dropped: int = 0  # 开环模式下因在途请求达到上限而丢弃的到达
+    # 成功请求的延迟直方图，可与其他压测进程的结果合并
+    histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def record(self, start: float, latency: float, status: str):
+        self.samples.append((start - self.started_at, latency, status))
+        if status == '200':
+            self.histogram.record_seconds(latency)
+
+    def summary(self, interval: float = 1.0) -> Dict[str, Any]:
+        """汇总吞吐、延迟分位和错误分布"""
+        elapsed = max(self.finished_at - self.started_at, 1e-9)
+        total = len(self.samples)
+        successful = self.histogram.count
+
+        errors_by_status: Dict[str, int] = {}
+        for _, _, status in self.samples:
+            if status != '200':
+                errors_by_status[status] = errors_by_status.get(status, 0) + 1
+
+        # 按开始时间分桶的时间序列
+        buckets: Dict[int, List[Tuple[float, str]]] = {}
+        for start, lat, status in self.samples:
+            buckets.setdefault(int(start // interval), []).append((lat, status))
+        time_series = []
+        for index in sorted(buckets):
+            bucket = buckets[index]
+            lats = sorted(lat for lat, _ in bucket)
+            time_series.append({
+                't': round(index * interval, 3),
+                'requests': len(bucket),
+                'errors': sum(1 for _, status in bucket if status != '200'),
+                'rps': round(len(bucket) / interval, 2),
+                'p50_ms': round(percentile(lats, 50) * 1000, 2),
+                'p99_ms': round(percentile(lats, 99) * 1000, 2),
+            })
+
+        return {
+            'total_requests': total,
+            'successful_requests': successful,
+            'failed_requests': total - successful,
+            'dropped_arrivals': self.dropped,
+            'duration': round(elapsed, 3),
+            'requests_per_second': round(total / elapsed, 2),
+            'success_rate': f"{(successful / total * 100):.1f}%" if total > 0 else "0%",
+            'latency': self.histogram.summary(),
+            'latency_histogram': self.histogram.to_dict(),
+            'errors_by_status': errors_by_status,
+            'time_series': time_series,
+        }
+
+class LoadRunner:
+    """单模型压测执行器"""
+
+    def __init__(self, client: AsyncNewAPIClient, config: LoadConfig):
+        self.client = client
+        self.config = config
+
+    async def _send(self, factory: RequestFactory, stats: LoadStats, scheduled: Optional[float] = None):
+        method, endpoint, kwargs = factory()
+        start = scheduled if scheduled is not None else time.monotonic()
+        try:
+            response = await self.client.request(method, endpoint, **kwargs)
+            status = str(response.status_code)
+        except asyncio.TimeoutError:
+            status = 'timeout'
+        except Exception as e:
+            status = f'exception:{type(e).__name__}'
+        stats.record(start, time.monotonic() - start, status)
+
+    def _deadline(self, started_at: float) -> float:
+        return started_at + self.config.duration if self.config.duration is not None else float('inf')
+
+    async def _run_closed(self, factory: RequestFactory, stats: LoadStats):
+        """闭环：每个虚拟用户串行发请求"""
+        deadline = self._deadline(stats.started_at)
+        remaining = [self.config.total_requests if self.config.total_requests is not None else -1]
+
+        async def user(index: int):
+            if self.config.ramp_up > 0:
+                await asyncio.sleep(self.config.ramp_up * index / self.config.virtual_users)
+            while time.monotonic() < deadline:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+                await self._send(factory, stats)
+
+        await asyncio.gather(*(user(i) for i in range(self.config.virtual_users)))
+
+    async def _run_open(self, factory: RequestFactory, stats: LoadStats):
+        """开环：按到达率发请求，在途上限为 virtual_users"""
+        deadline = self._deadline(stats.started_at)
+        rate = self.config.arrival_rate
+        in_flight: set = set()
+        sent = 0
+        next_at = stats.started_at
+
+        while next_at < deadline:
+            if self.config.total_requests is not None and sent >= self.config.total_requests:
+                break
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= self.config.virtual_users:
+                stats.dropped += 1
+            else:
+                task = asyncio.ensure_future(self._send(factory, stats, scheduled=next_at))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                sent += 1
+            next_at += random.expovariate(rate) if self.config.poisson_arrivals else 1.0 / rate
+
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+    async def run(self, factory: RequestFactory, stats: Optional[LoadStats] = None) -> LoadStats:
+        """执行压测，返回原始统计；传入 stats 时调用方可在压测过程中读取快照"""
+        if stats is None:
+            stats = LoadStats()
+        stats.started_at = time.monotonic()
+        if self.config.arrival_rate:
+            await self._run_open(factory, stats)
+        else:
+            await self._run_closed(factory, stats)
+        stats.finished_at = time.monotonic()
+        return stats
+
+@contextmanager
+def build_model_factories(client, audio_file: str = None, test_text: str = None,
+                          embedding_texts: List[str] = None) -> Iterator[Dict[str, RequestFactory]]:
+    """
+    为每个模型构建请求工厂，退出时释放映射的音频文件
+    JSON 请求只构建一次，压测时复用；语音识别的流式请求体只能发送一次，每次请求重新构建
+    没有 audio_file 时语音识别使用生成的类语音测试音频
+    """
+    test_text = test_text or "你好，这是CosyVoice语音合成测试。"
+    embedding_texts = embedding_texts or DEFAULT_EMBEDDING_TEXTS
+
+    paraformer = ParaformerTester(client)
+    # 没有音频文件时生成一段 8kHz 类语音测试音频，只生成一次，每次请求复用
+    audio_data = None
+    if not (audio_file and os.path.exists(audio_file)):
+        audio_data = audio_signals.to_wav(audio_signals.speech_like(2.0, 8000), 8000)
+    factories: Dict[str, RequestFactory] = {
+        paraformer.model: lambda: paraformer.build_request(audio_file, audio_data=audio_data),
+    }
+    for tester, args in (
+        (CosyVoiceTester(client), (test_text,)),
+        (TextEmbeddingTester(client), (embedding_texts,)),
+    ):
+        request = tester.build_request(*args)
+        factories[tester.model] = lambda req=request: req
+    try:
+        yield factories
+    finally:
+        paraformer.close()
+
+async def run_load_tests(config: APIConfig, load_config: LoadConfig, models: List[str] = None,
+                         **request_params) -> List[Dict[str, Any]]:
+    """依次对每个模型执行压测，返回每个模型的汇总"""
+    pool = PoolConfig(
+        max_connections=load_config.virtual_users,
+        max_concurrency=load_config.virtual_users,
+    )
+    results = []
+    async with AsyncNewAPIClient(config, pool) as client:
+        with build_model_factories(client, **request_params) as factories:
+            for model, factory in factories.items():
+                if models and model not in models:
+                    continue
+                mode = f"开环 {load_config.arrival_rate}/s" if load_config.arrival_rate else f"闭环 {load_config.virtual_users} 用户"
+                logger.info(f"🔥 开始压测 {model}（{mode}）")
+                stats = await LoadRunner(client, load_config).run(factory)
+                summary = stats.summary(load_config.time_series_interval)
+                summary.update({'model': model, 'mode': 'open' if load_config.arrival_rate else 'closed',
+                                'virtual_users': load_config.virtual_users})
+                logger.info(f"📊 {model}: {summary['requests_per_second']} req/s, "
+                            f"p99 {summary['latency']['p99_ms']}ms, 错误 {summary['failed_requests']}")
+                results.append(summary)
+    return results
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="New API 平台压测工具")
+    parser.add_argument('--base-url', default=os.getenv("NEW_API_BASE_URL", "http://127.0.0.1:3000"))
+    parser.add_argument('--model', action='append', help="只压测指定模型，可重复")
+    parser.add_argument('--users', type=int, default=10, help="虚拟用户数 / 开环在途上限")
+    parser.add_argument('--duration', type=float, default=30.0, help="持续时间（秒）")
+    parser.add_argument('--requests', type=int, default=None, help="总请求数上限")
+    parser.add_argument('--rate', type=float, default=None, help="开环到达率（请求/秒）")
+    parser.add_argument('--poisson', action='store_true', help="开环模式使用泊松到达")
+    parser.add_argument('--metrics-port', type=int, default=None, help="在该端口提供 Prometheus /metrics 端点")
+    parser.add_argument('--metrics-host', default="127.0.0.1", help="/metrics 端点监听地址，0.0.0.0 供其他机器抓取")
+    args = parser.parse_args()
+
+    from test_new_api_models import TestRunner, print_results
+    from metrics_exporter import start_metrics_server
+
+    if args.metrics_port is not None:
+        start_metrics_server(args.metrics_port, args.metrics_host)
+
+    config = APIConfig(
+        base_url=args.base_url,
+        api_key=os.getenv("NEW_API_KEY", "sk-WFXP99kKWeu9BhV3UiypR6wj2tb2x5d08TLGWgiLHiDG9r8Q"),
+        timeout=60
+    )
+    load_config = LoadConfig(
+        virtual_users=args.users,
+        duration=args.duration,
+        total_requests=args.requests,
+        arrival_rate=args.rate,
+        poisson_arrivals=args.poisson,
+    )
+
+    runner = TestRunner(config)
+    try:
+        report = runner.run_load_tests(load_config, models=args.model)
+        print_results(report)
+    except KeyboardInterrupt:
+        print("\n\n⏹️  压测被用户中断")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prometheus / OpenMetrics 指标导出
+测试脚本原来只写日志和打印汇总，无法被抓取。这里提供一个本地 /metrics 端点：
+- 纯标准库实现的 Counter / Gauge / Histogram，线程安全，按标签分组
+- 文本格式兼容 Prometheus 0.0.4；请求头 Accept 含 application/openmetrics-text 时输出 OpenMetrics
+- GatewayMetrics 定义网关探测用的标准指标（按模型打标签）：
+  请求数、错误数（按状态码）、收发字节数、在途请求数、请求耗时直方图、WebSocket 会话数
+- AsyncNewAPIClient / NewAPIClient 的每个请求、realtime_load.py 的每个实时会话都会更新默认实例
+  GATEWAY_METRICS，长时间运行的压测或探测加上 --metrics-port 即可被抓取
+"""
+
+import math
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+
+from latency_metrics import endpoint_label
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# 请求耗时直方图的默认桶（秒），覆盖嵌入接口的几十毫秒到图像生成的几十秒
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_bound(bound: float, openmetrics: bool) -> str:
+    """桶上界 le 的取值：OpenMetrics 要求规范浮点表示（1.0 而不是 1）"""
+    if openmetrics and not math.isinf(bound):
+        return repr(float(bound))
+    return _format_value(bound)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class _Metric:
+    """指标基类：名称、说明、标签名，以及 标签值 -> 数值 的映射"""
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _family_name(self, openmetrics: bool) -> str:
+        return self.name
+
+    def _samples(self, openmetrics: bool = False) -> List[Tuple[str, LabelValues, Optional[Tuple[str, str]], float]]:
+        with self._lock:
+            return [(self.name, key, None, value) for key, value in sorted(self._values.items())]
+
+    def render(self, openmetrics: bool = False) -> List[str]:
+        family = self._family_name(openmetrics)
+        lines = [f"# HELP {family} {_escape(self.documentation)}", f"# TYPE {family} {self.type_name}"]
+        for sample_name, key, extra, value in self._samples(openmetrics):
+            lines.append(f"{sample_name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+class Counter(_Metric):
+    """单调递增计数器，名称以 _total 结尾"""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        if not name.endswith('_total'):
+            name += '_total'
+        super().__init__(name, documentation, labelnames)
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _family_name(self, openmetrics: bool) -> str:
+        # OpenMetrics 中计数器的指标族名不带 _total 后缀
+        return self.name[:-len('_total')] if openmetrics else self.name
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+class Histogram(_Metric):
+    """累积桶直方图：输出 _bucket{le=...}、_sum、_count"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets if not math.isinf(b))) + (float('inf'),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def _samples(self, openmetrics: bool = False):
+        samples = []
+        with self._lock:
+            items = sorted((key, dict(state, counts=list(state['counts']))) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", key, ('le', _format_bound(bound, openmetrics)), cumulative))
+            samples.append((f"{self.name}_sum", key, None, state['sum']))
+            samples.append((f"{self.name}_count", key, None, state['count']))
+        return samples
+
+class MetricsRegistry:
+    """指标注册表：按名称去重，渲染为文本格式"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"指标 {metric.name} 已以不同类型或标签注册")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self, openmetrics: bool = False) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render(openmetrics))
+        if openmetrics:
+            lines.append("# EOF")
+        return '\n'.join(lines) + '\n'
+
+class GatewayMetrics:
+    """网关探测的标准指标集合"""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None, namespace: str = "newapi"):
+        self.registry = registry or MetricsRegistry()
+        r, ns = self.registry, namespace
+        self.requests = r.counter(f"{ns}_requests_total", "已完成的 HTTP 请求数", ('model', 'endpoint', 'status'))
+        self.errors = r.counter(f"{ns}_request_errors_total", "失败的 HTTP 请求数（非 2xx、超时或异常）",
+                                ('model', 'endpoint', 'status'))
+        self.bytes = r.counter(f"{ns}_request_bytes_total", "请求体发送 / 响应体接收的字节数",
+                               ('model', 'endpoint', 'direction'))
+        self.in_flight = r.gauge(f"{ns}_requests_in_flight", "在途 HTTP 请求数", ('model', 'endpoint'))
+        self.duration = r.histogram(f"{ns}_request_duration_seconds", "HTTP 请求耗时（秒）", ('model', 'endpoint'))
+        self.sessions = r.gauge(f"{ns}_realtime_sessions", "当前打开的实时 WebSocket 会话数", ('model',))
+        self.sessions_closed = r.counter(f"{ns}_realtime_sessions_closed_total", "已结束的实时 WebSocket 会话数（按结果）",
+                                        ('model', 'outcome'))
+        self.session_bytes = r.counter(f"{ns}_realtime_bytes_total", "实时会话收发的消息字节数",
+                                       ('model', 'direction'))
+
+    # ---- HTTP 请求 ----
+
+    def request_started(self, model: str, endpoint: str):
+        self.in_flight.inc(model=model, endpoint=endpoint_label(endpoint))
+
+    def request_finished(self, model: str, endpoint: str, status: str, duration: float,
+                         bytes_sent: int = 0, bytes_received: int = 0):
+        """status 为 HTTP 状态码字符串，或 timeout / error"""
+        endpoint = endpoint_label(endpoint)
+        self.in_flight.dec(model=model, endpoint=endpoint)
+        self.requests.inc(model=model, endpoint=endpoint, status=status)
+        if not status.startswith('2'):
+            self.errors.inc(model=model, endpoint=endpoint, status=status)
+        self.duration.observe(duration, model=model, endpoint=endpoint)
+        if bytes_sent:
+            self.bytes.inc(bytes_sent, model=model, endpoint=endpoint, direction='sent')
+        if bytes_received:
+            self.bytes.inc(bytes_received, model=model, endpoint=endpoint, direction='received')
+
+    # ---- 实时会话 ----
+
+    def session_opened(self, model: str):
+        self.sessions.inc(model=model)
+
+    def session_closed(self, model: str, outcome: str):
+        """outcome: success / error / timeout 等"""
+        self.sessions.dec(model=model)
+        self.sessions_closed.inc(model=model, outcome=outcome)
+
+    def session_bytes_sent(self, model: str, count: int):
+        self.session_bytes.inc(count, model=model, direction='sent')
+
+    def session_bytes_received(self, model: str, count: int):
+        self.session_bytes.inc(count, model=model, direction='received')
+
+# 默认实例：客户端和压测工具都写入这里，由 MetricsServer 导出
+GATEWAY_METRICS = GatewayMetrics()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = GATEWAY_METRICS.registry
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+            body = self.registry.render(openmetrics).encode('utf-8')
+            content_type = OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE
+            status = 200
+        elif path in ('/', '/healthz'):
+            body, content_type, status = b"ok\n", "text/plain; charset=utf-8", 200
+        else:
+            body, content_type, status = b"not found\n", "text/plain; charset=utf-8", 404
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 抓取请求很频繁，不写入测试日志
+        pass
+
+class MetricsServer:
+    """在后台线程中提供 /metrics 端点（默认只监听本机，需要其他机器抓取时传入 host="0.0.0.0"）"""
+
+    def __init__(self, port: int = 9464, host: str = "127.0.0.1", registry: Optional[MetricsRegistry] = None):
+        self.host = host
+        self.port = port
+        self.registry = registry or GATEWAY_METRICS.registry
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "MetricsServer":
+        handler = type('MetricsHandler', (_MetricsHandler,), {'registry': self.registry})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]  # port=0 时取实际分配的端口
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        logger.info(f"📈 指标端点已启动: http://{self.host}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def __enter__(self) -> "MetricsServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+def start_metrics_server(port: int, host: str = "127.0.0.1",
+                         registry: Optional[MetricsRegistry] = None) -> MetricsServer:
+    """便捷函数：启动 /metrics 端点并返回服务对象"""
+    return MetricsServer(port, host, registry).start()
@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟网关
+在本机模拟 New API 网关的主要接口，压测和基准工具无需上游配额即可开发、回归：
+- GET  /v1/models
+- POST /v1/embeddings（float / base64，向量由文本哈希确定，结果可复现）
+- POST /v1/audio/speech（分块流式返回 WAV，块大小和块间隔可配置）
+- POST /v1/audio/transcriptions、POST /v1/realtime（multipart 上传，返回固定转录文本）
+- POST /v1/images/generations（返回指向本服务 /mock/images/ 的 URL，图像支持 Range 请求）
+- GET  /v1/realtime WebSocket（session.created -> ... -> transcription.completed 事件流）
+- DashScope 风格异步任务：POST /api/v1/services/aigc/text2image/image-synthesis、GET /api/v1/tasks/{task_id}
+- GET  /mock/stats 请求计数
+
+可配置：每个接口的延迟分布、429/5xx 注入（带 Retry-After）、每秒请求上限和并发上限。
+随机数使用固定种子，同样的配置和请求序列得到同样的结果。
+"""
+
+import json
+import math
+import time
+import uuid
+import random
+import hashlib
+import asyncio
+import argparse
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Any
+from dataclasses import dataclass, field
+
+from aiohttp import web, WSMsgType
+
+import audio_signals
+from rate_limit import TokenBucket
+from embedding_codec import encode_embedding_base64
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MOCK_MODELS = [
+    "paraformer-realtime-8k-v2",
+    "cosyvoice-v2",
+    "text-embedding-v4",
+    "wanx2.1-t2i-turbo",
+]
+
+# 各接口在延迟配置中的名称
+ENDPOINTS = ("models", "embeddings", "speech", "transcriptions", "images", "realtime", "tasks")
+
+@dataclass
+class LatencyProfile:
+    """
+    延迟分布（秒）
+    distribution: fixed / uniform / normal / lognormal / exponential
+    mean 为均值；spread 对 uniform 是半宽，对 normal/lognormal 是标准差
+    """
+    distribution: str = "fixed"
+    mean: float = 0.05
+    spread: float = 0.0
+    minimum: float = 0.0
+    maximum: Optional[float] = None
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyProfile":
+        """解析 "分布:均值[:spread]"，例如 lognormal:0.2:0.05"""
+        parts = spec.split(':')
+        profile = cls(distribution=parts[0], mean=float(parts[1]) if len(parts) > 1 else 0.05)
+        if len(parts) > 2:
+            profile.spread = float(parts[2])
+        return profile
+
+    def sample(self, rng: random.Random) -> float:
+        if self.distribution == "fixed":
+            value = self.mean
+        elif self.distribution == "uniform":
+            value = rng.uniform(self.mean - self.spread, self.mean + self.spread)
+        elif self.distribution == "normal":
+            value = rng.gauss(self.mean, self.spread)
+        elif self.distribution == "lognormal":
+            # 由均值和标准差换算对数正态参数
+            if self.mean <= 0:
+                value = 0.0
+            else:
+                sigma2 = math.log1p((self.spread / self.mean) ** 2)
+                value = rng.lognormvariate(math.log(self.mean) - sigma2 / 2, sigma2 ** 0.5)
+        elif self.distribution == "exponential":
+            value = rng.expovariate(1 / self.mean) if self.mean > 0 else 0.0
+        else:
+            raise ValueError(f"未知的延迟分布: {self.distribution}")
+        value = max(self.minimum, value)
+        return min(self.maximum, value) if self.maximum is not None else value
+
+def base64_decoded_size(data: str) -> int:
+    """base64 字符串解码后的字节数（不实际解码）"""
+    if not data:
+        return 0
+    return len(data) * 3 // 4 - data.count('=', -2)
+
+@dataclass
+class MockGatewayConfig:
+    """模拟网关配置"""
+    host: str = "127.0.0.1"
+    port: int = 3000
+    api_key: Optional[str] = None               # 设置后校验 Bearer 令牌，None 表示不校验
+    seed: int = 0
+    default_latency: LatencyProfile = field(default_factory=LatencyProfile)
+    latency: Dict[str, LatencyProfile] = field(default_factory=dict)  # 接口名 -> 延迟分布
+    error_rate_429: float = 0.0                 # 随机返回 429 的概率
+    error_rate_5xx: float = 0.0                 # 随机返回 500/502/503 的概率
+    retry_after: float = 1.0                    # 429/503 的 Retry-After（秒）
+    max_rps: Optional[float] = None             # 每秒请求上限，超出返回 429
+    max_concurrency: Optional[int] = None       # 同时处理的请求上限，超出的请求排队
+    embedding_dimension: int = 1024
+    speech_sample_rate: int = 22050
+    speech_seconds_per_char: float = 0.15       # 合成音频时长 = 字数 × 该值
+    stream_chunk_bytes: int = 4096              # 流式响应块大小
+    stream_chunk_interval: float = 0.01         # 流式响应块间隔（秒）
+    image_bytes: int = 256 * 1024               # 模拟图像大小
+    task_duration: float = 3.0                  # 异步任务从提交到完成的时间（秒）
+    transcript: str = "这是模拟网关返回的转录文本。"
+    transcript_delta_interval: float = 0.05     # 实时转录增量事件的间隔（秒）
+
+    def latency_for(self, endpoint: str) -> LatencyProfile:
+        return self.latency.get(endpoint, self.default_latency)
+
+class MockGateway:
+    """基于 aiohttp.web 的模拟网关"""
+
+    def __init__(self, config: Optional[MockGatewayConfig] = None):
+        self.config = config or MockGatewayConfig()
+        self.rng = random.Random(self.config.seed)
+        self.limiter = TokenBucket(self.config.max_rps) if self.config.max_rps else None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.stats: Counter = Counter()
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.port = self.config.port
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.config.host}:{self.port}"
+
+    # ---- 启停 ----
+
+    def build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware], client_max_size=1024 ** 3)
+        app.router.add_get('/v1/models', self.handle_models)
+        app.router.add_post('/v1/embeddings', self.handle_embeddings)
+        app.router.add_post('/v1/audio/speech', self.handle_speech)
+        app.router.add_post('/v1/audio/transcriptions', self.handle_transcriptions)
+        app.router.add_post('/v1/realtime', self.handle_transcriptions)
+        app.router.add_get('/v1/realtime', self.handle_realtime)
+        app.router.add_post('/v1/images/generations', self.handle_images)
+        app.router.add_get('/mock/images/{image_id}.png', self.handle_image_file)
+        app.router.add_post('/api/v1/services/aigc/text2image/image-synthesis', self.handle_task_create)
+        app.router.add_get('/api/v1/tasks/{task_id}', self.handle_task_status)
+        app.router.add_get('/mock/stats', self.handle_stats)
+        return app
+
+    async def start(self) -> str:
+        """在当前事件循环中启动，返回基础地址（port=0 时自动分配端口）"""
+        if self.config.max_concurrency:
+            self.semaphore = asyncio.Semaphore(self.config.max_concurrency)
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.config.host, self.config.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        logger.info(f"🧪 模拟网关已启动: {self.base_url}")
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "MockGateway":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def start_in_thread(self) -> str:
+        """在后台线程的独立事件循环中启动，供同步脚本使用"""
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="mock-gateway", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.base_url
+
+    def stop_thread(self):
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    # ---- 公共处理：认证、限流、故障注入、延迟 ----
+
+    @staticmethod
+    def _endpoint_name(request: web.Request) -> str:
+        path = request.path
+        if path.startswith('/v1/models'):
+            return "models"
+        if path.startswith('/v1/embeddings'):
+            return "embeddings"
+        if path.startswith('/v1/audio/speech'):
+            return "speech"
+        if path.startswith('/v1/audio/transcriptions') or (path == '/v1/realtime' and request.method == 'POST'):
+            return "transcriptions"
+        if path == '/v1/realtime':
+            return "realtime"
+        if path.startswith('/v1/images') or path.startswith('/api/v1/services'):
+            return "images"
+        if path.startswith('/api/v1/tasks'):
+            return "tasks"
+        return "mock"
+
+    def _error(self, status: int, message: str, retry_after: bool = False) -> web.Response:
+        headers = {'Retry-After': f"{self.config.retry_after:g}"} if retry_after else None
+        body = {'error': {'message': message, 'type': 'mock_error', 'code': status}}
+        return web.json_response(body, status=status, headers=headers)
+
+    def _check_auth(self, request: web.Request) -> bool:
+        if self.config.api_key is None:
+            return True
+        if request.headers.get('Authorization') == f"Bearer {self.config.api_key}":
+            return True
+        # WebSocket 通过子协议携带密钥
+        protocols = request.headers.get('Sec-WebSocket-Protocol', '')
+        return f"openai-insecure-api-key.{self.config.api_key}" in [p.strip() for p in protocols.split(',')]
+
+    def _inject_fault(self) -> Optional[web.Response]:
+        roll = self.rng.random()
+        if roll < self.config.error_rate_429:
+            return self._error(429, "模拟限流", retry_after=True)
+        if roll < self.config.error_rate_429 + self.config.error_rate_5xx:
+            status = self.rng.choice((500, 502, 503))
+            return self._error(status, "模拟上游错误", retry_after=status == 503)
+        return None
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        endpoint = self._endpoint_name(request)
+        if endpoint == "mock":
+            return await handler(request)
+
+        if not self._check_auth(request):
+            response = self._error(401, "无效的令牌")
+        elif self.limiter is not None and not self.limiter.try_acquire():
+            response = self._error(429, "超过每秒请求上限", retry_after=True)
+        else:
+            response = self._inject_fault()
+        if response is not None:
+            self.stats[f"{endpoint}:{response.status}"] += 1
+            return response
+
+        if self.semaphore is not None and endpoint != "realtime":
+            async with self.semaphore:
+                response = await self._delayed(endpoint, request, handler)
+        else:
+            response = await self._delayed(endpoint, request, handler)
+        self.stats[f"{endpoint}:{response.status}"] += 1
+        return response
+
+    async def _delayed(self, endpoint: str, request: web.Request, handler):
+        # 实时会话的延迟在事件流内部模拟
+        if endpoint != "realtime":
+            await asyncio.sleep(self.config.latency_for(endpoint).sample(self.rng))
+        return await handler(request)
+
+    # ---- HTTP 接口 ----
+
+    async def handle_models(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            'object': 'list',
+            'data': [{'id': model, 'object': 'model', 'owned_by': 'mock'} for model in MOCK_MODELS]
+        })
+
+    def _embedding(self, text: str) -> List[float]:
+        """由文本哈希确定的单位向量"""
+        rng = random.Random(hashlib.sha256(text.encode('utf-8')).digest())
+        vector = [rng.gauss(0.0, 1.0) for _ in range(self.config.embedding_dimension)]
+        norm = sum(x * x for x in vector) ** 0.5 or 1.0
+        return [x / norm for x in vector]
+
+    async def handle_embeddings(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        texts = body.get('input', [])
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts:
+            return self._error(400, "input 不能为空")
+        encoding_format = body.get('encoding_format', 'float')
+        data = []
+        for index, text in enumerate(texts):
+            vector = self._embedding(text)
+            data.append({
+                'object': 'embedding',
+                'index': index,
+                'embedding': encode_embedding_base64(vector) if encoding_format == 'base64' else vector
+            })
+        tokens = sum(len(text) for text in texts)
+        return web.json_response({
+            'object': 'list',
+            'model': body.get('model'),
+            'data': data,
+            'usage': {'prompt_tokens': tokens, 'total_tokens': tokens}
+        })
+
+    async def handle_speech(self, request: web.Request) -> web.StreamResponse:
+        """按配置的块大小和间隔流式返回 WAV"""
+        body = await request.json()
+        text = body.get('input', '')
+        duration = max(0.5, len(text) * self.config.speech_seconds_per_char)
+        audio = audio_signals.to_wav(
+            audio_signals.speech_like(duration, self.config.speech_sample_rate), self.config.speech_sample_rate)
+
+        response = web.StreamResponse(headers={'Content-Type': 'audio/wav'})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        view = memoryview(audio)
+        for offset in range(0, len(view), self.config.stream_chunk_bytes):
+            if offset:
+                await asyncio.sleep(self.config.stream_chunk_interval)
+            await response.write(view[offset:offset + self.config.stream_chunk_bytes])
+        await response.write_eof()
+        return response
+
+    async def handle_transcriptions(self, request: web.Request) -> web.Response:
+        audio_bytes = 0
+        if request.content_type.startswith('multipart/'):
+            reader = await request.multipart()
+            async for part in reader:
+                if part.filename:
+                    while True:
+                        chunk = await part.read_chunk()
+                        if not chunk:
+                            break
+                        audio_bytes += len(chunk)
+                else:
+                    await part.release()
+        else:
+            audio_bytes = len(await request.read())
+        return web.json_response({'text': self.config.transcript, 'audio_bytes': audio_bytes})
+
+    def _image_url(self, request: web.Request, image_id: str) -> str:
+        return f"{request.scheme}://{request.host}/mock/images/{image_id}.png"
+
+    async def handle_images(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        n = int(body.get('n', 1))
+        return web.json_response({
+            'created': int(time.time()),
+            'data': [{
+                'url': self._image_url(request, uuid.UUID(int=self.rng.getrandbits(128)).hex),
+                'revised_prompt': body.get('prompt', '')
+            } for _ in range(n)]
+        })
+
+    def _image_content(self, image_id: str) -> bytes:
+        """由图像 ID 确定的内容（PNG 文件头 + 伪随机字节）"""
+        rng = random.Random(image_id)
+        return b'\x89PNG\r\n\x1a\n' + rng.randbytes(self.config.image_bytes - 8)
+
+    async def handle_image_file(self, request: web.Request) -> web.StreamResponse:
+        """支持单段 Range 请求的图像下载"""
+        data = self._image_content(request.match_info['image_id'])
+        start, end, status = 0, len(data) - 1, 200
+        range_header = request.headers.get('Range', '')
+        if range_header.startswith('bytes='):
+            first, _, last = range_header[6:].partition('-')
+            start = int(first) if first else max(0, len(data) - int(last))
+            end = int(last) if first and last else len(data) - 1
+            if start >= len(data):
+                return web.Response(status=416, headers={'Content-Range': f"bytes */{len(data)}"})
+            end = min(end, len(data) - 1)
+            status = 206
+
+        headers = {'Content-Type': 'image/png', 'Accept-Ranges': 'bytes', 'Content-Length': str(end - start + 1)}
+        if status == 206:
+            headers['Content-Range'] = f"bytes {start}-{end}/{len(data)}"
+        response = web.StreamResponse(status=status, headers=headers)
+        await response.prepare(request)
+        view = memoryview(data)[start:end + 1]
+        for offset in range(0, len(view), self.config.stream_chunk_bytes):
+            await response.write(view[offset:offset + self.config.stream_chunk_bytes])
+        await response.write_eof()
+        return response
+
+    async def handle_task_create(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        task_id = str(uuid.UUID(int=self.rng.getrandbits(128)))
+        self.tasks[task_id] = {
+            'submitted_at': time.monotonic(),
+            'n': int(body.get('parameters', {}).get('n', 1)),
+            'request_host': f"{request.scheme}://{request.host}",
+        }
+        return web.json_response({
+            'request_id': uuid.uuid4().hex,
+            'output': {'task_id': task_id, 'task_status': 'PENDING'}
+        })
+
+    async def handle_task_status(self, request: web.Request) -> web.Response:
+        task_id = request.match_info['task_id']
+        task = self.tasks.get(task_id)
+        if task is None:
+            return self._error(404, f"任务不存在: {task_id}")
+        elapsed = time.monotonic() - task['submitted_at']
+        output: Dict[str, Any] = {'task_id': task_id}
+        if elapsed >= self.config.task_duration:
+            output['task_status'] = 'SUCCEEDED'
+            output['results'] = [
+                {'url': f"{task['request_host']}/mock/images/{hashlib.sha1(f'{task_id}{i}'.encode()).hexdigest()}.png"}
+                for i in range(task['n'])
+            ]
+        else:
+            output['task_status'] = 'RUNNING' if elapsed >= self.config.task_duration / 3 else 'PENDING'
+        return web.json_response({'request_id': uuid.uuid4().hex, 'output': output})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.stats))
+
+    # ---- /v1/realtime WebSocket ----
+
+    async def handle_realtime(self, request: web.Request) -> web.StreamResponse:
+        websocket = web.WebSocketResponse(protocols=("realtime",), heartbeat=None)
+        await websocket.prepare(request)
+        model = request.query.get('model', MOCK_MODELS[0])
+        session_id = f"sess_{uuid.uuid4().hex[:16]}"
+        audio_bytes = 0
+        pending: List[asyncio.Task] = []
+
+        async def send(event: Dict[str, Any]):
+            event.setdefault('event_id', f"event_{uuid.uuid4().hex[:12]}")
+            if not websocket.closed:
+                await websocket.send_str(json.dumps(event, ensure_ascii=False))
+
+        session = {
+            'id': session_id,
+            'object': 'realtime.session',
+            'model': model,
+            'modalities': ['text'],
+            'input_audio_format': 'pcm16',
+            'input_audio_transcription': {'model': model},
+        }
+        await send({'type': 'session.created', 'session': session})
+        await send({'type': 'conversation.created',
+                    'conversation': {'id': f"conv_{uuid.uuid4().hex[:16]}", 'object': 'realtime.conversation'}})
+
+        async def transcribe(item_id: str):
+            await asyncio.sleep(self.config.latency_for("realtime").sample(self.rng))
+            text = self.config.transcript
+            step = max(1, len(text) // 4)
+            for offset in range(0, len(text), step):
+                await send({'type': 'conversation.item.input_audio_transcription.delta',
+                            'item_id': item_id, 'content_index': 0, 'delta': text[offset:offset + step]})
+                await asyncio.sleep(self.config.transcript_delta_interval)
+            await send({'type': 'conversation.item.input_audio_transcription.completed',
+                        'item_id': item_id, 'content_index': 0, 'transcript': text})
+
+        try:
+            async for message in websocket:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    event = json.loads(message.data)
+                except ValueError:
+                    await send({'type': 'error', 'error': {'type': 'invalid_request_error', 'message': '无效的 JSON'}})
+                    continue
+                event_type = event.get('type')
+                self.stats[f"realtime:{event_type}"] += 1
+
+                if event_type == 'session.update':
+                    session.update(event.get('session', {}))
+                    await send({'type': 'session.updated', 'session': session})
+                elif event_type == 'input_audio_buffer.append':
+                    audio_bytes += base64_decoded_size(event.get('audio', ''))
+                elif event_type == 'input_audio_buffer.clear':
+                    audio_bytes = 0
+                    await send({'type': 'input_audio_buffer.cleared'})
+                elif event_type == 'input_audio_buffer.commit':
+                    if audio_bytes == 0:
+                        await send({'type': 'error', 'error': {
+                            'type': 'invalid_request_error',
+                            'code': 'input_audio_buffer_commit_empty',
+                            'message': '音频缓冲区为空'
+                        }})
+                        continue
+                    item_id = f"item_{uuid.uuid4().hex[:16]}"
+                    audio_bytes = 0
+                    await send({'type': 'input_audio_buffer.committed', 'item_id': item_id})
+                    await send({'type': 'conversation.item.created', 'item': {
+                        'id': item_id, 'object': 'realtime.item', 'type': 'message', 'role': 'user',
+                        'content': [{'type': 'input_audio', 'transcript': None}]
+                    }})
+                    pending.append(asyncio.ensure_future(transcribe(item_id)))
+                else:
+                    await send({'type': 'error', 'error': {
+                        'type': 'invalid_request_error', 'message': f"不支持的事件类型: {event_type}"}})
+        finally:
+            for task in pending:
+                task.cancel()
+        return websocket
+
+def parse_latency_overrides(specs: List[str]) -> Dict[str, LatencyProfile]:
+    """解析 --latency 接口名=分布:均值[:spread]"""
+    overrides = {}
+    for spec in specs or []:
+        endpoint, _, profile = spec.partition('=')
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"未知接口 {endpoint}，可选: {', '.join(ENDPOINTS)}")
+        overrides[endpoint] = LatencyProfile.parse(profile)
+    return overrides
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="New API 本地模拟网关")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--api-key', default=None, help="设置后校验令牌")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--default-latency', default="fixed:0.05", help="默认延迟分布，例如 lognormal:0.2:0.05")
+    parser.add_argument('--latency', action='append', default=[],
+                        help="单个接口的延迟分布，例如 embeddings=normal:0.1:0.02（可重复）")
+    parser.add_argument('--error-rate-429', type=float, default=0.0)
+    parser.add_argument('--error-rate-5xx', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=1.0)
+    parser.add_argument('--max-rps', type=float, default=None, help="每秒请求上限")
+    parser.add_argument('--max-concurrency', type=int, default=None, help="并发处理上限")
+    parser.add_argument('--chunk-bytes', type=int, default=4096)
+    parser.add_argument('--chunk-interval', type=float, default=0.01)
+    parser.add_argument('--embedding-dimension', type=int, default=1024)
+    parser.add_argument('--task-duration', type=float, default=3.0)
+    args = parser.parse_args()
+
+    config = MockGatewayConfig(
+        host=args.host,
+        port=args.port,
+        api_key=args.api_key,
+        seed=args.seed,
+        default_latency=LatencyProfile.parse(args.default_latency),
+        latency=parse_latency_overrides(args.latency),
+        error_rate_429=args.error_rate_429,
+        error_rate_5xx=args.error_rate_5xx,
+        retry_after=args.retry_after,
+        max_rps=args.max_rps,
+        max_concurrency=args.max_concurrency,
+        stream_chunk_bytes=args.chunk_bytes,
+        stream_chunk_interval=args.chunk_interval,
+        embedding_dimension=args.embedding_dimension,
+        task_duration=args.task_duration,
+    )
+
+    async def serve():
+        async with MockGateway(config):
+            await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("\n⏹️  模拟网关已停止")
+
+if __name__ == "__main__":
+    main()
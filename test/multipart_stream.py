@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式 multipart/form-data 编码器
+替代 requests 的 files= 和可选依赖 requests_toolbelt：
+- 文件字段按固定大小的块从磁盘读取，边读边发（chunked 传输），不把整个文件放进内存
+- 支持上传进度回调
+- 编码器本身可直接作为 requests（同步迭代）和 aiohttp（异步迭代）的 data 参数，
+  并带有 Content-Length，不必走 chunked 传输
+- 区分上传耗时和服务端处理耗时：请求体最后一块交给连接的时刻记为上传完成，
+  收到响应头的时刻减去上传完成时刻即服务端处理时间
+"""
+
+import os
+import io
+import time
+import uuid
+import logging
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional, Tuple, Any
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# 进度回调：(已发送字节, 总字节)
+ProgressCallback = Callable[[int, int], None]
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+class StreamingMultipartEncoder:
+    """
+    流式 multipart 请求体
+
+    fields 的值可以是：
+    - 字符串/数字：普通表单字段
+    - (filename, source, content_type)：文件字段，source 为文件路径、文件对象或 bytes/memoryview
+    """
+
+    def __init__(self, fields: Dict[str, Any], block_size: int = DEFAULT_BLOCK_SIZE,
+                 progress_callback: Optional[ProgressCallback] = None, boundary: Optional[str] = None):
+        self.fields = fields
+        self.block_size = block_size
+        self.progress_callback = progress_callback
+        self.boundary = boundary or uuid.uuid4().hex
+        self.bytes_sent = 0
+        self.upload_started: Optional[float] = None
+        self.upload_finished: Optional[float] = None
+        self._parts = [self._prepare(name, value) for name, value in fields.items()]
+        self.content_length = sum(len(head) + size + 2 for head, _, size in self._parts) + len(self._closing)
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    @property
+    def _closing(self) -> bytes:
+        return f"--{self.boundary}--\r\n".encode('ascii')
+
+    @property
+    def upload_time(self) -> Optional[float]:
+        if self.upload_started is None or self.upload_finished is None:
+            return None
+        return self.upload_finished - self.upload_started
+
+    def _prepare(self, name: str, value) -> Tuple[bytes, Any, int]:
+        """返回 (分段头, 内容来源, 内容长度)"""
+        if isinstance(value, tuple):
+            filename, source, content_type = (tuple(value) + (None,))[:3]
+            disposition = f'form-data; name="{_escape(name)}"; filename="{_escape(filename)}"'
+            header = (f"--{self.boundary}\r\n"
+                      f"Content-Disposition: {disposition}\r\n"
+                      f"Content-Type: {content_type or 'application/octet-stream'}\r\n\r\n")
+            return header.encode('utf-8'), source, self._source_size(source)
+
+        data = str(value).encode('utf-8')
+        header = (f"--{self.boundary}\r\n"
+                  f'Content-Disposition: form-data; name="{_escape(name)}"\r\n\r\n')
+        return header.encode('utf-8'), data, len(data)
+
+    @staticmethod
+    def _source_size(source) -> int:
+        if isinstance(source, (str, Path)):
+            return os.path.getsize(source)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return len(source)
+        if hasattr(source, 'seek') and hasattr(source, 'tell'):
+            position = source.tell()
+            size = source.seek(0, io.SEEK_END) - position
+            source.seek(position)
+            return size
+        return len(source)
+
+    def _iter_source(self, source) -> Iterator[bytes]:
+        if isinstance(source, (str, Path)):
+            with open(source, 'rb') as f:
+                yield from self._iter_reader(f)
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            view = memoryview(source)
+            for offset in range(0, len(view), self.block_size):
+                yield view[offset:offset + self.block_size]
+        else:
+            yield from self._iter_reader(source)
+
+    def _iter_reader(self, reader) -> Iterator[bytes]:
+        while True:
+            block = reader.read(self.block_size)
+            if not block:
+                return
+            yield block
+
+    def _emit(self, block) -> bytes:
+        self.bytes_sent += len(block)
+        if self.progress_callback is not None:
+            self.progress_callback(self.bytes_sent, self.content_length)
+        return block
+
+    def __len__(self) -> int:
+        return self.content_length
+
+    def __iter__(self) -> Iterator[bytes]:
+        self.bytes_sent = 0
+        self.upload_started = time.perf_counter()
+        self.upload_finished = None
+        for header, source, _ in self._parts:
+            yield self._emit(header)
+            for block in self._iter_source(source):
+                yield self._emit(block)
+            yield self._emit(b"\r\n")
+        yield self._emit(self._closing)
+        self.upload_finished = time.perf_counter()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        """供 aiohttp 作为异步可迭代请求体发送"""
+        for block in self:
+            yield block
+
+def post_multipart(url: str, fields: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+                   timeout: float = 30, block_size: int = DEFAULT_BLOCK_SIZE,
+                   progress_callback: Optional[ProgressCallback] = None,
+                   session: Optional[requests.Session] = None) -> Tuple[requests.Response, Dict[str, Any]]:
+    """
+    以 chunked 传输流式上传 multipart 请求体，返回 (响应, 耗时分解)
+
+    耗时分解：upload_time 上传请求体，server_time 上传完成到收到响应头，
+    download_time 读取响应体，total_time 全程
+    """
+    encoder = StreamingMultipartEncoder(fields, block_size, progress_callback)
+    request_headers = dict(headers or {})
+    request_headers['Content-Type'] = encoder.content_type
+
+    start_time = time.perf_counter()
+    response = (session or requests).post(url, headers=request_headers, data=iter(encoder),
+                                          timeout=timeout, stream=True)
+    headers_at = time.perf_counter()
+    response.content  # 读完响应体
+    end_time = time.perf_counter()
+
+    upload_finished = encoder.upload_finished or headers_at
+    timings = {
+        'upload_bytes': encoder.bytes_sent,
+        'upload_time': round(upload_finished - start_time, 4),
+        'server_time': round(headers_at - upload_finished, 4),
+        'download_time': round(end_time - headers_at, 4),
+        'total_time': round(end_time - start_time, 4),
+        'upload_bytes_per_second': round(encoder.bytes_sent / max(upload_finished - start_time, 1e-9), 1),
+    }
+    logger.info(f"上传 {encoder.bytes_sent} 字节，上传 {timings['upload_time']:.3f}秒，"
+                f"服务端处理 {timings['server_time']:.3f}秒")
+    return response, timings
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程压测引擎
+单个事件循环受 GIL 限制，解析大体积嵌入响应、逐请求日志等开销会让压测端先于网关打满一个核。
+这里把虚拟用户（或开环到达率、总请求数）分片到多个工作进程：
+- 每个工作进程运行自己的事件循环、AsyncNewAPIClient 连接池和 load_runner.LoadRunner
+- 所有工作进程完成建连准备后由协调进程统一发令开始，进程启动和导入耗时不计入压测
+- 工作进程定期通过 Pipe 发回快照（累计直方图 + 按状态码的计数），协调进程汇总显示实时吞吐
+- 结束时发回最终的序列化直方图和时间序列计数，协调进程用 LatencyHistogram.merge 合并，
+  报告字段与 LoadStats.summary() 一致，可直接交给 TestRunner / print_results
+- 安装 uvloop 时工作进程使用 uvloop 事件循环
+
+用法：
+    python3 multiprocess_load.py --model text-embedding-v4 --workers 4 --users 200 --duration 60
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import logging
+import multiprocessing
+from multiprocessing.connection import wait
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+from test_new_api_models import APIConfig
+from async_client import AsyncNewAPIClient, PoolConfig
+from load_runner import LoadConfig, LoadRunner, LoadStats, build_model_factories
+from latency_metrics import LatencyHistogram
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def shard(total: int, parts: int) -> List[int]:
+    """把 total 尽量均匀地分成 parts 份"""
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+def shard_load_config(load_config: LoadConfig, workers: int) -> List[LoadConfig]:
+    """
+    按工作进程拆分虚拟用户、到达率和总请求数（持续时间不变）
+    进程数不超过虚拟用户数（开环时为在途上限）和总请求数，保证每个分片至少分到一个用户和一个请求，
+    合计的用户数、在途上限和请求数与单进程配置一致
+    """
+    workers = min(workers, load_config.virtual_users)
+    if load_config.total_requests is not None:
+        workers = min(workers, load_config.total_requests)
+    workers = max(1, workers)
+    users = shard(load_config.virtual_users, workers)
+    requests = shard(load_config.total_requests, workers) if load_config.total_requests is not None else [None] * workers
+    rate = load_config.arrival_rate / workers if load_config.arrival_rate else None
+    return [replace(load_config, virtual_users=users[index], total_requests=requests[index], arrival_rate=rate)
+            for index in range(workers)]
+
+@dataclass
+class WorkerTask:
+    """发给工作进程的任务（需可 pickle）"""
+    worker_id: int
+    api_config: APIConfig
+    load_config: LoadConfig
+    model: str
+    request_params: Dict[str, Any] = field(default_factory=dict)
+    snapshot_interval: float = 1.0
+
+class _Counters:
+    """从 LoadStats 样本增量统计请求数和状态码"""
+
+    def __init__(self):
+        self.cursor = 0
+        self.total = 0
+        self.by_status: Dict[str, int] = {}
+
+    def update(self, stats: LoadStats) -> Dict[str, Any]:
+        samples = stats.samples
+        end = len(samples)
+        for _, _, status in samples[self.cursor:end]:
+            self.by_status[status] = self.by_status.get(status, 0) + 1
+        self.total += end - self.cursor
+        self.cursor = end
+        return {'total': self.total, 'by_status': dict(self.by_status)}
+
+def _time_series_counts(stats: LoadStats, interval: float) -> Dict[int, List[int]]:
+    """按开始时间分桶的 [请求数, 错误数]，可跨进程相加"""
+    buckets: Dict[int, List[int]] = {}
+    for start, _, status in stats.samples:
+        bucket = buckets.setdefault(int(start // interval), [0, 0])
+        bucket[0] += 1
+        if status != '200':
+            bucket[1] += 1
+    return buckets
+
+async def _worker_run(task: WorkerTask, conn) -> Dict[str, Any]:
+    pool = PoolConfig(max_connections=task.load_config.virtual_users,
+                      max_concurrency=task.load_config.virtual_users)
+    async with AsyncNewAPIClient(task.api_config, pool) as client:
+        with build_model_factories(client, **task.request_params) as factories:
+            factory = factories[task.model]
+            conn.send({'kind': 'ready', 'worker': task.worker_id})
+            # 阻塞等待协调进程的开始信号（所有进程就绪后才发出）
+            await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+
+            stats = LoadStats()
+            counters = _Counters()
+
+            async def report():
+                while True:
+                    await asyncio.sleep(task.snapshot_interval)
+                    conn.send({'kind': 'snapshot', 'worker': task.worker_id,
+                               'counters': counters.update(stats), 'histogram': stats.histogram.to_dict()})
+
+            reporter = asyncio.ensure_future(report())
+            try:
+                await LoadRunner(client, task.load_config).run(factory, stats)
+            finally:
+                reporter.cancel()
+
+    return {
+        'kind': 'final',
+        'worker': task.worker_id,
+        'counters': counters.update(stats),
+        'histogram': stats.histogram.to_dict(),
+        'dropped': stats.dropped,
+        'duration': stats.finished_at - stats.started_at,
+        'time_series': _time_series_counts(stats, task.load_config.time_series_interval),
+    }
+
+def _worker_main(task: WorkerTask, conn):
+    """工作进程入口：逐请求的 INFO 日志本身就是可观的 CPU 开销，工作进程只输出警告"""
+    logging.getLogger().setLevel(logging.WARNING)
+    if uvloop is not None:
+        uvloop.install()
+    try:
+        conn.send(asyncio.run(_worker_run(task, conn)))
+    except Exception as e:
+        conn.send({'kind': 'error', 'worker': task.worker_id, 'error': f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+def merge_worker_results(finals: List[Dict[str, Any]], interval: float) -> Dict[str, Any]:
+    """合并各工作进程的最终结果，字段与 LoadStats.summary() 一致"""
+    histogram = LatencyHistogram()
+    errors_by_status: Dict[str, int] = {}
+    buckets: Dict[int, List[int]] = {}
+    total = dropped = 0
+    duration = 0.0
+    for final in finals:
+        histogram.merge(LatencyHistogram.from_dict(final['histogram']))
+        counters = final['counters']
+        total += counters['total']
+        for status, count in counters['by_status'].items():
+            if status != '200':
+                errors_by_status[status] = errors_by_status.get(status, 0) + count
+        for index, (requests, errors) in final['time_series'].items():
+            bucket = buckets.setdefault(int(index), [0, 0])
+            bucket[0] += requests
+            bucket[1] += errors
+        dropped += final['dropped']
+        duration = max(duration, final['duration'])
+
+    duration = max(duration, 1e-9)
+    successful = histogram.count
+    return {
+        'total_requests': total,
+        'successful_requests': successful,
+        'failed_requests': total - successful,
+        'dropped_arrivals': dropped,
+        'duration': round(duration, 3),
+        'requests_per_second': round(total / duration, 2),
+        'success_rate': f"{(successful / total * 100):.1f}%" if total > 0 else "0%",
+        'latency': histogram.summary(),
+        'latency_histogram': histogram.to_dict(),
+        'errors_by_status': errors_by_status,
+        # 各进程的分位无法相加，时间序列只合并请求数和错误数
+        'time_series': [
+            {'t': round(index * interval, 3), 'requests': requests, 'errors': errors,
+             'rps': round(requests / interval, 2)}
+            for index, (requests, errors) in sorted(buckets.items())
+        ],
+    }
+
+class MultiProcessLoadRunner:
+    """协调进程：启动工作进程、汇总快照并合并最终结果"""
+
+    def __init__(self, api_config: APIConfig, load_config: LoadConfig, workers: Optional[int] = None,
+                 snapshot_interval: float = 1.0, start_timeout: float = 60.0):
+        self.api_config = api_config
+        self.load_config = load_config
+        self.workers = workers or os.cpu_count() or 1
+        self.snapshot_interval = snapshot_interval
+        self.start_timeout = start_timeout
+        # spawn：子进程不继承父进程的事件循环、线程和连接
+        self.context = multiprocessing.get_context('spawn')
+
+    def run_model(self, model: str, **request_params) -> Dict[str, Any]:
+        """用全部工作进程压测一个模型"""
+        shards = shard_load_config(self.load_config, self.workers)
+        processes: List[Tuple[Any, Any]] = []
+        for worker_id, load_config in enumerate(shards):
+            parent_conn, child_conn = self.context.Pipe()
+            task = WorkerTask(worker_id, self.api_config, load_config, model, request_params, self.snapshot_interval)
+            process = self.context.Process(target=_worker_main, args=(task, child_conn), daemon=True)
+            process.start()
+            child_conn.close()
+            processes.append((process, parent_conn))
+
+        try:
+            finals, errors = self._collect(model, [conn for _, conn in processes])
+        finally:
+            for process, conn in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+                conn.close()
+
+        if not finals:
+            raise RuntimeError(f"全部工作进程失败: {errors}")
+        summary = merge_worker_results(finals, self.load_config.time_series_interval)
+        summary.update({
+            'model': model,
+            'mode': 'open' if self.load_config.arrival_rate else 'closed',
+            'virtual_users': self.load_config.virtual_users,
+            'workers': len(shards),
+            'worker_errors': errors,
+            'per_worker': [
+                {'worker': f['worker'], 'requests': f['counters']['total'],
+                 'requests_per_second': round(f['counters']['total'] / max(f['duration'], 1e-9), 2)}
+                for f in sorted(finals, key=lambda f: f['worker'])
+            ],
+        })
+        return summary
+
+    def _collect(self, model: str, conns: List[Any]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """等待就绪后统一开始，随后接收快照直到所有工作进程结束"""
+        ready = 0
+        finals: List[Dict[str, Any]] = []
+        errors: List[str] = []
+        snapshots: Dict[int, Dict[str, Any]] = {}
+        pending = list(conns)
+        started = False
+        deadline = time.monotonic() + self.start_timeout
+        last_progress = time.monotonic()
+
+        while pending:
+            if not started and time.monotonic() > deadline:
+                raise TimeoutError(f"工作进程 {self.start_timeout}s 内未全部就绪")
+            for conn in wait(pending, timeout=self.snapshot_interval):
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    errors.append("工作进程意外退出")
+                    pending.remove(conn)
+                    continue
+                kind = message['kind']
+                if kind == 'ready':
+                    ready += 1
+                elif kind == 'snapshot':
+                    snapshots[message['worker']] = message
+                elif kind == 'final':
+                    finals.append(message)
+                    pending.remove(conn)
+                elif kind == 'error':
+                    errors.append(f"worker {message['worker']}: {message['error']}")
+                    pending.remove(conn)
+
+            if not started and ready + len(errors) >= len(conns):
+                started = True
+                started_at = time.monotonic()
+                for conn in pending:
+                    conn.send('start')
+                logger.info(f"🚀 {len(pending)} 个工作进程开始压测 {model}")
+            if started and snapshots and time.monotonic() - last_progress >= self.snapshot_interval:
+                last_progress = time.monotonic()
+                self._log_progress(model, snapshots, last_progress - started_at)
+        return finals, errors
+
+    def _log_progress(self, model: str, snapshots: Dict[int, Dict[str, Any]], elapsed: float):
+        histogram = LatencyHistogram()
+        total = 0
+        for snapshot in snapshots.values():
+            histogram.merge(LatencyHistogram.from_dict(snapshot['histogram']))
+            total += snapshot['counters']['total']
+        latency = histogram.summary()
+        logger.info(f"   {model}: {total} 请求，{total / max(elapsed, 1e-9):.1f} req/s，"
+                    f"p50 {latency['p50_ms']}ms p99 {latency['p99_ms']}ms")
+
+    def run(self, models: List[str], **request_params) -> List[Dict[str, Any]]:
+        results = []
+        for model in models:
+            summary = self.run_model(model, **request_params)
+            logger.info(f"📊 {model}: {summary['requests_per_second']} req/s（{summary['workers']} 进程），"
+                        f"p99 {summary['latency']['p99_ms']}ms, 错误 {summary['failed_requests']}")
+            results.append(summary)
+        return results
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="New API 平台多进程压测")
+    parser.add_argument('--base-url', default=os.getenv("NEW_API_BASE_URL", "http://127.0.0.1:3000"))
+    parser.add_argument('--model', action='append', help="压测的模型，可重复（默认 text-embedding-v4 和 cosyvoice-v2）")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数，默认 CPU 核数")
+    parser.add_argument('--users', type=int, default=100, help="虚拟用户总数 / 开环在途上限总数")
+    parser.add_argument('--duration', type=float, default=30.0, help="持续时间（秒）")
+    parser.add_argument('--requests', type=int, default=None, help="总请求数上限")
+    parser.add_argument('--rate', type=float, default=None, help="开环总到达率（请求/秒）")
+    parser.add_argument('--poisson', action='store_true', help="开环模式使用泊松到达")
+    parser.add_argument('--snapshot-interval', type=float, default=1.0, help="工作进程快照间隔（秒）")
+    args = parser.parse_args()
+
+    from test_new_api_models import TestRunner, print_results
+
+    config = APIConfig(
+        base_url=args.base_url,
+        api_key=os.getenv("NEW_API_KEY", "sk-WFXP99kKWeu9BhV3UiypR6wj2tb2x5d08TLGWgiLHiDG9r8Q"),
+        timeout=60
+    )
+    try:
+        load_config = LoadConfig(
+            virtual_users=args.users,
+            duration=args.duration,
+            total_requests=args.requests,
+            arrival_rate=args.rate,
+            poisson_arrivals=args.poisson,
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    runner = MultiProcessLoadRunner(config, load_config, workers=args.workers,
+                                    snapshot_interval=args.snapshot_interval)
+    test_runner = TestRunner(config)
+    try:
+        test_runner.load_results.extend(runner.run(args.model or ["text-embedding-v4", "cosyvoice-v2"]))
+    except KeyboardInterrupt:
+        print("\n\n⏹️  压测被用户中断")
+        return
+    report = test_runner.generate_report()
+    print_results(report)
+    for result in report['load_test_results']:
+        per_worker = "  ".join(f"#{w['worker']} {w['requests_per_second']}/s" for w in result['per_worker'])
+        print(f"   {result['model']} 各进程吞吐: {per_worker}")
+        if result['worker_errors']:
+            print(f"   ⚠️ 工作进程错误: {result['worker_errors']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持续合成探测守护进程
+quick_test_example.py、verify_api_key.py、TestRunner 都是手动跑一次的脚本，
+放进 cron 循环时每次都要付出解释器启动和 TLS 握手的代价。这里改为常驻进程：
+- 每个模型一个轻量探测（嵌入、语音合成、语音识别、图像生成、实时会话握手），各自的间隔可配置
+- 所有 HTTP 探测共用一个 AsyncNewAPIClient 连接池，同时执行的探测数有上限
+- 首次执行在一个间隔内随机错开，之后每次间隔加随机抖动，避免同时触发
+- 按滚动窗口（默认 5 分钟 / 1 小时）统计可用率和 p50/p90/p99 延迟，
+  定期写入状态文件，并通过 metrics_exporter 暴露给 Prometheus
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+from collections import deque
+from pathlib import Path
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Any, Tuple
+from dataclasses import dataclass, replace
+
+import audio_signals
+from test_new_api_models import APIConfig, ParaformerTester, CosyVoiceTester, TextEmbeddingTester
+from async_client import AsyncNewAPIClient, APIResponse, PoolConfig
+from latency_metrics import percentile
+from realtime_client import connect_realtime, wait_for_event, SESSION_CREATED
+from metrics_exporter import GATEWAY_METRICS, start_metrics_server
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ProbeSpec:
+    """单个探测的配置"""
+    name: str
+    model: str
+    interval: float           # 两次探测的间隔（秒）
+    timeout: float = 30.0     # 单次探测超时（秒）
+    jitter: float = 0.1       # 间隔的随机抖动比例
+
+# 默认探测集合；图像生成按次计费，默认间隔较长
+DEFAULT_PROBES = [
+    ProbeSpec("embedding", "text-embedding-v4", interval=30.0, timeout=15.0),
+    ProbeSpec("tts", "cosyvoice-v2", interval=60.0, timeout=30.0),
+    ProbeSpec("asr", "paraformer-realtime-8k-v2", interval=60.0, timeout=30.0),
+    ProbeSpec("image", "wanx2.1-t2i-turbo", interval=900.0, timeout=120.0),
+    ProbeSpec("realtime", "paraformer-realtime-8k-v2", interval=60.0, timeout=10.0),
+]
+
+@dataclass
+class ProbeOutcome:
+    """单次探测结果"""
+    timestamp: float          # 墙上时间，用于状态文件
+    success: bool
+    latency: float            # 秒（单调时钟）
+    status: str               # HTTP 状态码、timeout 或异常类型
+    error: str = ""
+
+class RollingWindow:
+    """按时间滚动的探测结果窗口"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.samples: Deque[Tuple[float, bool, float]] = deque()  # (单调时间, 是否成功, 延迟)
+
+    def add(self, now: float, success: bool, latency: float):
+        self.samples.append((now, success, latency))
+        self._evict(now)
+
+    def _evict(self, now: float):
+        while self.samples and self.samples[0][0] < now - self.seconds:
+            self.samples.popleft()
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        self._evict(now)
+        total = len(self.samples)
+        successes = sum(1 for _, ok, _ in self.samples if ok)
+        latencies = sorted(lat for _, ok, lat in self.samples if ok)
+        return {
+            'probes': total,
+            'failures': total - successes,
+            'availability': round(successes / total, 4) if total else None,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p90_ms': round(percentile(latencies, 90) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        }
+
+ProbeFunction = Callable[["ProbeDaemon", ProbeSpec], Awaitable[Tuple[str, str]]]
+
+def _window_label(seconds: float) -> str:
+    """300 -> 5m，3600 -> 1h"""
+    if seconds % 3600 == 0:
+        return f"{int(seconds // 3600)}h"
+    if seconds % 60 == 0:
+        return f"{int(seconds // 60)}m"
+    return f"{int(seconds)}s"
+
+QUANTILES = (('p50', '0.5'), ('p90', '0.9'), ('p99', '0.99'))
+
+class ProbeDaemon:
+    """按间隔调度探测，维护滚动窗口统计"""
+
+    def __init__(self, config: APIConfig, specs: Optional[List[ProbeSpec]] = None,
+                 pool: Optional[PoolConfig] = None, concurrency: int = 4,
+                 windows: Tuple[float, ...] = (300.0, 3600.0), seed: Optional[int] = None):
+        self.config = config
+        self.specs = specs or list(DEFAULT_PROBES)
+        self.pool = pool or PoolConfig(max_connections=8, max_concurrency=max(1, concurrency))
+        self.concurrency = concurrency
+        self.window_seconds = windows
+        self.rng = random.Random(seed)
+        self.client: Optional[AsyncNewAPIClient] = None
+        self.windows: Dict[str, List[RollingWindow]] = {spec.name: [RollingWindow(w) for w in windows]
+                                                        for spec in self.specs}
+        self.last: Dict[str, ProbeOutcome] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._asr_audio: Optional[bytes] = None
+
+        registry = GATEWAY_METRICS.registry
+        self._runs = registry.counter("newapi_probe_runs_total", "探测执行次数", ('probe', 'model', 'outcome'))
+        self._up = registry.gauge("newapi_probe_up", "最近一次探测是否成功", ('probe', 'model'))
+        self._availability = registry.gauge("newapi_probe_availability_ratio", "滚动窗口内的探测成功率",
+                                            ('probe', 'model', 'window'))
+        self._latency = registry.gauge("newapi_probe_latency_seconds", "滚动窗口内成功探测的延迟分位",
+                                       ('probe', 'model', 'window', 'quantile'))
+
+    # ---- 探测实现 ----
+
+    async def _http_probe(self, spec: ProbeSpec, method: str, endpoint: str, kwargs: Dict[str, Any],
+                          check: Callable[[APIResponse], bool]) -> Tuple[str, str]:
+        response = await self.client.request(method, endpoint, timeout=spec.timeout, **kwargs)
+        status = str(response.status_code)
+        if response.status_code != 200:
+            return status, response.text[:200]
+        try:
+            return status, "" if check(response) else "响应内容不符合预期"
+        except (ValueError, KeyError, TypeError) as e:
+            return status, f"响应解析失败: {e}"
+
+    async def probe_embedding(self, spec: ProbeSpec) -> Tuple[str, str]:
+        tester = TextEmbeddingTester(self.client, encoding_format="base64")
+        tester.model = spec.model
+        method, endpoint, kwargs = tester.build_request(["探测"])
+        return await self._http_probe(spec, method, endpoint, kwargs,
+                                      lambda r: bool(r.json().get('data')))
+
+    async def probe_tts(self, spec: ProbeSpec) -> Tuple[str, str]:
+        tester = CosyVoiceTester(self.client)
+        tester.model = spec.model
+        method, endpoint, kwargs = tester.build_request("探测")
+        return await self._http_probe(spec, method, endpoint, kwargs, lambda r: len(r.content) > 0)
+
+    async def probe_asr(self, spec: ProbeSpec) -> Tuple[str, str]:
+        if self._asr_audio is None:
+            # 1 秒 8kHz 类语音信号，只生成一次
+            self._asr_audio = audio_signals.to_wav(audio_signals.speech_like(1.0, 8000), 8000)
+        tester = ParaformerTester(self.client)
+        tester.model = spec.model
+        method, endpoint, kwargs = tester.build_request(audio_data=self._asr_audio)
+        return await self._http_probe(spec, method, endpoint, kwargs, lambda r: 'text' in r.json())
+
+    async def probe_image(self, spec: ProbeSpec) -> Tuple[str, str]:
+        payload = {"model": spec.model, "prompt": "一个红色的圆形", "n": 1, "size": "1024x1024",
+                   "response_format": "url"}
+        return await self._http_probe(spec, 'POST', '/v1/images/generations', {'json': payload},
+                                      lambda r: bool(r.json().get('data')))
+
+    async def probe_realtime(self, spec: ProbeSpec) -> Tuple[str, str]:
+        """只做握手：建立连接并等到 session.created"""
+        websocket = await connect_realtime(self.config.base_url, self.config.api_key, spec.model,
+                                           open_timeout=spec.timeout)
+        GATEWAY_METRICS.session_opened(spec.model)
+        outcome = 'error'
+        try:
+            async with websocket:
+                await wait_for_event(websocket, SESSION_CREATED, spec.timeout)
+                outcome = 'success'
+                return "101", ""
+        finally:
+            GATEWAY_METRICS.session_closed(spec.model, outcome)
+
+    PROBES: Dict[str, ProbeFunction] = {
+        'embedding': probe_embedding,
+        'tts': probe_tts,
+        'asr': probe_asr,
+        'image': probe_image,
+        'realtime': probe_realtime,
+    }
+
+    # ---- 调度 ----
+
+    async def run_probe(self, spec: ProbeSpec) -> ProbeOutcome:
+        """执行一次探测并记录结果"""
+        probe = self.PROBES[spec.name]
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                status, error = await asyncio.wait_for(probe(self, spec), timeout=spec.timeout)
+            except asyncio.TimeoutError:
+                status, error = 'timeout', f"超过 {spec.timeout}秒"
+            except Exception as e:
+                status, error = type(e).__name__, str(e)[:200]
+            latency = time.perf_counter() - start
+
+        outcome = ProbeOutcome(time.time(), not error, latency, status, error)
+        self._record(spec, outcome)
+        return outcome
+
+    def _record(self, spec: ProbeSpec, outcome: ProbeOutcome):
+        now = time.monotonic()
+        self.last[spec.name] = outcome
+        self._runs.inc(probe=spec.name, model=spec.model, outcome='success' if outcome.success else 'failure')
+        self._up.set(1 if outcome.success else 0, probe=spec.name, model=spec.model)
+        for window in self.windows[spec.name]:
+            window.add(now, outcome.success, outcome.latency)
+            stats = window.stats(now)
+            label = _window_label(window.seconds)
+            self._availability.set(stats['availability'], probe=spec.name, model=spec.model, window=label)
+            for key, quantile in QUANTILES:
+                self._latency.set(stats[f'{key}_ms'] / 1000, probe=spec.name, model=spec.model,
+                                  window=label, quantile=quantile)
+        if not outcome.success:
+            logger.warning(f"❌ 探测 {spec.name}（{spec.model}）失败: {outcome.status} {outcome.error}")
+
+    async def _loop(self, spec: ProbeSpec, deadline: float):
+        # 首次执行在一个间隔内随机错开
+        await asyncio.sleep(self.rng.uniform(0, spec.interval))
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            await self.run_probe(spec)
+            delay = spec.interval * (1 + self.rng.uniform(-spec.jitter, spec.jitter))
+            await asyncio.sleep(max(0.0, delay - (time.monotonic() - started)))
+
+    def status(self) -> Dict[str, Any]:
+        """当前各探测的滚动窗口统计"""
+        now = time.monotonic()
+        probes = {}
+        for spec in self.specs:
+            last = self.last.get(spec.name)
+            probes[spec.name] = {
+                'model': spec.model,
+                'interval': spec.interval,
+                'last': {
+                    'time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(last.timestamp)),
+                    'success': last.success,
+                    'latency_ms': round(last.latency * 1000, 2),
+                    'status': last.status,
+                    'error': last.error,
+                } if last else None,
+                'windows': {_window_label(w.seconds): w.stats(now) for w in self.windows[spec.name]},
+            }
+        return {'updated_at': time.strftime("%Y-%m-%d %H:%M:%S"), 'probes': probes}
+
+    def _write_status(self, path: Path):
+        """原子替换状态文件"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.status(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def _log_status(self):
+        for name, item in self.status()['probes'].items():
+            window = next(iter(item['windows'].values()))
+            if window['probes']:
+                logger.info(f"📡 {name}（{item['model']}）: 可用率 {window['availability'] * 100:.1f}%，"
+                            f"p50 {window['p50_ms']}ms，p99 {window['p99_ms']}ms，共 {window['probes']} 次")
+
+    async def run(self, duration: Optional[float] = None, status_file: Optional[str] = None,
+                  report_interval: float = 60.0) -> Dict[str, Any]:
+        """运行探测直到 duration 秒后（None 表示一直运行），返回最终状态"""
+        deadline = time.monotonic() + duration if duration is not None else float('inf')
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        logger.info(f"🚀 启动 {len(self.specs)} 个探测: " +
+                    ", ".join(f"{s.name}/{s.model} 每 {s.interval:g}秒" for s in self.specs))
+
+        async with AsyncNewAPIClient(self.config, self.pool) as client:
+            self.client = client
+            loops = [asyncio.ensure_future(self._loop(spec, deadline)) for spec in self.specs]
+            try:
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(min(report_interval, max(0.0, deadline - time.monotonic())))
+                    self._log_status()
+                    if status_file:
+                        self._write_status(Path(status_file))
+            finally:
+                for task in loops:
+                    task.cancel()
+                await asyncio.gather(*loops, return_exceptions=True)
+                self.client = None
+        return self.status()
+
+def parse_interval_overrides(values: List[str]) -> Dict[str, float]:
+    """解析 name=seconds 形式的间隔覆盖"""
+    overrides = {}
+    for value in values or []:
+        name, _, seconds = value.partition('=')
+        if not seconds:
+            raise ValueError(f"间隔参数格式应为 name=seconds: {value}")
+        overrides[name.strip()] = float(seconds)
+    return overrides
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="New API 平台持续合成探测")
+    parser.add_argument('--base-url', default=os.getenv("NEW_API_BASE_URL", "http://127.0.0.1:3000"))
+    parser.add_argument('--probe', action='append', choices=sorted(ProbeDaemon.PROBES),
+                        help="只运行指定探测，可重复")
+    parser.add_argument('--interval', action='append', help="覆盖探测间隔，如 embedding=10，可重复")
+    parser.add_argument('--concurrency', type=int, default=4, help="同时执行的探测数上限")
+    parser.add_argument('--duration', type=float, default=None, help="运行时长（秒），默认一直运行")
+    parser.add_argument('--report-interval', type=float, default=60.0, help="汇总日志和状态文件的刷新间隔（秒）")
+    parser.add_argument('--status-file', default="test_outputs/probe_status.json")
+    parser.add_argument('--metrics-port', type=int, default=None, help="在该端口提供 Prometheus /metrics 端点")
+    parser.add_argument('--metrics-host', default="127.0.0.1", help="/metrics 端点监听地址，0.0.0.0 供其他机器抓取")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    config = APIConfig(
+        base_url=args.base_url,
+        api_key=os.getenv("NEW_API_KEY", "sk-WFXP99kKWeu9BhV3UiypR6wj2tb2x5d08TLGWgiLHiDG9r8Q"),
+        timeout=60
+    )
+    overrides = parse_interval_overrides(args.interval)
+    specs = [replace(spec, interval=overrides.get(spec.name, spec.interval))
+             for spec in DEFAULT_PROBES if not args.probe or spec.name in args.probe]
+
+    if args.metrics_port is not None:
+        start_metrics_server(args.metrics_port, args.metrics_host)
+
+    daemon = ProbeDaemon(config, specs, concurrency=args.concurrency, seed=args.seed)
+    try:
+        status = asyncio.run(daemon.run(args.duration, args.status_file, args.report_interval))
+        print(json.dumps(status, ensure_ascii=False, indent=2))
+    except KeyboardInterrupt:
+        print("\n\n⏹️  探测已停止")
+
+if __name__ == "__main__":
+    main()
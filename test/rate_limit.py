@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自适应令牌桶限速器
+批量任务按令牌桶速率发请求，取代固定的 time.sleep：
+- 令牌以 rate 个/秒补充，最多积攒 burst 个，允许短时突发
+- 收到 429 时速率乘性下降，并在 Retry-After 指定的时间内暂停发放令牌
+- 每次成功后速率加性恢复，直到初始速率（AIMD）
+- 线程安全，同时提供同步 acquire 和异步 acquire_async
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头：秒数或 HTTP 日期，无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """线程安全的自适应令牌桶"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, min_rate: Optional[float] = None,
+                 decrease_factor: float = 0.5, recovery_step: Optional[float] = None,
+                 default_backoff: float = 1.0):
+        """
+        rate: 初始（也是最大）速率，请求/秒
+        burst: 桶容量，默认等于 max(1, rate)
+        min_rate: 速率下限，默认 rate 的 1/20
+        decrease_factor: 收到 429 时速率乘以该系数
+        recovery_step: 每次成功后速率增加量，默认 max_rate 的 1/20
+        default_backoff: 429 未带 Retry-After 时的暂停秒数
+        """
+        if rate <= 0:
+            raise ValueError("rate 必须大于 0")
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.min_rate = min_rate if min_rate is not None else rate / 20
+        self.decrease_factor = decrease_factor
+        self.recovery_step = recovery_step if recovery_step is not None else self.max_rate / 20
+        self.default_backoff = default_backoff
+        self.tokens = self.burst
+        self.paused_until = 0.0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        # 暂停期间不补充令牌
+        elapsed = now - max(self._updated, self.paused_until)
+        self._updated = now
+        if elapsed > 0:
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+
+    def _pause_remaining(self) -> float:
+        with self._lock:
+            return max(0.0, self.paused_until - time.monotonic())
+
+    def _reserve(self, tokens: float) -> float:
+        """预占令牌，返回调用方需要等待的秒数（令牌可以透支，等待期间视为排队）"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= tokens
+            wait = max(0.0, self.paused_until - now)
+            if self.tokens < 0:
+                wait += -self.tokens / self.rate
+            self.total_wait += wait
+            return wait
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """阻塞直到获得令牌，返回排队等待的秒数"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        # 排队期间其他请求触发了限流，继续等到暂停结束
+        pause = self._pause_remaining()
+        while pause > 0:
+            time.sleep(pause)
+            wait += pause
+            pause = self._pause_remaining()
+        return wait
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        """acquire 的协程版本"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        pause = self._pause_remaining()
+        while pause > 0:
+            await asyncio.sleep(pause)
+            wait += pause
+            pause = self._pause_remaining()
+        return wait
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """非阻塞获取令牌，令牌不足或处于暂停期时返回 False"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.paused_until or self.tokens < tokens:
+                return False
+            self.tokens -= tokens
+            return True
+
+    def on_success(self):
+        """请求成功：速率加性恢复"""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.recovery_step)
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        """收到 429：速率乘性下降，并暂停发放令牌"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.throttled += 1
+            # 同一暂停窗口内并发返回的多个 429 只降一次速
+            if now >= self.paused_until:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            pause = retry_after if retry_after is not None else self.default_backoff
+            self.paused_until = max(self.paused_until, now + pause)
+            # 暂停结束后从空桶开始，避免恢复瞬间的突发再次触发限流
+            self.tokens = min(self.tokens, 0.0)
+        logger.warning(f"⏳ 触发限流，暂停 {pause:.1f}秒，速率降至 {self.rate:.2f} 请求/秒")
+
+    def stats(self) -> Dict[str, Any]:
+        """限速器状态，用于测试报告"""
+        return {
+            'max_rate': self.max_rate,
+            'current_rate': round(self.rate, 3),
+            'burst': self.burst,
+            'throttled': self.throttled,
+            'total_wait': round(self.total_wait, 3),
+        }
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+/v1/realtime WebSocket 连接工具
+与 test_paraformer_audio.py / debug_websocket.py 使用相同的子协议认证：
+    realtime, openai-insecure-api-key.<key>, openai-beta.realtime-v1
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Any
+from urllib.parse import urlsplit, urlunsplit, quote
+
+import websockets
+
+from realtime_codec import DEFAULT_CODEC
+
+logger = logging.getLogger(__name__)
+
+# 会话就绪事件
+SESSION_CREATED = "session.created"
+
+def realtime_url(base_url: str, model: str) -> str:
+    """把 HTTP 基础地址转换为 /v1/realtime 的 WebSocket 地址"""
+    parts = urlsplit(base_url.rstrip('/'))
+    scheme = {'http': 'ws', 'https': 'wss'}.get(parts.scheme, parts.scheme)
+    path = f"{parts.path}/v1/realtime"
+    return urlunsplit((scheme, parts.netloc, path, f"model={quote(model)}", ''))
+
+def realtime_subprotocols(api_key: str) -> List[str]:
+    """子协议认证列表"""
+    return [
+        "realtime",
+        f"openai-insecure-api-key.{api_key}",
+        "openai-beta.realtime-v1"
+    ]
+
+async def connect_realtime(base_url: str, api_key: str, model: str, **kwargs):
+    """建立 /v1/realtime 连接，额外参数透传给 websockets.connect"""
+    return await websockets.connect(
+        realtime_url(base_url, model),
+        subprotocols=realtime_subprotocols(api_key),
+        **kwargs
+    )
+
+async def wait_for_event(websocket, event_type: str, timeout: float = 5.0) -> List[Dict[str, Any]]:
+    """等待指定类型的事件，返回途中收到的全部事件（最后一个即目标事件）"""
+    events = []
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            raise asyncio.TimeoutError(f"等待 {event_type} 超时")
+        message = await asyncio.wait_for(websocket.recv(), timeout=remaining)
+        event = DEFAULT_CODEC.loads(message)
+        events.append(event)
+        if event.get('type') == event_type:
+            return events
+        if event.get('type') == 'error':
+            raise RuntimeError(f"服务端返回错误: {event.get('error')}")
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时事件编解码层
+- 实时事件词表（session.update、input_audio_buffer.append/commit、转录事件等）用 dataclass 定义类型化 schema
+- 可插拔后端，按 msgspec > orjson > 标准库 json 的顺序自动选择，也可用 REALTIME_CODEC 环境变量指定：
+  * msgspec：由同一份 schema 生成以 type 字段为标签的 Struct，解码时直接校验，再转为同一组 dataclass
+  * orjson：C 实现的 dumps/loads，schema 与字典之间按预先计算的字段表转换
+  * json：标准库回退
+- 所有后端 decode 的结果一致：已知事件类型返回 dataclass，字段类型不符时抛出 ValueError，
+  未知事件类型返回字典
+- loads/dumps 是不构造类型化对象的字典快速路径（RealtimeEventConsumer、wait_for_event 使用）
+- 直接运行本文件是编解码微基准：逐个事件类型比较各后端的编码、解码耗时
+
+用法：
+    python3 realtime_codec.py --iterations 20000
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import dataclasses
+from dataclasses import dataclass, field
+from typing import Any, ClassVar, Dict, List, Optional, Tuple, Type, Union, get_args, get_origin
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# ---- 事件 schema ----
+
+@dataclass
+class RealtimeEvent:
+    """实时事件基类，TYPE 为事件的 type 字段"""
+    TYPE: ClassVar[str] = ""
+
+@dataclass
+class SessionUpdate(RealtimeEvent):
+    TYPE: ClassVar[str] = "session.update"
+    session: Dict[str, Any] = field(default_factory=dict)
+    event_id: Optional[str] = None
+
+@dataclass
+class InputAudioBufferAppend(RealtimeEvent):
+    TYPE: ClassVar[str] = "input_audio_buffer.append"
+    audio: str = ""
+    event_id: Optional[str] = None
+
+@dataclass
+class InputAudioBufferCommit(RealtimeEvent):
+    TYPE: ClassVar[str] = "input_audio_buffer.commit"
+    event_id: Optional[str] = None
+
+@dataclass
+class InputAudioBufferClear(RealtimeEvent):
+    TYPE: ClassVar[str] = "input_audio_buffer.clear"
+    event_id: Optional[str] = None
+
+@dataclass
+class SessionCreated(RealtimeEvent):
+    TYPE: ClassVar[str] = "session.created"
+    session: Dict[str, Any] = field(default_factory=dict)
+    event_id: Optional[str] = None
+
+@dataclass
+class SessionUpdated(RealtimeEvent):
+    TYPE: ClassVar[str] = "session.updated"
+    session: Dict[str, Any] = field(default_factory=dict)
+    event_id: Optional[str] = None
+
+@dataclass
+class InputAudioBufferCommitted(RealtimeEvent):
+    TYPE: ClassVar[str] = "input_audio_buffer.committed"
+    item_id: str = ""
+    previous_item_id: Optional[str] = None
+    audio_end_ms: Optional[int] = None
+    event_id: Optional[str] = None
+
+@dataclass
+class TranscriptionDelta(RealtimeEvent):
+    TYPE: ClassVar[str] = "conversation.item.input_audio_transcription.delta"
+    item_id: str = ""
+    content_index: int = 0
+    delta: str = ""
+    event_id: Optional[str] = None
+
+@dataclass
+class TranscriptionCompleted(RealtimeEvent):
+    TYPE: ClassVar[str] = "conversation.item.input_audio_transcription.completed"
+    item_id: str = ""
+    content_index: int = 0
+    transcript: str = ""
+    event_id: Optional[str] = None
+
+@dataclass
+class TranscriptionFailed(RealtimeEvent):
+    TYPE: ClassVar[str] = "conversation.item.input_audio_transcription.failed"
+    item_id: str = ""
+    content_index: int = 0
+    error: Dict[str, Any] = field(default_factory=dict)
+    event_id: Optional[str] = None
+
+@dataclass
+class ErrorEvent(RealtimeEvent):
+    TYPE: ClassVar[str] = "error"
+    error: Dict[str, Any] = field(default_factory=dict)
+    event_id: Optional[str] = None
+
+EVENT_SCHEMAS: Tuple[Type[RealtimeEvent], ...] = (
+    SessionUpdate, InputAudioBufferAppend, InputAudioBufferCommit, InputAudioBufferClear,
+    SessionCreated, SessionUpdated, InputAudioBufferCommitted,
+    TranscriptionDelta, TranscriptionCompleted, TranscriptionFailed, ErrorEvent,
+)
+SCHEMA_BY_TYPE: Dict[str, Type[RealtimeEvent]] = {schema.TYPE: schema for schema in EVENT_SCHEMAS}
+
+# 每个 schema 的字段名，字典与对象互转时不必每次调用 dataclasses.fields
+_FIELD_NAMES: Dict[type, Tuple[str, ...]] = {
+    schema: tuple(f.name for f in dataclasses.fields(schema)) for schema in EVENT_SCHEMAS
+}
+
+def _runtime_types(annotation) -> Tuple[type, ...]:
+    """字段注解对应的运行时类型：Optional[str] -> (str, NoneType)，Dict[str, Any] -> (dict,)"""
+    if annotation is Any:
+        return (object,)
+    if get_origin(annotation) is Union:
+        return tuple(t for arg in get_args(annotation) for t in _runtime_types(arg))
+    return (get_origin(annotation) or annotation,)
+
+# 每个 schema 的 (字段名, 允许的运行时类型)，与 msgspec 的校验规则一致（bool 不算 int）
+_FIELD_TYPES: Dict[type, Tuple[Tuple[str, Tuple[type, ...]], ...]] = {
+    schema: tuple((f.name, _runtime_types(f.type)) for f in dataclasses.fields(schema)) for schema in EVENT_SCHEMAS
+}
+
+def event_to_dict(event: RealtimeEvent) -> Dict[str, Any]:
+    """类型化事件转为字典（type 在前，值为 None 的可选字段省略）"""
+    data: Dict[str, Any] = {'type': event.TYPE}
+    for name in _FIELD_NAMES[type(event)]:
+        value = getattr(event, name)
+        if value is not None:
+            data[name] = value
+    return data
+
+def event_from_dict(data: Dict[str, Any]) -> Union[RealtimeEvent, Dict[str, Any]]:
+    """字典转为类型化事件；未知事件类型原样返回字典，多余字段忽略，字段类型不符时抛出 ValueError"""
+    schema = SCHEMA_BY_TYPE.get(data.get('type'))
+    if schema is None:
+        return data
+    kwargs = {}
+    for name, types in _FIELD_TYPES[schema]:
+        if name not in data:
+            continue
+        value = data[name]
+        if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+            raise ValueError(f"{schema.TYPE} 事件的字段 {name} 类型不符: {type(value).__name__}")
+        kwargs[name] = value
+    return schema(**kwargs)
+
+# ---- 编解码后端 ----
+
+class JsonCodec:
+    """标准库 json 后端"""
+    name = "json"
+
+    def dumps(self, data: Dict[str, Any]) -> str:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+    def loads(self, message) -> Dict[str, Any]:
+        return json.loads(message)
+
+    def encode(self, event) -> str:
+        """类型化事件或字典编码为文本帧"""
+        return self.dumps(event if isinstance(event, dict) else event_to_dict(event))
+
+    def decode(self, message) -> Union[RealtimeEvent, Dict[str, Any]]:
+        """解码为类型化事件，未知事件类型返回字典，字段类型不符时抛出 ValueError"""
+        return event_from_dict(self.loads(message))
+
+class OrjsonCodec(JsonCodec):
+    """orjson 后端"""
+    name = "orjson"
+
+    def dumps(self, data: Dict[str, Any]) -> str:
+        # WebSocket 文本帧需要 str，orjson 输出的是 UTF-8 bytes
+        return orjson.dumps(data).decode('utf-8')
+
+    def loads(self, message) -> Dict[str, Any]:
+        return orjson.loads(message)
+
+def _struct_for(schema: Type[RealtimeEvent]):
+    """由 dataclass schema 生成以 type 为标签的 msgspec Struct"""
+    fields = []
+    for f in dataclasses.fields(schema):
+        if f.default_factory is not dataclasses.MISSING:
+            fields.append((f.name, f.type, msgspec.field(default_factory=f.default_factory)))
+        else:
+            fields.append((f.name, f.type, f.default))
+    return msgspec.defstruct(schema.__name__, fields, tag_field='type', tag=schema.TYPE,
+                             omit_defaults=True, kw_only=True, namespace={'TYPE': schema.TYPE},
+                             module=__name__)
+
+class MsgspecCodec(JsonCodec):
+    """msgspec 后端：解码时按 type 标签直接构造并校验 Struct，再转为对应的 dataclass schema"""
+    name = "msgspec"
+
+    def __init__(self):
+        self.structs = {schema: _struct_for(schema) for schema in EVENT_SCHEMAS}
+        self._schemas = {struct: schema for schema, struct in self.structs.items()}
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder(Union[tuple(self.structs.values())])
+
+    def dumps(self, data: Dict[str, Any]) -> str:
+        return self._encoder.encode(data).decode('utf-8')
+
+    def loads(self, message) -> Dict[str, Any]:
+        return msgspec.json.decode(message)
+
+    def decode(self, message) -> Union[RealtimeEvent, Dict[str, Any]]:
+        try:
+            struct = self._decoder.decode(message)
+        except msgspec.ValidationError as e:
+            # 只有词表以外的事件类型退回字典，已知事件的校验失败照常抛出
+            data = self.loads(message)
+            if isinstance(data, dict) and data.get('type') not in SCHEMA_BY_TYPE:
+                return data
+            raise ValueError(f"实时事件校验失败: {e}") from e
+        return self._schemas[type(struct)](**msgspec.structs.asdict(struct))
+
+CODECS: Dict[str, type] = {"json": JsonCodec}
+if orjson is not None:
+    CODECS["orjson"] = OrjsonCodec
+if msgspec is not None:
+    CODECS["msgspec"] = MsgspecCodec
+
+def available_codecs() -> List[str]:
+    return list(CODECS)
+
+def get_codec(name: Optional[str] = None) -> JsonCodec:
+    """按名称创建编解码器；未指定时读取 REALTIME_CODEC，默认选最快的可用后端"""
+    name = name or os.getenv("REALTIME_CODEC", "auto")
+    if name == "auto":
+        for candidate in ("msgspec", "orjson", "json"):
+            if candidate in CODECS:
+                return CODECS[candidate]()
+    if name not in CODECS:
+        raise ValueError(f"编解码后端 {name} 不可用，可选: {', '.join(CODECS)}")
+    return CODECS[name]()
+
+DEFAULT_CODEC = get_codec()
+
+# ---- 微基准 ----
+
+def sample_events(frame_duration: float = 0.1, sample_rate: int = 8000) -> Dict[str, str]:
+    """每种事件一条代表性的线上报文"""
+    audio = base64.b64encode(bytes(int(frame_duration * sample_rate) * 2)).decode('ascii')
+    events = [
+        SessionUpdate(session={"modalities": ["text"], "input_audio_format": "pcm16",
+                               "input_audio_transcription": {"model": "paraformer-realtime-8k-v2"}}),
+        InputAudioBufferAppend(audio=audio),
+        InputAudioBufferCommit(),
+        SessionCreated(session={"id": "sess_0123456789abcdef", "object": "realtime.session",
+                                "model": "paraformer-realtime-8k-v2", "modalities": ["text"]},
+                       event_id="event_0123456789ab"),
+        InputAudioBufferCommitted(item_id="item_0123456789abcdef", event_id="event_0123456789ab"),
+        TranscriptionDelta(item_id="item_0123456789abcdef", delta="这是模拟", event_id="event_0123456789ab"),
+        TranscriptionCompleted(item_id="item_0123456789abcdef", transcript="这是模拟网关返回的转录文本。",
+                               event_id="event_0123456789ab"),
+    ]
+    return {event.TYPE: JsonCodec().encode(event) for event in events}
+
+def _time_per_op(func, arg, iterations: int) -> float:
+    """每次调用的平均耗时（纳秒）"""
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        func(arg)
+    return (time.perf_counter_ns() - start) / iterations
+
+def run_benchmark(iterations: int = 20000, codecs: Optional[List[str]] = None) -> Dict[str, Any]:
+    """对每个后端、每种事件测量 encode / decode（类型化）/ loads（字典）耗时"""
+    samples = sample_events()
+    results: Dict[str, Any] = {'iterations': iterations, 'codecs': {}}
+    for name in codecs or available_codecs():
+        codec = get_codec(name)
+        per_event = {}
+        for event_type, message in samples.items():
+            typed = codec.decode(message)
+            per_event[event_type] = {
+                'bytes': len(message.encode('utf-8')),
+                'encode_ns': round(_time_per_op(codec.encode, typed, iterations)),
+                'decode_ns': round(_time_per_op(codec.decode, message, iterations)),
+                'loads_ns': round(_time_per_op(codec.loads, message, iterations)),
+            }
+        results['codecs'][name] = per_event
+    return results
+
+def print_benchmark(results: Dict[str, Any]):
+    codecs = list(results['codecs'])
+    baseline = results['codecs'].get('json')
+    print(f"\n⏱️ 实时事件编解码耗时（ns/次，{results['iterations']} 次平均）")
+    print("=" * 80)
+    for event_type in next(iter(results['codecs'].values())):
+        print(f"\n{event_type}（{results['codecs'][codecs[0]][event_type]['bytes']} 字节）")
+        for name in codecs:
+            row = results['codecs'][name][event_type]
+            speedup = ""
+            if baseline is not None and name != 'json':
+                base = baseline[event_type]
+                speedup = (f"  (encode {base['encode_ns'] / max(row['encode_ns'], 1):.1f}x, "
+                           f"decode {base['decode_ns'] / max(row['decode_ns'], 1):.1f}x)")
+            print(f"  {name:<8} encode {row['encode_ns']:>7}  decode {row['decode_ns']:>7}  "
+                  f"loads {row['loads_ns']:>7}{speedup}")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="实时事件编解码微基准")
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--codec', action='append', default=None,
+                        help=f"只测试指定后端（可重复），可用: {', '.join(available_codecs())}")
+    parser.add_argument('--output', default=None, help="结果 JSON 输出路径")
+    args = parser.parse_args()
+
+    try:
+        results = run_benchmark(args.iterations, args.codec)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print_benchmark(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 结果已保存至: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时事件流消费器
+- 事件按 type 查预先构建好的处理函数表分发，不再逐个 if/elif 比较
+- 按 item_id 增量拼接转录增量（delta）和最终结果（completed）
+- 发送端登记每一帧音频的字节偏移和发送时间，转录结果对应的音频偏移
+  （audio_end_ms 或 commit 时已发送的音频末尾）映射回该段音频的发送时刻，
+  由此得到最终结果延迟（time-to-final）；每个增量结果按它覆盖的音频偏移，
+  或到达时最新发出的那一帧计时，首个增量即 time-to-first-partial
+- 单个 async for 循环持续接收，整体超时由调用方控制，不再每次 recv 都套 1 秒 wait_for
+- 报文解析走 realtime_codec 的快速路径（orjson/msgspec 可用时不经过标准库 json）
+"""
+
+import time
+import bisect
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from latency_metrics import MetricsRecorder
+from realtime_codec import DEFAULT_CODEC, JsonCodec
+
+logger = logging.getLogger(__name__)
+
+REALTIME_ENDPOINT = "/v1/realtime"
+
+SESSION_CREATED = "session.created"
+SESSION_UPDATED = "session.updated"
+SPEECH_STARTED = "input_audio_buffer.speech_started"
+SPEECH_STOPPED = "input_audio_buffer.speech_stopped"
+BUFFER_COMMITTED = "input_audio_buffer.committed"
+ITEM_CREATED = "conversation.item.created"
+TRANSCRIPTION_DELTA = "conversation.item.input_audio_transcription.delta"
+TRANSCRIPTION_COMPLETED = "conversation.item.input_audio_transcription.completed"
+TRANSCRIPTION_FAILED = "conversation.item.input_audio_transcription.failed"
+ERROR = "error"
+
+@dataclass
+class TranscriptSegment:
+    """一次提交（一个 item）的转录结果"""
+    item_id: str
+    audio_start: float = 0.0                 # 该段音频起点（秒）
+    audio_end: float = 0.0                   # 该段音频终点（秒）
+    audio_sent_ns: int = 0                   # 音频终点所在帧的发送时刻
+    committed: bool = False                  # 是否已收到 committed 事件（终点已确定）
+    first_partial_ns: Optional[int] = None
+    partial_latencies_ns: List[int] = field(default_factory=list)  # 每个增量结果的延迟
+    final_ns: Optional[int] = None
+    partials: List[str] = field(default_factory=list)
+    transcript: Optional[str] = None
+    error: Optional[Dict[str, Any]] = None
+
+    @property
+    def partial_text(self) -> str:
+        """目前为止拼接出的增量文本"""
+        return ''.join(self.partials)
+
+    @property
+    def text(self) -> str:
+        """最终文本，尚未完成时返回增量文本"""
+        return self.transcript if self.transcript is not None else self.partial_text
+
+    @property
+    def done(self) -> bool:
+        return self.transcript is not None or self.error is not None
+
+    @property
+    def time_to_first_partial(self) -> Optional[float]:
+        if not self.partial_latencies_ns:
+            return None
+        return self.partial_latencies_ns[0] / 1e9
+
+    @property
+    def time_to_final(self) -> Optional[float]:
+        if self.final_ns is None or not self.audio_sent_ns:
+            return None
+        return (self.final_ns - self.audio_sent_ns) / 1e9
+
+    def to_dict(self) -> Dict[str, Any]:
+        def ms(value):
+            return round(value * 1000, 2) if value is not None else None
+        return {
+            'item_id': self.item_id,
+            'audio_start': round(self.audio_start, 3),
+            'audio_end': round(self.audio_end, 3),
+            'partials': len(self.partials),
+            'transcript': self.text,
+            'time_to_first_partial_ms': ms(self.time_to_first_partial),
+            'time_to_final_ms': ms(self.time_to_final),
+            'error': self.error,
+        }
+
+class RealtimeEventConsumer:
+    """按事件类型分发并增量拼接转录结果"""
+
+    # 事件类型 -> 处理方法名，实例化时解析为绑定方法
+    HANDLERS = {
+        SESSION_CREATED: '_on_session',
+        SESSION_UPDATED: '_on_session',
+        SPEECH_STARTED: '_on_speech_started',
+        SPEECH_STOPPED: '_on_speech_stopped',
+        BUFFER_COMMITTED: '_on_committed',
+        TRANSCRIPTION_DELTA: '_on_delta',
+        TRANSCRIPTION_COMPLETED: '_on_completed',
+        TRANSCRIPTION_FAILED: '_on_failed',
+        ERROR: '_on_error',
+    }
+
+    def __init__(self, sample_rate: int, sample_width: int = 2, model: str = "",
+                 recorder: Optional[MetricsRecorder] = None,
+                 on_partial: Optional[Callable[[TranscriptSegment], None]] = None,
+                 on_final: Optional[Callable[[TranscriptSegment], None]] = None,
+                 codec: Optional[JsonCodec] = None):
+        self.bytes_per_second = sample_rate * sample_width
+        self.model = model
+        self.recorder = recorder
+        self.on_partial = on_partial
+        self.on_final = on_final
+        self._loads = (codec or DEFAULT_CODEC).loads
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {
+            event_type: getattr(self, name) for event_type, name in self.HANDLERS.items()
+        }
+        # 已发送音频：帧末尾字节偏移（递增）和对应发送时刻
+        self._frame_ends: List[int] = []
+        self._frame_sent_ns: List[int] = []
+        self._audio_cursor = 0                   # 已被提交的音频字节数
+        self._speech_start: Optional[float] = None
+        self._speech_end: Optional[float] = None
+        self.segments: Dict[str, TranscriptSegment] = {}
+        self.session: Dict[str, Any] = {}
+        self.event_counts: Dict[str, int] = {}
+        self.errors: List[Dict[str, Any]] = []
+
+    # ---- 发送端登记 ----
+
+    def mark_audio(self, offset: int, size: int, sent_ns: Optional[int] = None):
+        """登记一帧音频（字节偏移、PCM 字节数）的发送时刻"""
+        self._frame_ends.append(offset + size)
+        self._frame_sent_ns.append(sent_ns if sent_ns is not None else time.perf_counter_ns())
+
+    @property
+    def audio_sent(self) -> float:
+        """已发送音频时长（秒）"""
+        return self._frame_ends[-1] / self.bytes_per_second if self._frame_ends else 0.0
+
+    def _sent_ns_at(self, audio_seconds: float) -> int:
+        """包含给定音频位置的那一帧的发送时刻"""
+        if not self._frame_ends:
+            return 0
+        target = int(audio_seconds * self.bytes_per_second)
+        index = min(bisect.bisect_left(self._frame_ends, target), len(self._frame_ends) - 1)
+        return self._frame_sent_ns[index]
+
+    # ---- 接收 ----
+
+    def feed(self, message) -> Dict[str, Any]:
+        """解析一条消息并分发，返回事件"""
+        event = self._loads(message)
+        event_type = event.get('type', '')
+        self.event_counts[event_type] = self.event_counts.get(event_type, 0) + 1
+        handler = self._handlers.get(event_type)
+        if handler is not None:
+            handler(event)
+        return event
+
+    async def consume(self, websocket, until: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Optional[Dict[str, Any]]:
+        """持续接收事件，until 返回 True 时停止并返回该事件；连接关闭时返回 None"""
+        async for message in websocket:
+            event = self.feed(message)
+            if until is not None and until(event):
+                return event
+        return None
+
+    async def wait_final(self, websocket, count: int = 1) -> List[TranscriptSegment]:
+        """接收直到 count 个分段完成（成功或失败）"""
+        def finished(event):
+            if event.get('type') == ERROR:
+                raise RuntimeError(f"error: {event.get('error')}")
+            return sum(1 for s in self.segments.values() if s.done) >= count
+        await self.consume(websocket, finished)
+        return self.finished_segments()
+
+    def finished_segments(self) -> List[TranscriptSegment]:
+        return [s for s in self.segments.values() if s.done]
+
+    # ---- 处理函数 ----
+
+    def _segment(self, item_id: str) -> TranscriptSegment:
+        """取出分段；未见过 committed 事件的 item 先以当前已发送音频为暂定终点"""
+        segment = self.segments.get(item_id)
+        if segment is None:
+            audio_end = self._pending_end()
+            segment = self.segments[item_id] = TranscriptSegment(
+                item_id=item_id, audio_start=self._pending_start(), audio_end=audio_end,
+                audio_sent_ns=self._sent_ns_at(audio_end))
+        return segment
+
+    def _pending_start(self) -> float:
+        return self._speech_start if self._speech_start is not None else self._audio_cursor / self.bytes_per_second
+
+    def _pending_end(self) -> float:
+        return self._speech_end if self._speech_end is not None else self.audio_sent
+
+    def _commit_segment(self, segment: TranscriptSegment, audio_end: Optional[float]):
+        """确定分段的音频范围，后续分段从该终点开始"""
+        if audio_end is None:
+            audio_end = self._pending_end()
+        segment.audio_start = self._pending_start()
+        segment.audio_end = audio_end
+        segment.audio_sent_ns = self._sent_ns_at(audio_end)
+        segment.committed = True
+        self._audio_cursor = int(audio_end * self.bytes_per_second)
+        self._speech_start = self._speech_end = None
+
+    def _partial_sent_ns(self, event, segment: TranscriptSegment) -> int:
+        """增量结果对应音频的发送时刻：带 audio_end_ms 时按该偏移，分段已提交时按分段终点，否则按到达时最新发出的一帧"""
+        if 'audio_end_ms' in event:
+            return self._sent_ns_at(event['audio_end_ms'] / 1000)
+        if segment.committed:
+            return segment.audio_sent_ns
+        return self._frame_sent_ns[-1] if self._frame_sent_ns else 0
+
+    def _on_session(self, event):
+        self.session = event.get('session', {})
+
+    def _on_speech_started(self, event):
+        if 'audio_start_ms' in event:
+            self._speech_start = event['audio_start_ms'] / 1000
+
+    def _on_speech_stopped(self, event):
+        if 'audio_end_ms' in event:
+            self._speech_end = event['audio_end_ms'] / 1000
+
+    def _on_committed(self, event):
+        item_id = event.get('item_id', '')
+        if item_id:
+            # 先于 committed 到达的增量结果已按暂定终点建立分段，这里更新为提交的范围
+            audio_end = event['audio_end_ms'] / 1000 if 'audio_end_ms' in event else None
+            self._commit_segment(self._segment(item_id), audio_end)
+
+    def _on_delta(self, event):
+        now = time.perf_counter_ns()
+        segment = self._segment(event.get('item_id', ''))
+        segment.partials.append(event.get('delta', ''))
+        sent_ns = self._partial_sent_ns(event, segment)
+        if sent_ns:
+            latency_ns = now - sent_ns
+            segment.partial_latencies_ns.append(latency_ns)
+            self._record(latency_ns, 'partial')
+            if segment.first_partial_ns is None:
+                self._record(latency_ns, 'first_partial')
+        if segment.first_partial_ns is None:
+            segment.first_partial_ns = now
+        if self.on_partial is not None:
+            self.on_partial(segment)
+
+    def _on_completed(self, event):
+        now = time.perf_counter_ns()
+        segment = self._segment(event.get('item_id', ''))
+        if not segment.committed:
+            # 没有 committed 事件的服务端：以暂定终点结束该分段
+            self._commit_segment(segment, segment.audio_end)
+        segment.transcript = event.get('transcript', segment.partial_text)
+        segment.final_ns = now
+        if segment.audio_sent_ns:
+            self._record(segment.final_ns - segment.audio_sent_ns, 'final')
+        if self.on_final is not None:
+            self.on_final(segment)
+
+    def _on_failed(self, event):
+        segment = self._segment(event.get('item_id', ''))
+        segment.error = event.get('error', {})
+        self.errors.append(segment.error)
+
+    def _on_error(self, event):
+        self.errors.append(event.get('error', {}))
+
+    def _record(self, value_ns: int, phase: str):
+        if self.recorder is not None:
+            self.recorder.record_ns(self.model, REALTIME_ENDPOINT, phase, value_ns)
+
+    def summary(self) -> Dict[str, Any]:
+        """分段结果与事件计数"""
+        return {
+            'segments': [s.to_dict() for s in self.segments.values()],
+            'event_counts': dict(self.event_counts),
+            'errors': list(self.errors),
+        }
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时音频帧编码器
+把 PCM 数据流式编码为 input_audio_buffer.append 事件：
+- 输入可以是 bytes/bytearray/memoryview/mmap、文件路径、文件对象或 bytes 生成器
+- 通过 memoryview 切片分块，不复制原始音频
+- 每块长度对齐到 3 字节（同时对齐采样宽度），逐块 base64 的结果拼起来
+  与整段 base64 完全一致，不需要先把整段音频编码成一个大字符串
+- 使用预先序列化好的 JSON 外壳拼接帧，不再为每一帧构造 dict 并调用 json.dumps
+"""
+
+import os
+import mmap
+import math
+import binascii
+from pathlib import Path
+from typing import Iterator, Iterable, Tuple, Union
+
+# 预序列化的事件外壳（base64 字符集不需要 JSON 转义）
+APPEND_PREFIX = '{"type":"input_audio_buffer.append","audio":"'
+APPEND_SUFFIX = '"}'
+COMMIT_FRAME = '{"type":"input_audio_buffer.commit"}'
+CLEAR_FRAME = '{"type":"input_audio_buffer.clear"}'
+
+AudioSource = Union[bytes, bytearray, memoryview, mmap.mmap, str, Path, Iterable[bytes]]
+
+def aligned_chunk_size(chunk_bytes: int, sample_width: int = 2) -> int:
+    """把块大小向下对齐到 base64 分组（3 字节）和采样宽度的公倍数"""
+    alignment = 3 * sample_width // math.gcd(3, sample_width)
+    return max(alignment, chunk_bytes - chunk_bytes % alignment)
+
+def encode_append(chunk) -> str:
+    """把一块 PCM 编码为 append 事件文本"""
+    return APPEND_PREFIX + binascii.b2a_base64(chunk, newline=False).decode('ascii') + APPEND_SUFFIX
+
+class AudioFrameEncoder:
+    """按固定块大小把 PCM 编码为 append 帧"""
+
+    def __init__(self, chunk_bytes: int = 3200, sample_width: int = 2):
+        self.sample_width = sample_width
+        self.chunk_bytes = aligned_chunk_size(chunk_bytes, sample_width)
+
+    @classmethod
+    def for_duration(cls, frame_duration: float, sample_rate: int, sample_width: int = 2) -> "AudioFrameEncoder":
+        """按每帧音频时长创建编码器"""
+        return cls(int(frame_duration * sample_rate) * sample_width, sample_width)
+
+    def frame_duration(self, sample_rate: int) -> float:
+        """每个完整帧包含的音频时长（秒）"""
+        return self.chunk_bytes / (sample_rate * self.sample_width)
+
+    def iter_frames(self, source: AudioSource) -> Iterator[Tuple[int, str]]:
+        """逐帧产出 (帧在音频中的字节偏移, 帧文本)"""
+        if isinstance(source, (str, Path)):
+            yield from self._iter_file(source)
+        elif isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+            yield from self._iter_buffer(source)
+        elif hasattr(source, 'readinto'):
+            yield from self._iter_reader(source)
+        else:
+            yield from self._iter_chunks(source)
+
+    def frames(self, source: AudioSource) -> Iterator[str]:
+        """逐帧产出帧文本"""
+        for _, frame in self.iter_frames(source):
+            yield frame
+
+    def _iter_buffer(self, buffer, base_offset: int = 0) -> Iterator[Tuple[int, str]]:
+        view = memoryview(buffer)
+        try:
+            size = self.chunk_bytes
+            for offset in range(0, len(view), size):
+                yield base_offset + offset, encode_append(view[offset:offset + size])
+        finally:
+            view.release()
+
+    def _iter_file(self, path) -> Iterator[Tuple[int, str]]:
+        """原始 PCM 文件：整体内存映射后按块切片"""
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield from self._iter_buffer(mapped)
+
+    def _iter_reader(self, reader) -> Iterator[Tuple[int, str]]:
+        """文件对象：复用同一块缓冲区 readinto"""
+        buffer = bytearray(self.chunk_bytes)
+        view = memoryview(buffer)
+        offset = 0
+        try:
+            while True:
+                filled = 0
+                while filled < self.chunk_bytes:
+                    n = reader.readinto(view[filled:])
+                    if not n:
+                        break
+                    filled += n
+                if not filled:
+                    return
+                yield offset, encode_append(view[:filled])
+                offset += filled
+                if filled < self.chunk_bytes:
+                    return
+        finally:
+            view.release()
+
+    def _iter_chunks(self, chunks: Iterable[bytes]) -> Iterator[Tuple[int, str]]:
+        """任意大小的 bytes 生成器：凑满对齐的块再编码，余数留到下一轮"""
+        pending = bytearray()
+        offset = 0
+        size = self.chunk_bytes
+        for chunk in chunks:
+            if not pending and len(chunk) % size == 0:
+                # 已经对齐的输入直接切片，不进暂存区
+                yield from self._iter_buffer(chunk, offset)
+                offset += len(chunk)
+                continue
+            pending += chunk
+            usable = len(pending) - len(pending) % size
+            if usable:
+                with memoryview(pending) as view:
+                    for start in range(0, usable, size):
+                        yield offset, encode_append(view[start:start + size])
+                        offset += size
+                del pending[:usable]
+        if pending:
+            yield offset, encode_append(pending)
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时语音识别多会话压测驱动
+同时打开大量 /v1/realtime 会话（子协议认证与 test_paraformer_audio.py 一致），
+按音频真实时长（或其倍数）节奏发送 input_audio_buffer.append，
+测量每个会话从 commit 到拿到转录结果的延迟，以及相对音频发送时刻的
+首个增量结果延迟和最终结果延迟（实时字幕真正关心的指标）。
+
+用于确定单个网关节点能同时承载多少路 paraformer-realtime-8k-v2 流。
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+import logging
+from typing import Dict, List, Optional, Any
+from dataclasses import dataclass, asdict
+
+import audio_signals
+from audio_file import MappedAudioFile
+from realtime_frames import AudioFrameEncoder, COMMIT_FRAME
+from realtime_client import connect_realtime, wait_for_event, SESSION_CREATED
+from realtime_events import RealtimeEventConsumer
+from latency_metrics import MetricsRecorder, percentile
+from traffic_capture import capture_from_env
+from metrics_exporter import GATEWAY_METRICS, start_metrics_server
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RealtimeLoadConfig:
+    """实时会话压测配置"""
+    base_url: str = "http://127.0.0.1:3000"
+    api_key: str = ""
+    model: str = "paraformer-realtime-8k-v2"
+    sessions: int = 100               # 并发会话数
+    sample_rate: int = 8000           # 8k 模型使用 8kHz PCM16
+    audio_duration: float = 5.0       # 每个会话发送的音频时长（秒）
+    frame_duration: float = 0.1       # 每个 append 帧包含的音频时长（秒）
+    speed: float = 1.0                # 相对实时的发送倍速，0 表示不限速
+    ramp_up: float = 10.0             # 会话建立的爬坡时间（秒）
+    audio_file: Optional[str] = None  # 使用录音文件（WAV/原始 PCM）代替合成音频
+    handshake_timeout: float = 10.0
+    transcript_timeout: float = 30.0
+
+    def __post_init__(self):
+        if not self.api_key:
+            self.api_key = os.getenv("NEW_API_KEY", "sk-WFXP99kKWeu9BhV3UiypR6wj2tb2x5d08TLGWgiLHiDG9r8Q")
+
+@dataclass
+class SessionResult:
+    """单个会话的结果"""
+    session_id: int
+    success: bool = False
+    error: str = ""
+    connect_time: float = 0.0             # 建立 WebSocket 连接（秒）
+    session_ready_time: float = 0.0       # 连接建立到收到 session.created（秒）
+    frames_sent: int = 0
+    max_send_lag: float = 0.0             # 帧实际发送时间相对计划时间的最大滞后（秒）
+    commit_to_transcript: Optional[float] = None
+    time_to_first_partial: Optional[float] = None  # 对应音频发送到首个增量结果（秒）
+    time_to_final: Optional[float] = None          # 末帧音频发送到最终结果（秒）
+    partials: int = 0
+    transcript: str = ""
+
+class RealtimeLoadDriver:
+    """多会话实时语音识别压测"""
+
+    def __init__(self, config: RealtimeLoadConfig):
+        self.config = config
+        self.metrics = MetricsRecorder()
+        self.capture = capture_from_env()  # 设置 NEW_API_CAPTURE 时录制会话帧
+        self.audio_file = None
+        if config.audio_file:
+            # 录音文件内存映射后按帧切片，每个会话按需编码，不把整段录音放进内存
+            self.audio_file = MappedAudioFile(config.audio_file).open()
+            if self.audio_file.info is not None:
+                config.sample_rate = self.audio_file.info.sample_rate
+            self.audio = self.audio_file.pcm
+            self.frames = None
+        else:
+            self.audio = audio_signals.speech_like(config.audio_duration, config.sample_rate)
+        self.encoder = AudioFrameEncoder.for_duration(config.frame_duration, config.sample_rate)
+        if self.audio_file is None:
+            # 所有会话发送同一段合成音频，帧只编码一次
+            self.frames = list(self.encoder.iter_frames(self.audio))
+
+    def _frame_source(self):
+        """逐帧产出 (字节偏移, 帧文本)"""
+        return self.frames if self.frames is not None else self.encoder.iter_frames(self.audio)
+
+    async def _receive(self, websocket, consumer: RealtimeEventConsumer, done: asyncio.Future):
+        """后台接收事件交给消费器分发，拿到最终结果（或失败）后完成 future；连接提前关闭时立即以异常完成"""
+        reason = ""
+        try:
+            async for message in websocket:
+                GATEWAY_METRICS.session_bytes_received(self.config.model, len(message))
+                consumer.feed(message)
+                if done.done():
+                    continue
+                if consumer.errors:
+                    done.set_exception(RuntimeError(f"error: {consumer.errors[0]}"))
+                else:
+                    finished = consumer.finished_segments()
+                    if finished:
+                        done.set_result((time.monotonic(), finished[0]))
+        except Exception as e:
+            reason = f"{type(e).__name__}: {e}"
+        if not done.done():
+            close_code = getattr(websocket, 'close_code', None)
+            done.set_exception(ConnectionError(
+                f"连接在收到最终结果前关闭（close code {close_code}）{reason and '，' + reason}"))
+
+    async def run_session(self, session_id: int) -> SessionResult:
+        """执行一个完整会话：连接 -> 按实时节奏发送音频 -> commit -> 等待转录"""
+        config = self.config
+        result = SessionResult(session_id=session_id)
+        receiver = None
+        opened = False
+        try:
+            start = time.monotonic()
+            websocket = await asyncio.wait_for(
+                connect_realtime(config.base_url, config.api_key, config.model),
+                timeout=config.handshake_timeout
+            )
+            result.connect_time = time.monotonic() - start
+            GATEWAY_METRICS.session_opened(config.model)
+            opened = True
+            if self.capture is not None:
+                websocket = self.capture.wrap_websocket(websocket, config.model)
+            async with websocket:
+                ready_start = time.monotonic()
+                await wait_for_event(websocket, SESSION_CREATED, config.handshake_timeout)
+                result.session_ready_time = time.monotonic() - ready_start
+
+                consumer = RealtimeEventConsumer(config.sample_rate, model=config.model, recorder=self.metrics)
+                done = asyncio.get_running_loop().create_future()
+                receiver = asyncio.ensure_future(self._receive(websocket, consumer, done))
+                audio_size = len(self.audio)
+
+                # 按绝对时间表发送，避免 sleep 误差累积
+                frame_duration = self.encoder.frame_duration(config.sample_rate)
+                interval = frame_duration / config.speed if config.speed > 0 else 0.0
+                stream_start = time.monotonic()
+                for index, (offset, frame) in enumerate(self._frame_source()):
+                    scheduled = stream_start + index * interval
+                    delay = scheduled - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    else:
+                        result.max_send_lag = max(result.max_send_lag, -delay)
+                    await websocket.send(frame)
+                    consumer.mark_audio(offset, min(self.encoder.chunk_bytes, audio_size - offset))
+                    GATEWAY_METRICS.session_bytes_sent(config.model, len(frame))
+                    result.frames_sent += 1
+
+                await websocket.send(COMMIT_FRAME)
+                committed_at = time.monotonic()
+
+                finished_at, segment = await asyncio.wait_for(done, timeout=config.transcript_timeout)
+                result.commit_to_transcript = finished_at - committed_at
+                result.time_to_first_partial = segment.time_to_first_partial
+                result.time_to_final = segment.time_to_final
+                result.partials = len(segment.partials)
+                result.transcript = segment.text
+                if segment.error is not None:
+                    raise RuntimeError(f"transcription_failed: {segment.error}")
+                result.success = True
+        except asyncio.TimeoutError:
+            result.error = "timeout"
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        finally:
+            if receiver is not None:
+                receiver.cancel()
+            if opened:
+                outcome = 'success' if result.success else (result.error or 'error').split(':')[0]
+                GATEWAY_METRICS.session_closed(config.model, outcome)
+        return result
+
+    async def run(self) -> Dict[str, Any]:
+        """并发运行全部会话并汇总"""
+        config = self.config
+        logger.info(f"🚀 启动 {config.sessions} 路 {config.model} 会话，"
+                    f"音频 {config.audio_duration}s，{config.speed}x 实时")
+
+        async def delayed(session_id: int) -> SessionResult:
+            if config.ramp_up > 0:
+                await asyncio.sleep(config.ramp_up * session_id / config.sessions)
+            return await self.run_session(session_id)
+
+        started_at = time.monotonic()
+        try:
+            results = await asyncio.gather(*(delayed(i) for i in range(config.sessions)))
+        finally:
+            if self.audio_file is not None:
+                self.audio_file.close()
+        elapsed = time.monotonic() - started_at
+
+        report = self.summarize(results, elapsed)
+        logger.info(f"📊 成功会话: {report['successful_sessions']}/{config.sessions}，"
+                    f"commit->转录 p50 {report['commit_to_transcript']['p50_ms']}ms "
+                    f"p99 {report['commit_to_transcript']['p99_ms']}ms，"
+                    f"首个增量 p50 {report['time_to_first_partial']['p50_ms']}ms "
+                    f"p99 {report['time_to_first_partial']['p99_ms']}ms")
+        return report
+
+    def summarize(self, results: List[SessionResult], elapsed: float) -> Dict[str, Any]:
+        """汇总会话结果"""
+        ok = [r for r in results if r.success]
+        latencies = sorted(r.commit_to_transcript for r in ok)
+        first_partials = sorted(r.time_to_first_partial for r in ok if r.time_to_first_partial is not None)
+        finals = sorted(r.time_to_final for r in ok if r.time_to_final is not None)
+        connects = sorted(r.connect_time for r in results if r.connect_time)
+
+        errors: Dict[str, int] = {}
+        for r in results:
+            if not r.success:
+                key = r.error.split(':')[0] or 'unknown'
+                errors[key] = errors.get(key, 0) + 1
+
+        def ms(values, pct):
+            return round(percentile(values, pct) * 1000, 2)
+
+        return {
+            'model': self.config.model,
+            'sessions': len(results),
+            'successful_sessions': len(ok),
+            'failed_sessions': len(results) - len(ok),
+            'duration': round(elapsed, 3),
+            'speed': self.config.speed,
+            'commit_to_transcript': {f'p{p}_ms': ms(latencies, p) for p in (50, 90, 99)},
+            'time_to_first_partial': {f'p{p}_ms': ms(first_partials, p) for p in (50, 90, 99)},
+            'time_to_final': {f'p{p}_ms': ms(finals, p) for p in (50, 90, 99)},
+            'latency_histograms': self.metrics.to_dict(),
+            'connect_time': {f'p{p}_ms': ms(connects, p) for p in (50, 99)},
+            'max_send_lag_ms': round(max((r.max_send_lag for r in results), default=0.0) * 1000, 2),
+            'errors': errors,
+            'session_results': [asdict(r) for r in results],
+        }
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="实时语音识别多会话压测")
+    parser.add_argument('--base-url', default=os.getenv("NEW_API_BASE_URL", "http://127.0.0.1:3000"))
+    parser.add_argument('--model', default="paraformer-realtime-8k-v2")
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--sample-rate', type=int, default=8000)
+    parser.add_argument('--audio-duration', type=float, default=5.0)
+    parser.add_argument('--frame-duration', type=float, default=0.1)
+    parser.add_argument('--speed', type=float, default=1.0, help="相对实时的倍速，0 表示不限速")
+    parser.add_argument('--ramp-up', type=float, default=10.0)
+    parser.add_argument('--audio-file', default=None, help="使用录音文件（WAV/原始 PCM）代替合成音频")
+    parser.add_argument('--output', default=None, help="报告输出路径")
+    parser.add_argument('--metrics-port', type=int, default=None, help="在该端口提供 Prometheus /metrics 端点")
+    parser.add_argument('--metrics-host', default="127.0.0.1", help="/metrics 端点监听地址，0.0.0.0 供其他机器抓取")
+    args = parser.parse_args()
+
+    config = RealtimeLoadConfig(
+        base_url=args.base_url,
+        model=args.model,
+        sessions=args.sessions,
+        sample_rate=args.sample_rate,
+        audio_duration=args.audio_duration,
+        frame_duration=args.frame_duration,
+        speed=args.speed,
+        ramp_up=args.ramp_up,
+        audio_file=args.audio_file,
+    )
+
+    if args.metrics_port is not None:
+        start_metrics_server(args.metrics_port, args.metrics_host)
+
+    try:
+        report = asyncio.run(RealtimeLoadDriver(config).run())
+    except KeyboardInterrupt:
+        print("\n\n⏹️  压测被用户中断")
+        return
+
+    output = args.output or f"realtime_load_report_{int(time.time())}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n📊 成功会话: {report['successful_sessions']}/{report['sessions']}")
+    print(f"   commit->转录: {report['commit_to_transcript']}")
+    print(f"   首个增量结果: {report['time_to_first_partial']}")
+    print(f"   最终结果: {report['time_to_final']}")
+    print(f"   最大发送滞后: {report['max_send_lag_ms']}ms")
+    if report['errors']:
+        print(f"   错误分布: {report['errors']}")
+    print(f"   报告已保存至: {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+/v1/realtime 会话池
+短语音交互中握手开销占了大头，这里把握手拆开计时并提前完成：
+- 握手分阶段计时：DNS 解析、TCP 建连、WebSocket 升级（wss 时含 TLS）、
+  收到 session.created、发送 session.update 到收到 session.updated
+  TCP 连接自行建立后通过 sock= 交给 websockets，升级阶段不再混入建连时间
+- RealtimeSessionPool 预先建立一批会话并定期 ping 做健康检查，
+  工作负载通过 acquire / release（或 async with pool.session()）拿到已就绪的会话
+- 各阶段耗时写入 latency_metrics.MetricsRecorder，会话数写入 metrics_exporter
+"""
+
+import os
+import ssl
+import json
+import time
+import socket
+import asyncio
+import argparse
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, List, Optional, Any
+from dataclasses import dataclass, field, asdict
+from urllib.parse import urlsplit
+
+import websockets
+
+from latency_metrics import MetricsRecorder, now_ns, ns_to_seconds
+from metrics_exporter import GATEWAY_METRICS
+from realtime_client import realtime_url, realtime_subprotocols, wait_for_event, SESSION_CREATED
+from realtime_codec import DEFAULT_CODEC, SessionUpdate
+
+logger = logging.getLogger(__name__)
+
+SESSION_UPDATED = "session.updated"
+REALTIME_ENDPOINT = "/v1/realtime"
+
+# 握手阶段，顺序即发生顺序
+HANDSHAKE_PHASES = ('dns', 'tcp_connect', 'ws_upgrade', 'session_created', 'session_updated')
+
+@dataclass
+class RealtimePoolConfig:
+    """会话池配置"""
+    base_url: str = "http://127.0.0.1:3000"
+    api_key: str = ""
+    model: str = "paraformer-realtime-8k-v2"
+    size: int = 4                         # 保持预热的空闲会话数
+    max_size: int = 16                    # 同时存在的会话上限（空闲 + 已借出）
+    # 建立会话后发送的 session.update 内容，None 表示不发送（也就不测 session_updated）
+    session_update: Optional[Dict[str, Any]] = field(default_factory=lambda: {"input_audio_format": "pcm16"})
+    handshake_timeout: float = 10.0
+    health_check_interval: float = 15.0   # 空闲会话 ping 间隔（秒）
+    ping_timeout: float = 5.0
+    max_idle: float = 300.0               # 空闲超过该时长的会话关闭重建（秒）
+    max_uses: int = 1                     # 每个会话最多交给几次工作负载，1 表示用完即弃
+
+    def __post_init__(self):
+        if not self.api_key:
+            self.api_key = os.getenv("NEW_API_KEY", "sk-WFXP99kKWeu9BhV3UiypR6wj2tb2x5d08TLGWgiLHiDG9r8Q")
+        if self.max_size < self.size:
+            raise ValueError("max_size 不能小于 size")
+
+@dataclass
+class HandshakeTiming:
+    """一次握手各阶段的耗时（秒），未发生的阶段为 None"""
+    dns: Optional[float] = None
+    tcp_connect: Optional[float] = None
+    ws_upgrade: Optional[float] = None
+    session_created: Optional[float] = None
+    session_updated: Optional[float] = None
+
+    @property
+    def total(self) -> float:
+        return sum(value for value in asdict(self).values() if value is not None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {f'{phase}_ms': round(value * 1000, 3) for phase, value in asdict(self).items() if value is not None}
+        result['total_ms'] = round(self.total * 1000, 3)
+        return result
+
+class RealtimeSession:
+    """已完成握手的实时会话"""
+
+    def __init__(self, websocket, model: str, timing: HandshakeTiming):
+        self.websocket = websocket
+        self.model = model
+        self.timing = timing
+        self.events: List[Dict[str, Any]] = []  # 握手过程中收到的事件（session.created 等）
+        self.session: Dict[str, Any] = {}       # 服务端返回的会话配置
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+        self._closed = False
+
+    @property
+    def open(self) -> bool:
+        # 新旧两套 websockets 连接对象都有 state 属性
+        return not self._closed and self.websocket.state.name == 'OPEN'
+
+    async def send(self, message):
+        """发送文本帧、字典或类型化事件"""
+        await self.websocket.send(message if isinstance(message, (str, bytes)) else DEFAULT_CODEC.encode(message))
+
+    async def recv(self):
+        return await self.websocket.recv()
+
+    async def ping(self, timeout: float) -> float:
+        """发送 ping 并等待 pong，返回往返时间（秒）"""
+        start = time.perf_counter()
+        waiter = await self.websocket.ping()
+        await asyncio.wait_for(waiter, timeout)
+        return time.perf_counter() - start
+
+    async def close(self, outcome: str = "closed"):
+        if self._closed:
+            return
+        self._closed = True
+        GATEWAY_METRICS.session_closed(self.model, outcome)
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+
+async def _open_socket(host: str, port: int, timing: HandshakeTiming) -> socket.socket:
+    """解析地址并建立 TCP 连接，分别记录 DNS 和建连耗时"""
+    loop = asyncio.get_running_loop()
+    start = now_ns()
+    infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    resolved = now_ns()
+    timing.dns = ns_to_seconds(resolved - start)
+
+    last_error: Optional[OSError] = None
+    for family, sock_type, proto, _, address in infos:
+        sock = socket.socket(family, sock_type, proto)
+        sock.setblocking(False)
+        try:
+            await loop.sock_connect(sock, address)
+        except OSError as e:
+            sock.close()
+            last_error = e
+            continue
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        timing.tcp_connect = ns_to_seconds(now_ns() - resolved)
+        return sock
+    raise last_error or OSError(f"无法连接 {host}:{port}")
+
+async def open_realtime_session(base_url: str, api_key: str, model: str,
+                                session_update: Optional[Dict[str, Any]] = None,
+                                timeout: float = 10.0,
+                                recorder: Optional[MetricsRecorder] = None) -> RealtimeSession:
+    """建立一个实时会话并分阶段计时；recorder 不为空时把各阶段写入直方图"""
+    url = realtime_url(base_url, model)
+    parts = urlsplit(url)
+    secure = parts.scheme == 'wss'
+    timing = HandshakeTiming()
+
+    sock = await asyncio.wait_for(_open_socket(parts.hostname, parts.port or (443 if secure else 80), timing), timeout)
+    connect_kwargs: Dict[str, Any] = {}
+    if secure:
+        connect_kwargs.update(ssl=ssl.create_default_context(), server_hostname=parts.hostname)
+    start = now_ns()
+    try:
+        websocket = await websockets.connect(url, sock=sock, subprotocols=realtime_subprotocols(api_key),
+                                             open_timeout=timeout, **connect_kwargs)
+    except BaseException:
+        sock.close()
+        raise
+    timing.ws_upgrade = ns_to_seconds(now_ns() - start)
+    GATEWAY_METRICS.session_opened(model)
+    session = RealtimeSession(websocket, model, timing)
+
+    try:
+        start = now_ns()
+        session.events.extend(await wait_for_event(websocket, SESSION_CREATED, timeout))
+        timing.session_created = ns_to_seconds(now_ns() - start)
+        if session_update is not None:
+            start = now_ns()
+            await websocket.send(DEFAULT_CODEC.encode(SessionUpdate(session=session_update)))
+            session.events.extend(await wait_for_event(websocket, SESSION_UPDATED, timeout))
+            timing.session_updated = ns_to_seconds(now_ns() - start)
+        session.session = session.events[-1].get('session', {})
+    except BaseException:
+        await session.close('handshake_error')
+        raise
+
+    if recorder is not None:
+        for phase, value in asdict(timing).items():
+            if value is not None:
+                recorder.record_ns(model, REALTIME_ENDPOINT, phase, round(value * 1e9))
+        recorder.record_ns(model, REALTIME_ENDPOINT, 'handshake', round(timing.total * 1e9))
+    return session
+
+class RealtimeSessionPool:
+    """预热并健康检查的实时会话池"""
+
+    def __init__(self, config: RealtimePoolConfig, recorder: Optional[MetricsRecorder] = None):
+        self.config = config
+        self.recorder = recorder or MetricsRecorder()
+        self.idle: Deque[RealtimeSession] = deque()
+        self.in_use = 0
+        self._pending = 0                 # 正在握手的会话数
+        self._condition: Optional[asyncio.Condition] = None
+        self._maintainer: Optional[asyncio.Task] = None
+        self._fillers: set = set()
+        self._closed = False
+        self.stats_counters = {'established': 0, 'handshake_failures': 0, 'acquired': 0, 'warm_hits': 0,
+                               'cold_acquires': 0, 'reused': 0, 'discarded': 0, 'health_check_failures': 0}
+
+    async def __aenter__(self) -> "RealtimeSessionPool":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @property
+    def total(self) -> int:
+        return len(self.idle) + self.in_use + self._pending
+
+    async def start(self, wait: bool = True):
+        """预热 size 个会话；wait=False 时在后台建立"""
+        self._condition = asyncio.Condition()
+        self._maintainer = asyncio.ensure_future(self._maintain())
+        fill = self._replenish()
+        if wait:
+            await fill
+        else:
+            self._spawn(fill)
+
+    async def close(self):
+        self._closed = True
+        for task in [self._maintainer, *self._fillers]:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*[t for t in [self._maintainer, *self._fillers] if t is not None], return_exceptions=True)
+        while self.idle:
+            await self.idle.popleft().close('pool_closed')
+
+    # ---- 建立与补充 ----
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._fillers.add(task)
+        task.add_done_callback(self._fillers.discard)
+        return task
+
+    async def _establish(self) -> Optional[RealtimeSession]:
+        """握手建立一个会话；调用方事先在 _pending 中占好名额"""
+        config = self.config
+        try:
+            session = await open_realtime_session(config.base_url, config.api_key, config.model,
+                                                  config.session_update, config.handshake_timeout, self.recorder)
+            self.stats_counters['established'] += 1
+            return session
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats_counters['handshake_failures'] += 1
+            logger.warning(f"⚠️  建立 {config.model} 会话失败: {type(e).__name__}: {e}")
+            return None
+        finally:
+            self._pending -= 1
+
+    async def _replenish(self):
+        """把空闲会话补到 size（不超过 max_size）"""
+        missing = min(self.config.size - len(self.idle) - self._pending, self.config.max_size - self.total)
+        if missing <= 0 or self._closed:
+            return
+        self._pending += missing  # 先占名额，并发的补充和借出不会超过上限
+        sessions = await asyncio.gather(*(self._establish() for _ in range(missing)))
+        async with self._condition:
+            for session in sessions:
+                if session is not None:
+                    self.idle.append(session)
+            self._condition.notify_all()
+
+    async def _maintain(self):
+        """定期 ping 空闲会话，关闭失效或空闲过久的会话并补齐"""
+        config = self.config
+        while not self._closed:
+            await asyncio.sleep(config.health_check_interval)
+            now = time.monotonic()
+            for session in list(self.idle):
+                reason = None
+                if not session.open:
+                    reason = 'closed_by_peer'
+                elif now - session.last_used > config.max_idle:
+                    reason = 'idle_expired'
+                else:
+                    try:
+                        await session.ping(config.ping_timeout)
+                    except Exception:
+                        reason = 'ping_failed'
+                        self.stats_counters['health_check_failures'] += 1
+                if reason is not None and session in self.idle:
+                    self.idle.remove(session)
+                    self.stats_counters['discarded'] += 1
+                    await session.close(reason)
+            await self._replenish()
+
+    # ---- 借出与归还 ----
+
+    async def acquire(self, timeout: Optional[float] = None) -> RealtimeSession:
+        """取一个就绪会话：优先用空闲会话，否则在上限内新建，达到上限时等待归还"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        while True:
+            async with self._condition:
+                while self.idle:
+                    session = self.idle.popleft()
+                    if session.open:
+                        self.in_use += 1
+                        session.uses += 1
+                        self.stats_counters['acquired'] += 1
+                        self.stats_counters['warm_hits'] += 1
+                        self._spawn(self._replenish())
+                        return session
+                    self.stats_counters['discarded'] += 1
+                    await session.close('closed_by_peer')
+                if self.total < self.config.max_size:
+                    self._pending += 1
+                else:
+                    remaining = deadline - loop.time() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        raise asyncio.TimeoutError("等待空闲会话超时")
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        raise asyncio.TimeoutError("等待空闲会话超时") from None
+                    continue
+            # 没有空闲会话，现场握手
+            session = await self._establish()
+            if session is None:
+                raise ConnectionError(f"无法建立 {self.config.model} 会话")
+            self.in_use += 1
+            session.uses += 1
+            self.stats_counters['acquired'] += 1
+            self.stats_counters['cold_acquires'] += 1
+            return session
+
+    async def release(self, session: RealtimeSession, reusable: bool = True):
+        """归还会话；会话出错、用满 max_uses 或 reusable=False 时关闭"""
+        self.in_use -= 1
+        session.last_used = time.monotonic()
+        if reusable and session.open and session.uses < self.config.max_uses and not self._closed:
+            self.stats_counters['reused'] += 1
+            async with self._condition:
+                self.idle.append(session)
+                self._condition.notify()
+            return
+        await session.close('released')
+        async with self._condition:
+            self._condition.notify()
+        if not self._closed:
+            self._spawn(self._replenish())
+
+    @asynccontextmanager
+    async def session(self, timeout: Optional[float] = None):
+        """async with pool.session() as session: ...；块内抛出异常时会话不再复用"""
+        session = await self.acquire(timeout)
+        try:
+            yield session
+        except BaseException:
+            await self.release(session, reusable=False)
+            raise
+        await self.release(session)
+
+    def stats(self) -> Dict[str, Any]:
+        """池状态和握手各阶段的延迟分位"""
+        handshake = self.recorder.summary().get(self.config.model, {}).get(REALTIME_ENDPOINT, {})
+        return {
+            'model': self.config.model,
+            'idle': len(self.idle),
+            'in_use': self.in_use,
+            'pending': self._pending,
+            **self.stats_counters,
+            'handshake': {phase: handshake[phase] for phase in (*HANDSHAKE_PHASES, 'handshake') if phase in handshake},
+        }
+
+async def _demo(config: RealtimePoolConfig, rounds: int) -> Dict[str, Any]:
+    """预热会话池并借出 rounds 次，返回池状态"""
+    async with RealtimeSessionPool(config) as pool:
+        for i in range(rounds):
+            start = time.perf_counter()
+            async with pool.session(timeout=config.handshake_timeout) as session:
+                wait = time.perf_counter() - start
+                logger.info(f"🔌 第 {i + 1} 次借出: 等待 {wait * 1000:.1f}ms，"
+                            f"握手 {session.timing.to_dict()}")
+        return pool.stats()
+
+def main():
+    """主函数：预热会话池并输出握手各阶段的延迟"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="/v1/realtime 会话池与握手延迟分解")
+    parser.add_argument('--base-url', default=os.getenv("NEW_API_BASE_URL", "http://127.0.0.1:3000"))
+    parser.add_argument('--model', default="paraformer-realtime-8k-v2")
+    parser.add_argument('--size', type=int, default=4, help="预热会话数")
+    parser.add_argument('--max-size', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=8, help="借出次数")
+    parser.add_argument('--no-session-update', action='store_true', help="不发送 session.update")
+    args = parser.parse_args()
+
+    config = RealtimePoolConfig(base_url=args.base_url, model=args.model, size=args.size,
+                                max_size=max(args.max_size, args.size))
+    if args.no_session_update:
+        config.session_update = None
+    stats = asyncio.run(_demo(config, args.rounds))
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
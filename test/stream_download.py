@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式下载工具
+边接收边写盘，不在内存中缓存完整响应体，同时记录：
+- 首字节时间（TTFB，从请求发出算起）
+- 相邻数据块之间的间隔
+- 持续吞吐（首字节到末字节之间的字节/秒）
+"""
+
+import time
+from typing import Dict, List, Any, Optional
+from dataclasses import dataclass, field
+from pathlib import Path
+
+@dataclass
+class StreamStats:
+    """流式下载统计"""
+    bytes_written: int = 0
+    chunk_count: int = 0
+    time_to_headers: float = 0.0          # 请求发出到收到响应头（秒）
+    time_to_first_byte: Optional[float] = None  # 请求发出到收到首个数据块（秒）
+    total_time: float = 0.0               # 请求发出到收完最后一个数据块（秒）
+    chunk_gaps: List[float] = field(default_factory=list)
+
+    @property
+    def sustained_bytes_per_second(self) -> float:
+        """首字节之后的持续吞吐"""
+        if self.time_to_first_byte is None:
+            return 0.0
+        body_time = self.total_time - self.time_to_first_byte
+        if body_time <= 0:
+            return 0.0
+        return self.bytes_written / body_time
+
+    def to_dict(self) -> Dict[str, Any]:
+        gaps = sorted(self.chunk_gaps)
+        return {
+            'audio_size': self.bytes_written,
+            'chunk_count': self.chunk_count,
+            'time_to_headers': round(self.time_to_headers, 3),
+            'time_to_first_byte': round(self.time_to_first_byte, 3) if self.time_to_first_byte is not None else None,
+            'total_time': round(self.total_time, 3),
+            'chunk_gap_mean': round(sum(gaps) / len(gaps), 4) if gaps else 0.0,
+            'chunk_gap_p95': round(gaps[min(len(gaps) - 1, int(len(gaps) * 0.95))], 4) if gaps else 0.0,
+            'chunk_gap_max': round(gaps[-1], 4) if gaps else 0.0,
+            'bytes_per_second': round(self.sustained_bytes_per_second, 1),
+        }
+
+def stream_to_file(response, output_file, request_start: float, chunk_size: Optional[int] = None,
+                   mode: str = 'wb', clock=time.perf_counter, hasher=None) -> StreamStats:
+    """
+    把 requests 的流式响应（stream=True）逐块写入文件
+
+    request_start 为发出请求时 clock() 的读数；chunk_size 为 None 时按网络到达的块大小读取，
+    这样首字节时间不会被凑满缓冲区的等待拉长。
+    hasher 为 hashlib 对象时，写盘的同时计算内容摘要。
+    """
+    stats = StreamStats(time_to_headers=clock() - request_start)
+    last_chunk_at = None
+
+    with open(Path(output_file), mode) as f:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if not chunk:
+                continue
+            now = clock()
+            if last_chunk_at is None:
+                stats.time_to_first_byte = now - request_start
+            else:
+                stats.chunk_gaps.append(now - last_chunk_at)
+            last_chunk_at = now
+
+            f.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+            stats.bytes_written += len(chunk)
+            stats.chunk_count += 1
+
+    stats.total_time = clock() - request_start
+    return stats
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DashScope 风格异步任务轮询引擎
+图像生成等异步接口先返回 task_id，再通过 /api/v1/tasks/{task_id} 查询结果。
+TaskTracker 统一管理大量在途任务：
+- 每个任务按指数退避 + 随机抖动安排下一次查询，不再固定 sleep
+- 所有任务共用一个调度协程和 AsyncNewAPIClient 连接池，查询并发有上限
+- 到期的任务同一轮一起查询；提供 batch_fetcher 时按批查询，否则逐个并发查询
+- 完成结果通过 asyncio.Future 或回调交付
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import random
+import asyncio
+import argparse
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+
+import aiohttp
+
+from test_new_api_models import APIConfig
+from async_client import AsyncNewAPIClient, PoolConfig
+
+logger = logging.getLogger(__name__)
+
+# 任务终态
+TERMINAL_STATUSES = frozenset({"SUCCEEDED", "FAILED", "CANCELED", "UNKNOWN"})
+
+# 批量查询函数：(client, task_ids) -> {task_id: 任务响应}
+BatchFetcher = Callable[[AsyncNewAPIClient, List[str]], Awaitable[Dict[str, Dict[str, Any]]]]
+# 完成回调：(task_id, 任务响应)
+TaskCallback = Callable[[str, Dict[str, Any]], None]
+
+@dataclass
+class BackoffPolicy:
+    """轮询间隔策略"""
+    initial_delay: float = 1.0   # 提交后第一次查询的延迟（秒）
+    multiplier: float = 1.6      # 每次查询后间隔的增长倍数
+    max_delay: float = 15.0      # 间隔上限
+    jitter: float = 0.25         # 随机抖动比例，打散同时提交的任务
+    timeout: float = 600.0       # 单个任务的最长等待时间
+
+    def delay(self, attempt: int, rng: random.Random = random) -> float:
+        base = min(self.max_delay, self.initial_delay * self.multiplier ** attempt)
+        return max(0.0, base * (1 + rng.uniform(-self.jitter, self.jitter)))
+
+@dataclass
+class TrackedTask:
+    """在途任务"""
+    task_id: str
+    future: asyncio.Future
+    submitted_at: float
+    attempts: int = 0
+    status: str = "PENDING"
+    callbacks: List[TaskCallback] = field(default_factory=list)
+
+def task_status(payload: Dict[str, Any]) -> str:
+    """从任务响应中取出状态"""
+    return payload.get('output', {}).get('task_status', 'UNKNOWN')
+
+class TaskTracker:
+    """异步任务跟踪器"""
+
+    def __init__(self, client: AsyncNewAPIClient, policy: Optional[BackoffPolicy] = None,
+                 batch_fetcher: Optional[BatchFetcher] = None, batch_size: int = 20,
+                 concurrency: int = 32, seed: Optional[int] = None):
+        self.client = client
+        self.policy = policy or BackoffPolicy()
+        self.batch_fetcher = batch_fetcher
+        self.batch_size = batch_size
+        self.tasks: Dict[str, TrackedTask] = {}
+        self._queue: List[Tuple[float, str]] = []  # (下次查询时间, task_id) 小顶堆
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._rng = random.Random(seed)
+        self._runner: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+        self.stats = {'tracked': 0, 'completed': 0, 'failed': 0, 'timeouts': 0, 'polls': 0, 'poll_errors': 0}
+        self._latencies: List[float] = []
+
+    async def __aenter__(self) -> "TaskTracker":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def start(self):
+        if self._runner is None:
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """停止调度，未完成的任务取消"""
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        for task in list(self._inflight):
+            task.cancel()
+        for tracked in self.tasks.values():
+            if not tracked.future.done():
+                tracked.future.cancel()
+
+    # ---- 对外接口 ----
+
+    def track(self, task_id: str, callback: Optional[TaskCallback] = None) -> asyncio.Future:
+        """登记任务，返回完成时解析为任务响应的 Future"""
+        tracked = self.tasks.get(task_id)
+        if tracked is None:
+            loop = asyncio.get_running_loop()
+            tracked = TrackedTask(task_id, loop.create_future(), loop.time())
+            self.tasks[task_id] = tracked
+            self.stats['tracked'] += 1
+            self._schedule(tracked)
+        if callback is not None:
+            if tracked.future.done() and not tracked.future.cancelled() and tracked.future.exception() is None:
+                callback(task_id, tracked.future.result())
+            else:
+                tracked.callbacks.append(callback)
+        return tracked.future
+
+    async def wait_all(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """等待所有已登记任务结束，返回 task_id -> 任务响应（或异常）"""
+        futures = {task_id: tracked.future for task_id, tracked in self.tasks.items()}
+        if futures:
+            await asyncio.wait(list(futures.values()), timeout=timeout)
+        return {
+            task_id: (future.exception() or future.result()) if future.done() and not future.cancelled() else None
+            for task_id, future in futures.items()
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """统计信息：查询次数、平均完成耗时等"""
+        done = len(self._latencies)
+        return {
+            **self.stats,
+            'pending': sum(1 for t in self.tasks.values() if not t.future.done()),
+            'polls_per_task': round(self.stats['polls'] / self.stats['tracked'], 2) if self.stats['tracked'] else 0.0,
+            'average_completion_time': round(sum(self._latencies) / done, 3) if done else 0.0,
+        }
+
+    # ---- 调度 ----
+
+    def _schedule(self, tracked: TrackedTask):
+        delay = self.policy.delay(tracked.attempts, self._rng)
+        loop = asyncio.get_running_loop()
+        heapq.heappush(self._queue, (loop.time() + delay, tracked.task_id))
+        self._wakeup.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            wait = self._queue[0][0] - loop.time()
+            if wait > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # 取出所有到期任务，同一轮查询
+            now = loop.time()
+            due: List[TrackedTask] = []
+            while self._queue and self._queue[0][0] <= now:
+                _, task_id = heapq.heappop(self._queue)
+                tracked = self.tasks.get(task_id)
+                if tracked is not None and not tracked.future.done():
+                    due.append(tracked)
+
+            if self.batch_fetcher is not None:
+                groups = [due[i:i + self.batch_size] for i in range(0, len(due), self.batch_size)]
+            else:
+                groups = [[tracked] for tracked in due]
+            for group in groups:
+                task = loop.create_task(self._poll(group))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+
+    async def _fetch_one(self, task_id: str) -> Optional[Dict[str, Any]]:
+        response = await self.client.request('GET', f'/api/v1/tasks/{task_id}')
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code == 429 or response.status_code >= 500:
+            return None  # 暂时性错误，按退避重试
+        raise RuntimeError(f"查询任务 {task_id} 失败: HTTP {response.status_code} - {response.text[:200]}")
+
+    async def _poll(self, group: List[TrackedTask]):
+        async with self._semaphore:
+            self.stats['polls'] += len(group)
+            try:
+                if self.batch_fetcher is not None:
+                    payloads = await self.batch_fetcher(self.client, [t.task_id for t in group])
+                else:
+                    payloads = {group[0].task_id: await self._fetch_one(group[0].task_id)}
+            except asyncio.CancelledError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # 连接错误、请求超时都是暂时性的，组内任务按退避重试，直到超过任务的最长等待时间
+                logger.warning(f"查询 {len(group)} 个任务失败，稍后重试: {str(e) or type(e).__name__}")
+                payloads = {}
+            except Exception as e:
+                if self.batch_fetcher is None:
+                    self._finish(group[0], exception=e)
+                    return
+                # 批量查询失败：组内任务都按退避重试
+                logger.warning(f"批量查询 {len(group)} 个任务失败: {str(e)}")
+                payloads = {}
+
+        for tracked in group:
+            payload = payloads.get(tracked.task_id)
+            if payload is None:
+                self.stats['poll_errors'] += 1
+            else:
+                tracked.status = task_status(payload)
+                if tracked.status in TERMINAL_STATUSES:
+                    self._finish(tracked, payload)
+                    continue
+            self._retry(tracked)
+
+    def _retry(self, tracked: TrackedTask):
+        loop = asyncio.get_running_loop()
+        tracked.attempts += 1
+        if loop.time() - tracked.submitted_at > self.policy.timeout:
+            self.stats['timeouts'] += 1
+            self._finish(tracked, exception=asyncio.TimeoutError(
+                f"任务 {tracked.task_id} 超过 {self.policy.timeout}秒未完成（最后状态 {tracked.status}）"))
+            return
+        self._schedule(tracked)
+
+    def _finish(self, tracked: TrackedTask, payload: Optional[Dict[str, Any]] = None,
+                exception: Optional[BaseException] = None):
+        if tracked.future.done():
+            return
+        if exception is not None:
+            self.stats['failed'] += 1
+            tracked.future.set_exception(exception)
+            logger.error(f"❌ 任务 {tracked.task_id} 异常: {str(exception)}")
+            return
+
+        self.stats['completed' if tracked.status == 'SUCCEEDED' else 'failed'] += 1
+        self._latencies.append(asyncio.get_running_loop().time() - tracked.submitted_at)
+        tracked.future.set_result(payload)
+        for callback in tracked.callbacks:
+            try:
+                callback(tracked.task_id, payload)
+            except Exception as e:
+                logger.error(f"任务 {tracked.task_id} 的回调出错: {str(e)}")
+        tracked.callbacks.clear()
+
+async def wait_for_tasks(base_url: str, api_key: str, task_ids: List[str],
+                         policy: Optional[BackoffPolicy] = None, timeout: float = 30) -> Dict[str, Any]:
+    """便捷函数：轮询一组任务直到全部结束，返回 {'results': task_id -> 任务响应或异常, 'stats': 统计信息}"""
+    config = APIConfig(base_url=base_url, api_key=api_key, timeout=timeout)
+    async with AsyncNewAPIClient(config, PoolConfig()) as client:
+        async with TaskTracker(client, policy) as tracker:
+            for task_id in task_ids:
+                tracker.track(task_id)
+            results = await tracker.wait_all()
+            return {'results': results, 'stats': tracker.summary()}
+
+def main():
+    """主函数：轮询命令行给出的任务 ID"""
+    parser = argparse.ArgumentParser(description="DashScope 风格异步任务轮询")
+    parser.add_argument('task_ids', nargs='+', help="任务 ID")
+    parser.add_argument('--base-url', default="https://dashscope.aliyuncs.com")
+    parser.add_argument('--initial-delay', type=float, default=1.0)
+    parser.add_argument('--max-delay', type=float, default=15.0)
+    parser.add_argument('--timeout', type=float, default=600.0, help="单个任务的最长等待时间（秒）")
+    args = parser.parse_args()
+
+    api_key = os.getenv("ALI_API_KEY") or os.getenv("NEW_API_KEY")
+    if not api_key:
+        print("❌ 请设置ALI_API_KEY或NEW_API_KEY环境变量")
+        sys.exit(1)
+
+    policy = BackoffPolicy(initial_delay=args.initial_delay, max_delay=args.max_delay, timeout=args.timeout)
+    start_time = time.time()
+    outcome = asyncio.run(wait_for_tasks(args.base_url, api_key, args.task_ids, policy))
+    for task_id, result in outcome['results'].items():
+        if isinstance(result, dict):
+            print(f"📋 {task_id}: {task_status(result)}")
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+        else:
+            print(f"❌ {task_id}: {result}")
+    print(f"\n⏱️  总耗时: {time.time() - start_time:.2f}秒")
+    print(f"📊 统计: {json.dumps(outcome['stats'], ensure_ascii=False)}")
+
+if __name__ == "__main__":
+    main()
@@ -9,10 +9,25 @@ import requests
 import json
 import time
 
+from stream_download import stream_to_file
+
 # 配置
 API_KEY = "sk-WFXP99kKWeu9BhV3UiypR6wj2tb2x5d08TLGWgiLHiDG9r8Q"
 BASE_URL = "http://127.0.0.1:3000"
 
+def save_streamed_audio(response, output_file: str, start_time: float):
+    """边接收边写盘，打印首字节时间、块间隔和持续吞吐"""
+    stats = stream_to_file(response, output_file, start_time)
+    summary = stats.to_dict()
+    print(f"   首字节时间: {stats.time_to_first_byte or 0:.3f}秒")
+    print(f"   响应时间: {stats.total_time:.2f}秒")
+    print(f"   块间隔: 平均 {summary['chunk_gap_mean'] * 1000:.1f}ms，"
+          f"最大 {summary['chunk_gap_max'] * 1000:.1f}ms")
+    print(f"   持续吞吐: {stats.sustained_bytes_per_second / 1024:.1f} KB/s")
+    print(f"   ✅ 成功！音频大小: {stats.bytes_written} 字节")
+    print(f"   音频保存至: {output_file}")
+    return stats
+
 def test_short_text_tts():
     """测试短文本TTS（使用WebSocket API）"""
     print("🔍 测试短文本TTS...")
@@ -33,24 +48,15 @@ def test_short_text_tts():
     
     try:
         print(f"   发送请求: {data['input']}")
-        start_time = time.time()
-        response = requests.post(url, headers=headers, json=data, timeout=60)
-        end_time = time.time()
-        
-        print(f"   状态码: {response.status_code}")
-        print(f"   响应时间: {end_time - start_time:.2f}秒")
-        
-        if response.status_code == 200:
-            audio_size = len(response.content)
-            print(f"   ✅ 成功！音频大小: {audio_size} 字节")
+        start_time = time.perf_counter()
+        with requests.post(url, headers=headers, json=data, timeout=60, stream=True) as response:
+            print(f"   状态码: {response.status_code}")
             
-            # 保存音频文件
-            output_file = f"test_short_text_{int(time.time())}.mp3"
-            with open(output_file, "wb") as f:
-                f.write(response.content)
-            print(f"   音频保存至: {output_file}")
-        else:
-            print(f"   ❌ 失败: {response.text}")
+            if response.status_code == 200:
+                save_streamed_audio(response, f"test_short_text_{int(time.time())}.mp3", start_time)
+            else:
+                print(f"   响应时间: {time.perf_counter() - start_time:.2f}秒")
+                print(f"   ❌ 失败: {response.text}")
             
     except Exception as e:
         print(f"   ❌ 异常: {str(e)}")
@@ -86,24 +92,15 @@ def test_long_text_tts():
     
     try:
         print(f"   文本长度: {len(data['input'])} 字符")
-        start_time = time.time()
-        response = requests.post(url, headers=headers, json=data, timeout=120)
-        end_time = time.time()
-        
-        print(f"   状态码: {response.status_code}")
-        print(f"   响应时间: {end_time - start_time:.2f}秒")
-        
-        if response.status_code == 200:
-            audio_size = len(response.content)
-            print(f"   ✅ 成功！音频大小: {audio_size} 字节")
+        start_time = time.perf_counter()
+        with requests.post(url, headers=headers, json=data, timeout=120, stream=True) as response:
+            print(f"   状态码: {response.status_code}")
             
-            # 保存音频文件
-            output_file = f"test_long_text_{int(time.time())}.mp3"
-            with open(output_file, "wb") as f:
-                f.write(response.content)
-            print(f"   音频保存至: {output_file}")
-        else:
-            print(f"   ❌ 失败: {response.text}")
+            if response.status_code == 200:
+                save_streamed_audio(response, f"test_long_text_{int(time.time())}.mp3", start_time)
+            else:
+                print(f"   响应时间: {time.perf_counter() - start_time:.2f}秒")
+                print(f"   ❌ 失败: {response.text}")
             
     except Exception as e:
         print(f"   ❌ 异常: {str(e)}")
@@ -134,9 +131,9 @@ def test_different_voices():
         }
         
         try:
-            start_time = time.time()
+            start_time = time.perf_counter()
             response = requests.post(url, headers=headers, json=data, timeout=60)
-            end_time = time.time()
+            end_time = time.perf_counter()
             
             print(f"     状态码: {response.status_code}")
             print(f"     响应时间: {end_time - start_time:.2f}秒")
@@ -15,11 +15,15 @@ import json
 import time
 import base64
 import requests
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 from pathlib import Path
 import logging
 
+from latency_metrics import MetricsRecorder, now_ns, ns_to_seconds, request_model
+from metrics_exporter import GATEWAY_METRICS
+from traffic_capture import capture_from_env
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -31,6 +35,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 文本嵌入默认测试文本
+DEFAULT_EMBEDDING_TEXTS = [
+    "这是一个测试文本。",
+    "人工智能技术正在快速发展。",
+    "Python是一种流行的编程语言。"
+]
+
 @dataclass
 class APIConfig:
     """API配置类"""
@@ -54,15 +65,48 @@ class NewAPIClient:
             "Authorization": f"Bearer {config.api_key}",
             "Content-Type": "application/json"
         }
+        self.metrics = MetricsRecorder()  # 按 (模型, 接口, 阶段) 记录的延迟直方图
+        self.exporter = GATEWAY_METRICS   # Prometheus 指标
+        self.capture = capture_from_env() # 设置 NEW_API_CAPTURE 时录制请求
     
     def _make_request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
-        """发送HTTP请求"""
+        """发送HTTP请求，并记录首字节 / 响应体 / 总耗时
+
+        requests 不提供连接建立的回调，连接耗时无法与首字节分开（包含在 ttfb 中），
+        因此同步客户端不记录 connect 阶段，报告中也不会出现该阶段；需要连接耗时时使用 AsyncNewAPIClient。
+        """
         url = f"{self.config.base_url.rstrip('/')}/{endpoint.lstrip('/')}"
         kwargs.setdefault('timeout', self.config.timeout)
         kwargs.setdefault('headers', self.headers)
+        stream = kwargs.pop('stream', False)
+        model = request_model(kwargs)
+        timer = self.metrics.timer(model, endpoint)
+        captured = self.capture.describe_request(method, endpoint, kwargs) if self.capture else None
         
         logger.info(f"发送请求: {method} {url}")
-        response = requests.request(method, url, **kwargs)
+        self.exporter.request_started(model, endpoint)
+        status, sent, received = 'error', 0, 0
+        try:
+            # 始终以流式方式发出：响应头到达即首字节时间，非流式调用随后读完响应体
+            response = requests.request(method, url, stream=True, **kwargs)
+            timer.first_byte()
+            status = str(response.status_code)
+            body = response.request.body
+            sent = len(body) if isinstance(body, (bytes, str)) else getattr(body, 'bytes_sent', 0)
+            if stream:
+                # 响应体由调用方消费，这里只能记录首字节时间
+                self.metrics.record_ns(model, endpoint, 'ttfb', timer.first_byte_ns - timer.start_ns)
+            else:
+                received = len(response.content)
+                timer.finish()
+        except requests.exceptions.Timeout:
+            status = 'timeout'
+            raise
+        finally:
+            elapsed = ns_to_seconds(now_ns() - timer.start_ns)
+            self.exporter.request_finished(model, endpoint, status, elapsed, sent, received)
+            if captured is not None:
+                self.capture.record_http(captured, timer.start_ns, status, elapsed, received)
         
         if response.status_code != 200:
             logger.error(f"请求失败: {response.status_code} - {response.text}")
@@ -75,63 +119,120 @@ class ParaformerTester:
     def __init__(self, client: NewAPIClient):
         self.client = client
         self.model = "paraformer-realtime-8k-v2"
+        self.endpoint = '/v1/realtime'
+        self.audio_files = {}  # 路径 -> MappedAudioFile，同一文件只映射一次
     
-    def test_transcription(self, audio_file_path: str = None, audio_data: bytes = None) -> Dict[str, Any]:
-        """测试语音转文字功能"""
-        logger.info(f"开始测试 {self.model} 语音识别功能")
+    def _map_audio_file(self, audio_file_path: str):
+        """以内存映射方式打开音频文件，不把整个文件读入内存"""
+        from audio_file import MappedAudioFile
+        
+        if audio_file_path not in self.audio_files:
+            self.audio_files[audio_file_path] = MappedAudioFile(audio_file_path).open()
+            logger.info(f"加载音频文件: {audio_file_path}")
+        return self.audio_files[audio_file_path]
+    
+    def close(self):
+        """释放已映射的音频文件"""
+        for mapped in self.audio_files.values():
+            mapped.close()
+        self.audio_files.clear()
+    
+    def build_request(self, audio_file_path: str = None, audio_data: bytes = None) -> Tuple[str, str, Dict[str, Any]]:
+        """
+        构建语音识别请求，返回 (method, endpoint, kwargs)
+        请求体是流式 multipart 编码器，只能发送一次，每次请求都要重新构建
+        """
+        from multipart_stream import StreamingMultipartEncoder
         
         # 准备音频数据
         if audio_file_path and os.path.exists(audio_file_path):
-            with open(audio_file_path, 'rb') as f:
-                audio_data = f.read()
-            logger.info(f"加载音频文件: {audio_file_path}")
+            # 映射区域上的文件对象，按块读取发送，不复制整个文件
+            audio_data = self._map_audio_file(audio_file_path).reader()
         elif not audio_data:
             # 生成测试音频数据（这里用空字节作为示例）
             audio_data = b""
             logger.warning("未提供音频数据，使用空数据进行接口测试")
         
         # 使用OpenAI Whisper API兼容接口
-        files = {
+        encoder = StreamingMultipartEncoder({
             'file': ('audio.wav', audio_data, 'audio/wav'),
-            'model': (None, self.model),
-            'response_format': (None, 'json'),
-            'language': (None, 'zh')  # 中文
+            'model': self.model,
+            'response_format': 'json',
+            'language': 'zh'  # 中文
+        })
+        
+        return 'POST', self.endpoint, {
+            'data': encoder,
+            'headers': {
+                "Authorization": f"Bearer {self.client.config.api_key}",
+                "Content-Type": encoder.content_type,
+                "Content-Length": str(encoder.content_length)
+            }
+        }
+    
+    def parse_response(self, response, response_time: float) -> Dict[str, Any]:
+        """解析语音识别响应"""
+        result = {
+            'success': response.status_code == 200,
+            'status_code': response.status_code,
+            'response_time': round(response_time, 4),
+            'model': self.model
         }
         
+        if response.status_code == 200:
+            try:
+                data = response.json()
+                result.update({
+                    'text': data.get('text', ''),
+                    'language': data.get('language', 'unknown'),
+                    'duration': data.get('duration', 0)
+                })
+                logger.info(f"识别成功: {data.get('text', '')[:100]}")
+            except json.JSONDecodeError:
+                result['raw_response'] = response.text
+                logger.warning("响应不是有效的JSON格式")
+        else:
+            result['error'] = response.text
+            logger.error(f"识别失败: {response.text}")
+        
+        return result
+    
+    def _stream_upload(self, audio_file_path: str, progress_callback=None) -> Dict[str, Any]:
+        """流式上传：按块从磁盘读取音频，分别记录上传和服务端处理耗时"""
+        from multipart_stream import post_multipart
+        
+        fields = {
+            'file': ('audio.wav', audio_file_path, 'audio/wav'),
+            'model': self.model,
+            'response_format': 'json',
+            'language': 'zh'
+        }
+        url = f"{self.client.config.base_url.rstrip('/')}/{self.endpoint.lstrip('/')}"
+        logger.info(f"发送请求: POST {url}（流式上传）")
+        response, timings = post_multipart(
+            url, fields,
+            headers={"Authorization": f"Bearer {self.client.config.api_key}"},
+            timeout=self.client.config.timeout,
+            progress_callback=progress_callback
+        )
+        result = self.parse_response(response, timings['total_time'])
+        result.update(timings)
+        return result
+    
+    def test_transcription(self, audio_file_path: str = None, audio_data: bytes = None,
+                           stream_upload: bool = False, progress_callback=None) -> Dict[str, Any]:
+        """测试语音转文字功能，stream_upload=True 时从磁盘流式上传音频文件"""
+        logger.info(f"开始测试 {self.model} 语音识别功能")
+        
         try:
-            start_time = time.time()
-            response = self.client._make_request(
-                'POST', 
-                '/v1/realtime',
-                files=files,
-                headers={"Authorization": f"Bearer {self.client.config.api_key}"}  # 只保留Authorization
-            )
-            end_time = time.time()
-            
-            result = {
-                'success': response.status_code == 200,
-                'status_code': response.status_code,
-                'response_time': round(end_time - start_time, 2),
-                'model': self.model
-            }
+            if stream_upload and audio_file_path and os.path.exists(audio_file_path):
+                return self._stream_upload(audio_file_path, progress_callback)
             
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    result.update({
-                        'text': data.get('text', ''),
-                        'language': data.get('language', 'unknown'),
-                        'duration': data.get('duration', 0)
-                    })
-                    logger.info(f"识别成功: {data.get('text', '')[:100]}")
-                except json.JSONDecodeError:
-                    result['raw_response'] = response.text
-                    logger.warning("响应不是有效的JSON格式")
-            else:
-                result['error'] = response.text
-                logger.error(f"识别失败: {response.text}")
+            method, endpoint, kwargs = self.build_request(audio_file_path, audio_data)
+            start_time = time.perf_counter()
+            response = self.client._make_request(method, endpoint, **kwargs)
             
-            return result
+            return self.parse_response(response, time.perf_counter() - start_time)
             
         except Exception as e:
             logger.error(f"测试 {self.model} 时发生异常: {str(e)}")
@@ -140,6 +241,8 @@ class ParaformerTester:
                 'error': str(e),
                 'model': self.model
             }
+        finally:
+            self.close()
 
 class CosyVoiceTester:
     """CosyVoice语音合成测试器"""
@@ -148,10 +251,8 @@ class CosyVoiceTester:
         self.client = client
         self.model = "cosyvoice-v2"
     
-    def test_speech_synthesis(self, text: str = "你好，这是一个语音合成测试。", voice: str = "zh-CN-XiaoxiaoNeural") -> Dict[str, Any]:
-        """测试文字转语音功能"""
-        logger.info(f"开始测试 {self.model} 语音合成功能")
-        
+    def build_request(self, text: str = "你好，这是一个语音合成测试。", voice: str = "zh-CN-XiaoxiaoNeural") -> Tuple[str, str, Dict[str, Any]]:
+        """构建语音合成请求，返回 (method, endpoint, kwargs)"""
         # 使用OpenAI TTS API兼容接口
         payload = {
             "model": self.model,
@@ -160,45 +261,92 @@ class CosyVoiceTester:
             "response_format": "mp3",
             "speed": 1.0
         }
+        return 'POST', '/v1/audio/speech', {'json': payload}
+    
+    def parse_response(self, response, response_time: float, text: str, voice: str) -> Dict[str, Any]:
+        """解析语音合成响应并保存音频文件"""
+        result = {
+            'success': response.status_code == 200,
+            'status_code': response.status_code,
+            'response_time': round(response_time, 4),
+            'model': self.model,
+            'input_text': text,
+            'voice': voice
+        }
         
-        try:
-            start_time = time.time()
-            response = self.client._make_request(
-                'POST',
-                '/v1/audio/speech',
-                json=payload
-            )
-            end_time = time.time()
+        if response.status_code == 200:
+            # 保存音频文件
+            output_dir = Path("test_outputs")
+            output_dir.mkdir(exist_ok=True)
             
-            result = {
-                'success': response.status_code == 200,
-                'status_code': response.status_code,
-                'response_time': round(end_time - start_time, 2),
-                'model': self.model,
-                'input_text': text,
-                'voice': voice
-            }
+            output_file = output_dir / f"cosyvoice_output_{int(time.time())}.mp3"
+            with open(output_file, 'wb') as f:
+                f.write(response.content)
             
-            if response.status_code == 200:
-                # 保存音频文件
-                output_dir = Path("test_outputs")
-                output_dir.mkdir(exist_ok=True)
-                
-                output_file = output_dir / f"cosyvoice_output_{int(time.time())}.mp3"
-                with open(output_file, 'wb') as f:
-                    f.write(response.content)
-                
-                result.update({
-                    'audio_size': len(response.content),
-                    'output_file': str(output_file)
-                })
-                logger.info(f"语音合成成功，音频大小: {len(response.content)} 字节")
-                logger.info(f"音频文件保存至: {output_file}")
-            else:
-                result['error'] = response.text
-                logger.error(f"语音合成失败: {response.text}")
+            result.update({
+                'audio_size': len(response.content),
+                'output_file': str(output_file)
+            })
+            logger.info(f"语音合成成功，音频大小: {len(response.content)} 字节")
+            logger.info(f"音频文件保存至: {output_file}")
+        else:
+            result['error'] = response.text
+            logger.error(f"语音合成失败: {response.text}")
+        
+        return result
+    
+    def _stream_response(self, response, start_time: float, text: str, voice: str) -> Dict[str, Any]:
+        """流式模式：边接收边写盘，并记录首字节时间和块间隔"""
+        from stream_download import stream_to_file
+        
+        result = {
+            'success': response.status_code == 200,
+            'status_code': response.status_code,
+            'model': self.model,
+            'input_text': text,
+            'voice': voice,
+            'streaming': True
+        }
+        
+        if response.status_code == 200:
+            output_dir = Path("test_outputs")
+            output_dir.mkdir(exist_ok=True)
             
-            return result
+            output_file = output_dir / f"cosyvoice_output_{int(time.time())}.mp3"
+            stats = stream_to_file(response, output_file, start_time)
+            
+            result.update(stats.to_dict())
+            result.update({
+                'response_time': round(stats.total_time, 4),
+                'output_file': str(output_file)
+            })
+            logger.info(f"语音合成成功，首字节时间: {stats.time_to_first_byte or 0:.3f}秒，"
+                        f"音频大小: {stats.bytes_written} 字节，{stats.chunk_count} 个数据块")
+            logger.info(f"音频文件保存至: {output_file}")
+        else:
+            result['response_time'] = round(time.perf_counter() - start_time, 4)
+            result['error'] = response.text
+            logger.error(f"语音合成失败: {response.text}")
+        
+        return result
+    
+    def test_speech_synthesis(self, text: str = "你好，这是一个语音合成测试。", voice: str = "zh-CN-XiaoxiaoNeural",
+                              stream: bool = False) -> Dict[str, Any]:
+        """测试文字转语音功能，stream=True 时流式写盘并测量首字节时间"""
+        logger.info(f"开始测试 {self.model} 语音合成功能")
+        
+        try:
+            method, endpoint, kwargs = self.build_request(text, voice)
+            if stream:
+                start_time = time.perf_counter()
+                response = self.client._make_request(method, endpoint, stream=True, **kwargs)
+                with response:
+                    return self._stream_response(response, start_time, text, voice)
+            
+            start_time = time.perf_counter()
+            response = self.client._make_request(method, endpoint, **kwargs)
+            
+            return self.parse_response(response, time.perf_counter() - start_time, text, voice)
             
         except Exception as e:
             logger.error(f"测试 {self.model} 时发生异常: {str(e)}")
@@ -211,68 +359,154 @@ class CosyVoiceTester:
 class TextEmbeddingTester:
     """文本嵌入测试器"""
     
-    def __init__(self, client: NewAPIClient):
+    def __init__(self, client: NewAPIClient, cache=None, encoding_format: str = "float"):
         self.client = client
         self.model = "text-embedding-v4"
+        self.encoding_format = encoding_format  # "float" 或 "base64"
+        self.cache = cache  # 可选的 embedding_cache.EmbeddingCache
     
-    def test_embedding(self, texts: List[str] = None) -> Dict[str, Any]:
-        """测试文本嵌入功能"""
-        logger.info(f"开始测试 {self.model} 文本嵌入功能")
-        
-        if texts is None:
-            texts = [
-                "这是一个测试文本。",
-                "人工智能技术正在快速发展。",
-                "Python是一种流行的编程语言。"
-            ]
-        
+    def lookup_cache(self, texts: List[str]) -> Tuple[Dict[int, List[float]], List[str]]:
+        """查询缓存，返回 (命中的 下标->向量, 未命中的文本)"""
+        if self.cache is None:
+            return {}, list(texts)
+        hits, misses = {}, []
+        for i, text in enumerate(texts):
+            vector = self.cache.get(self.model, self.encoding_format, text)
+            if vector is None:
+                misses.append(text)
+            else:
+                hits[i] = vector
+        return hits, misses
+    
+    def merge_cached(self, result: Dict[str, Any], texts: List[str], hits: Dict[int, List[float]]) -> Dict[str, Any]:
+        """把缓存命中情况合并进测试结果"""
+        if self.cache is None:
+            return result
+        result.update({
+            'input_count': len(texts),
+            'cache_hits': len(hits),
+            'cache_misses': len(texts) - len(hits)
+        })
+        if hits and not result.get('embedding_dimension'):
+            result['embedding_dimension'] = len(next(iter(hits.values())))
+        if len(hits) == len(texts):
+            result['embedding_count'] = len(texts)
+            logger.info(f"全部 {len(texts)} 条文本命中缓存，未发送请求")
+        return result
+    
+    def build_request(self, texts: List[str] = None) -> Tuple[str, str, Dict[str, Any]]:
+        """构建文本嵌入请求，返回 (method, endpoint, kwargs)"""
         # 使用OpenAI Embeddings API兼容接口
         payload = {
             "model": self.model,
             "input": texts,
-            "encoding_format": "float"
+            "encoding_format": self.encoding_format
         }
+        return 'POST', '/v1/embeddings', {'json': payload}
+    
+    def parse_response(self, response, response_time: float, texts: List[str]) -> Dict[str, Any]:
+        """解析文本嵌入响应，base64 格式直接解码为 float32 数组"""
+        from embedding_codec import decode_embeddings, vector_preview
         
+        result = {
+            'success': response.status_code == 200,
+            'status_code': response.status_code,
+            'response_time': round(response_time, 4),
+            'model': self.model,
+            'input_count': len(texts)
+        }
+        
+        if response.status_code == 200:
+            try:
+                data = response.json()
+                vectors = decode_embeddings(data.get('data', []), self.encoding_format)
+                
+                if self.cache is not None:
+                    for text, vector in zip(texts, vectors):
+                        self.cache.put(self.model, self.encoding_format, text, vector)
+                
+                result.update({
+                    'embedding_count': len(vectors),
+                    'embedding_dimension': len(vectors[0]) if len(vectors) else 0,
+                    'encoding_format': self.encoding_format,
+                    'payload_size': len(response.content),
+                    'usage': data.get('usage', {}),
+                    'embeddings_preview': {
+                        f'text_{i}': vector_preview(vector)  # 只显示前5个维度
+                        for i, vector in enumerate(vectors[:3])  # 最多显示3个样本
+                    }
+                })
+                logger.info(f"嵌入生成成功，维度: {result['embedding_dimension']}")
+            except (json.JSONDecodeError, KeyError, IndexError, ValueError) as e:
+                result['raw_response'] = response.text
+                logger.warning(f"解析嵌入响应时出错: {str(e)}")
+        else:
+            result['error'] = response.text
+            logger.error(f"嵌入生成失败: {response.text}")
+        
+        return result
+    
+    def compare_encoding_formats(self, texts: List[str] = None) -> Dict[str, Any]:
+        """分别用 float 和 base64 请求同一批文本，对比响应体积和解析耗时"""
+        from embedding_codec import ENCODING_FORMATS, parse_embedding_response
+        
+        texts = texts or DEFAULT_EMBEDDING_TEXTS
+        logger.info(f"开始对比 {self.model} 的 float / base64 编码格式")
+        
+        comparison = {}
+        result = {'success': True, 'model': self.model, 'input_count': len(texts)}
+        original_format = self.encoding_format
         try:
-            start_time = time.time()
-            response = self.client._make_request(
-                'POST',
-                '/v1/embeddings',
-                json=payload
-            )
-            end_time = time.time()
-            
-            result = {
-                'success': response.status_code == 200,
-                'status_code': response.status_code,
-                'response_time': round(end_time - start_time, 2),
-                'model': self.model,
-                'input_count': len(texts)
-            }
+            for encoding_format in ENCODING_FORMATS:
+                self.encoding_format = encoding_format
+                method, endpoint, kwargs = self.build_request(texts)
+                start_time = time.perf_counter()
+                response = self.client._make_request(method, endpoint, **kwargs)
+                response_time = time.perf_counter() - start_time
+                
+                if response.status_code != 200:
+                    result.update({'success': False, 'status_code': response.status_code, 'error': response.text})
+                    break
+                parsed = parse_embedding_response(response.content, encoding_format)
+                comparison[encoding_format] = {
+                    'payload_size': len(response.content),
+                    'response_time': round(response_time, 4),
+                    'json_parse_ms': round(parsed['json_parse_time'] * 1000, 3),
+                    'decode_ms': round(parsed['decode_time'] * 1000, 3),
+                    'parse_ms': round(parsed['parse_time'] * 1000, 3)
+                }
+        except Exception as e:
+            logger.error(f"对比编码格式时发生异常: {str(e)}")
+            result.update({'success': False, 'error': str(e)})
+        finally:
+            self.encoding_format = original_format
+        
+        if 'float' in comparison and 'base64' in comparison:
+            comparison['size_ratio'] = round(comparison['float']['payload_size'] / max(comparison['base64']['payload_size'], 1), 2)
+            comparison['parse_speedup'] = round(comparison['float']['parse_ms'] / max(comparison['base64']['parse_ms'], 1e-6), 2)
+            logger.info(f"float/base64 体积比: {comparison['size_ratio']}，解析加速: {comparison['parse_speedup']}x")
+        result['encoding_comparison'] = comparison
+        return result
+    
+    def test_embedding(self, texts: List[str] = None) -> Dict[str, Any]:
+        """测试文本嵌入功能"""
+        logger.info(f"开始测试 {self.model} 文本嵌入功能")
+        
+        if texts is None:
+            texts = DEFAULT_EMBEDDING_TEXTS
+        
+        try:
+            hits, misses = self.lookup_cache(texts)
+            if not misses:
+                result = {'success': True, 'status_code': 200, 'response_time': 0.0, 'model': self.model}
+                return self.merge_cached(result, texts, hits)
             
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    embeddings = data.get('data', [])
-                    
-                    result.update({
-                        'embedding_count': len(embeddings),
-                        'embedding_dimension': len(embeddings[0]['embedding']) if embeddings else 0,
-                        'usage': data.get('usage', {}),
-                        'embeddings_preview': {
-                            f'text_{i}': embedding['embedding'][:5]  # 只显示前5个维度
-                            for i, embedding in enumerate(embeddings[:3])  # 最多显示3个样本
-                        }
-                    })
-                    logger.info(f"嵌入生成成功，维度: {result['embedding_dimension']}")
-                except (json.JSONDecodeError, KeyError, IndexError) as e:
-                    result['raw_response'] = response.text
-                    logger.warning(f"解析嵌入响应时出错: {str(e)}")
-            else:
-                result['error'] = response.text
-                logger.error(f"嵌入生成失败: {response.text}")
+            method, endpoint, kwargs = self.build_request(misses)
+            start_time = time.perf_counter()
+            response = self.client._make_request(method, endpoint, **kwargs)
             
-            return result
+            result = self.parse_response(response, time.perf_counter() - start_time, misses)
+            return self.merge_cached(result, texts, hits)
             
         except Exception as e:
             logger.error(f"测试 {self.model} 时发生异常: {str(e)}")
@@ -285,10 +519,12 @@ class TextEmbeddingTester:
 class TestRunner:
     """测试运行器"""
     
-    def __init__(self, config: APIConfig):
+    def __init__(self, config: APIConfig, embedding_cache=None):
         self.config = config
         self.client = NewAPIClient(config)
+        self.embedding_cache = embedding_cache  # 可选的 embedding_cache.EmbeddingCache
         self.results = []
+        self.load_results = []
     
     def run_all_tests(self, audio_file: str = None, test_text: str = None, embedding_texts: List[str] = None) -> Dict[str, Any]:
         """运行所有模型测试"""
@@ -306,15 +542,35 @@ class TestRunner:
         #)
         #self.results.append(cosyvoice_result)
         
-        # 测试Text Embedding
-        #embedding_tester = TextEmbeddingTester(self.client)
-        #embedding_result = embedding_tester.test_embedding(embedding_texts)
-        #self.results.append(embedding_result)
+        # 测试Text Embedding（仅在配置了嵌入缓存时运行）
+        if self.embedding_cache is not None:
+            embedding_tester = TextEmbeddingTester(self.client, cache=self.embedding_cache)
+            embedding_result = embedding_tester.test_embedding(embedding_texts)
+            self.results.append(embedding_result)
         
         # 生成测试报告
         report = self.generate_report()
         return report
     
+    def run_encoding_comparison(self, embedding_texts: List[str] = None) -> Dict[str, Any]:
+        """对比嵌入接口 float / base64 两种编码格式的响应体积和解析耗时"""
+        embedding_tester = TextEmbeddingTester(self.client)
+        self.results.append(embedding_tester.compare_encoding_formats(embedding_texts))
+        return self.generate_report()
+    
+    def run_load_tests(self, load_config, models: List[str] = None, audio_file: str = None,
+                       test_text: str = None, embedding_texts: List[str] = None) -> Dict[str, Any]:
+        """压测模式：对每个模型驱动多个虚拟用户，load_config 为 load_runner.LoadConfig"""
+        import asyncio
+        from load_runner import run_load_tests
+        
+        logger.info("开始运行模型压测")
+        self.load_results.extend(asyncio.run(run_load_tests(
+            self.config, load_config, models,
+            audio_file=audio_file, test_text=test_text, embedding_texts=embedding_texts
+        )))
+        return self.generate_report()
+    
     def generate_report(self) -> Dict[str, Any]:
         """生成测试报告"""
         successful_tests = sum(1 for r in self.results if r.get('success', False))
@@ -330,6 +586,15 @@ class TestRunner:
             'test_results': self.results,
             'test_time': time.strftime("%Y-%m-%d %H:%M:%S")
         }
+        if self.load_results:
+            report['load_test_results'] = self.load_results
+        if self.embedding_cache is not None:
+            self.embedding_cache.flush()
+            report['embedding_cache'] = self.embedding_cache.stats()
+        if self.client.metrics:
+            # 分位数便于阅读，序列化直方图便于跨报告合并
+            report['latency'] = self.client.metrics.summary()
+            report['latency_histograms'] = self.client.metrics.to_dict()
         
         # 保存测试报告
         report_file = f"test_report_{int(time.time())}.json"
@@ -353,6 +618,11 @@ def print_results(report: Dict[str, Any]):
     print(f"   成功率: {summary['success_rate']}")
     print(f"   测试时间: {report['test_time']}")
     
+    if 'embedding_cache' in report:
+        cache = report['embedding_cache']
+        print(f"💾 嵌入缓存: 命中 {cache['hits']}，未命中 {cache['misses']}，"
+              f"命中率 {cache['hit_rate']}，条目 {cache['entries']}/{cache['max_entries']}")
+    
     print(f"\n📋 详细结果:")
     for i, result in enumerate(report['test_results'], 1):
         status = "✅ 成功" if result.get('success') else "❌ 失败"
@@ -362,14 +632,50 @@ def print_results(report: Dict[str, Any]):
         if result.get('success'):
             if 'text' in result:  # Paraformer
                 print(f"   识别文本: {result['text'][:100]}...")
+                if 'upload_time' in result:
+                    print(f"   上传耗时: {result['upload_time']}秒  服务端处理: {result['server_time']}秒")
             elif 'audio_size' in result:  # CosyVoice
                 print(f"   音频大小: {result['audio_size']} 字节")
+                if result.get('streaming'):
+                    print(f"   首字节时间: {result['time_to_first_byte']}秒")
+                    print(f"   持续吞吐: {result['bytes_per_second']} 字节/秒")
                 print(f"   输出文件: {result['output_file']}")
+            elif 'encoding_comparison' in result:  # Embedding 编码格式对比
+                comparison = result['encoding_comparison']
+                for encoding_format in ('float', 'base64'):
+                    if encoding_format in comparison:
+                        item = comparison[encoding_format]
+                        print(f"   {encoding_format}: 响应 {item['payload_size']} 字节，解析 {item['parse_ms']}ms")
+                if 'size_ratio' in comparison:
+                    print(f"   体积比: {comparison['size_ratio']}x  解析加速: {comparison['parse_speedup']}x")
             elif 'embedding_dimension' in result:  # Embedding
                 print(f"   嵌入维度: {result['embedding_dimension']}")
                 print(f"   处理文本数: {result['input_count']}")
+                if 'cache_hits' in result:
+                    print(f"   缓存命中: {result['cache_hits']}/{result['input_count']}")
         else:
             print(f"   错误信息: {result.get('error', 'Unknown error')}")
+    
+    if report.get('latency'):
+        print(f"\n⏱️  延迟分位 (p50 / p90 / p99):")
+        for model, endpoints in report['latency'].items():
+            for endpoint, phases in endpoints.items():
+                parts = [f"{phase} {item['p50_ms']}/{item['p90_ms']}/{item['p99_ms']}ms"
+                         for phase, item in phases.items()]
+                count = max(item['count'] for item in phases.values())
+                print(f"   {model} {endpoint} (n={count}): {'  '.join(parts)}")
+    
+    if report.get('load_test_results'):
+        print(f"\n🔥 压测结果:")
+        for result in report['load_test_results']:
+            latency = result['latency']
+            print(f"\n{result['model']} ({result['mode']}, {result['virtual_users']} 用户)")
+            print(f"   请求数: {result['total_requests']}  成功率: {result['success_rate']}  丢弃: {result['dropped_arrivals']}")
+            print(f"   吞吐: {result['requests_per_second']} req/s")
+            print(f"   延迟: p50 {latency['p50_ms']}ms  p90 {latency['p90_ms']}ms  "
+                  f"p99 {latency['p99_ms']}ms  p999 {latency['p999_ms']}ms")
+            if result['errors_by_status']:
+                print(f"   错误分布: {result['errors_by_status']}")
 
 def main():
     """主函数"""
@@ -389,8 +695,15 @@ def main():
         print("   export NEW_API_KEY='your-api-key'")
         return
     
+    # 设置 NEW_API_EMBEDDING_CACHE=<目录> 时启用嵌入缓存并运行 Embedding 测试
+    embedding_cache = None
+    cache_dir = os.getenv("NEW_API_EMBEDDING_CACHE")
+    if cache_dir:
+        from embedding_cache import EmbeddingCache
+        embedding_cache = EmbeddingCache(cache_dir)
+    
     # 创建测试运行器
-    runner = TestRunner(config)
+    runner = TestRunner(config, embedding_cache=embedding_cache)
     
     # 准备测试数据
     test_params = {
@@ -415,6 +728,9 @@ def main():
     except Exception as e:
         logger.error(f"测试过程中发生异常: {str(e)}")
         print(f"\n❌ 测试失败: {str(e)}")
+    finally:
+        if embedding_cache is not None:
+            embedding_cache.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
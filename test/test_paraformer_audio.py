@@ -23,16 +23,23 @@ Paraformer 语音识别测试脚本
 import asyncio
 import websockets
 import json
-import base64
 import time
 import logging
 import requests
 import io
 
+import audio_signals
+from realtime_frames import AudioFrameEncoder, COMMIT_FRAME
+from realtime_events import RealtimeEventConsumer
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def log_partial(segment):
+    """实时字幕：每收到一个增量就输出当前拼接结果"""
+    logger.info(f"📝 增量转录: {segment.partial_text}")
+
 async def test_audio_transcription():
     """测试音频转录功能"""
     import os
@@ -51,113 +58,64 @@ async def test_audio_transcription():
     async with websockets.connect(ws_url, subprotocols=subprotocols) as websocket:
         logger.info("✅ WebSocket 连接成功")
         
+        consumer = RealtimeEventConsumer(sample_rate=16000, model=model, on_partial=log_partial)
+
         # 等待初始事件
-        session_created = False
-        conversation_created = False
-        
-        while not (session_created and conversation_created):
-            try:
-                message = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                event = json.loads(message)
-                event_type = event.get('type')
-                logger.info(f"收到事件: {event_type}")
-                
-                if event_type == "session.created":
-                    session_created = True
-                elif event_type == "conversation.created":
-                    conversation_created = True
-                elif event_type == "session.updated":
-                    logger.info("会话已更新")
-                    
-            except asyncio.TimeoutError:
-                logger.warning("等待初始事件超时")
-                break
+        try:
+            await asyncio.wait_for(
+                consumer.consume(websocket, lambda event: event.get('type') == "conversation.created"),
+                timeout=5.0
+            )
+        except asyncio.TimeoutError:
+            logger.warning("等待初始事件超时")
+        logger.info(f"收到事件: {', '.join(consumer.event_counts)}")
         
         # 生成测试音频数据（16kHz PCM16，2秒）
         sample_rate = 16000
         duration = 2.0
-        num_samples = int(sample_rate * duration)
         
         # 生成简单的正弦波作为测试音频
-        import math
         frequency = 440  # A4 音符
-        audio_samples = []
-        for i in range(num_samples):
-            sample = int(32767 * 0.5 * math.sin(2 * math.pi * frequency * i / sample_rate))
-            # 转换为 16-bit little-endian
-            audio_samples.append(sample.to_bytes(2, byteorder='little', signed=True))
-        
-        audio_data = b''.join(audio_samples)
-        audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+        audio_data = audio_signals.sine(frequency, duration, sample_rate)
         
         logger.info(f"生成测试音频: {len(audio_data)} 字节, {duration} 秒")
         
-        # 发送音频数据
-        chunk_size = 1024  # 每次发送1KB
-        for i in range(0, len(audio_base64), chunk_size):
-            chunk = audio_base64[i:i+chunk_size]
-            
-            append_event = {
-                "type": "input_audio_buffer.append",
-                "audio": chunk
-            }
-            
-            await websocket.send(json.dumps(append_event))
-            logger.info(f"发送音频块 {i//chunk_size + 1}/{(len(audio_base64) + chunk_size - 1)//chunk_size}")
+        # 发送音频数据：每帧 768 字节 PCM，base64 后为 1KB
+        encoder = AudioFrameEncoder(chunk_bytes=768)
+        total_chunks = (len(audio_data) + encoder.chunk_bytes - 1) // encoder.chunk_bytes
+        for index, (offset, frame) in enumerate(encoder.iter_frames(audio_data), 1):
+            await websocket.send(frame)
+            consumer.mark_audio(offset, min(encoder.chunk_bytes, len(audio_data) - offset))
+            logger.info(f"发送音频块 {index}/{total_chunks}")
             
             # 稍微延迟以模拟实时流
             await asyncio.sleep(0.1)
         
         # 提交音频缓冲区
-        commit_event = {
-            "type": "input_audio_buffer.commit"
-        }
-        
-        await websocket.send(json.dumps(commit_event))
+        await websocket.send(COMMIT_FRAME)
         logger.info("✅ 音频缓冲区已提交")
         
         # 等待转录结果
         logger.info("等待转录结果...")
-        timeout_count = 0
-        max_timeout = 10  # 最多等待10秒
-        
-        while timeout_count < max_timeout:
-            try:
-                message = await asyncio.wait_for(websocket.recv(), timeout=1.0)
-                event = json.loads(message)
-                event_type = event.get('type')
-                
-                logger.info(f"收到事件: {event_type}")
-                
-                if event_type == "conversation.item.input_audio_transcription.completed":
-                    transcript = event.get('transcript', '')
-                    logger.info(f"🎉 转录完成: {transcript}")
-                    break
-                elif event_type == "conversation.item.input_audio_transcription.failed":
-                    error = event.get('error', {})
-                    logger.error(f"❌ 转录失败: {error}")
-                    break
-                elif event_type == "input_audio_buffer.committed":
-                    logger.info("✅ 音频缓冲区提交确认")
-                elif event_type == "conversation.item.created":
-                    logger.info("✅ 对话项目已创建")
-                elif event_type == "conversation.item.updated":
-                    logger.info("✅ 对话项目已更新")
-                    # 检查是否包含转录结果
-                    item = event.get('item', {})
-                    content = item.get('content', [])
-                    for part in content:
-                        if part.get('type') == 'text':
-                            transcript = part.get('text', '')
-                            logger.info(f"🎉 从更新事件获取转录: {transcript}")
-                            return
-                
-            except asyncio.TimeoutError:
-                timeout_count += 1
-                logger.info(f"等待中... ({timeout_count}/{max_timeout})")
-        
-        if timeout_count >= max_timeout:
+        try:
+            segments = await asyncio.wait_for(consumer.wait_final(websocket), timeout=10.0)
+        except asyncio.TimeoutError:
             logger.warning("⏰ 等待转录结果超时")
+            return
+        except RuntimeError as e:
+            logger.error(f"❌ 转录失败: {e}")
+            return
+        
+        for segment in segments:
+            if segment.error is not None:
+                logger.error(f"❌ 转录失败: {segment.error}")
+                continue
+            timings = segment.to_dict()
+            logger.info(f"🎉 转录完成: {segment.text}")
+            logger.info(f"⏱️ 首个增量结果 {timings['time_to_first_partial_ms']}ms，"
+                        f"最终结果 {timings['time_to_final_ms']}ms"
+                        f"（相对音频 {segment.audio_end:.2f}s 处的发送时刻）")
+        logger.info(f"事件统计: {consumer.event_counts}")
 
 def test_http_transcription():
     """
@@ -179,45 +137,14 @@ def test_http_transcription():
     # 生成测试音频数据（16kHz PCM16，2秒）
     sample_rate = 16000
     duration = 2.0
-    num_samples = int(sample_rate * duration)
     
     # 生成简单的正弦波作为测试音频
-    import math
     frequency = 440  # A4 音符
-    audio_samples = []
-    for i in range(num_samples):
-        sample = int(32767 * 0.5 * math.sin(2 * math.pi * frequency * i / sample_rate))
-        # 转换为 16-bit little-endian
-        audio_samples.append(sample.to_bytes(2, byteorder='little', signed=True))
-    
-    audio_data = b''.join(audio_samples)
+    audio_data = audio_signals.sine(frequency, duration, sample_rate)
     logger.info(f"生成测试音频: {len(audio_data)} 字节, {duration} 秒")
     
-    # 创建 WAV 文件头
-    def create_wav_header(sample_rate, num_channels, bits_per_sample, data_size):
-        """创建 WAV 文件头"""
-        byte_rate = sample_rate * num_channels * bits_per_sample // 8
-        block_align = num_channels * bits_per_sample // 8
-        
-        header = b'RIFF'
-        header += (36 + data_size).to_bytes(4, byteorder='little')
-        header += b'WAVE'
-        header += b'fmt '
-        header += (16).to_bytes(4, byteorder='little')  # fmt chunk size
-        header += (1).to_bytes(2, byteorder='little')   # audio format (PCM)
-        header += num_channels.to_bytes(2, byteorder='little')
-        header += sample_rate.to_bytes(4, byteorder='little')
-        header += byte_rate.to_bytes(4, byteorder='little')
-        header += block_align.to_bytes(2, byteorder='little')
-        header += bits_per_sample.to_bytes(2, byteorder='little')
-        header += b'data'
-        header += data_size.to_bytes(4, byteorder='little')
-        
-        return header
-    
     # 创建完整的 WAV 文件
-    wav_header = create_wav_header(sample_rate, 1, 16, len(audio_data))
-    wav_data = wav_header + audio_data
+    wav_data = audio_signals.to_wav(audio_data, sample_rate)
     
     # 准备 HTTP 请求
     url = f"{base_url}/v1/audio/transcriptions"
@@ -258,16 +185,16 @@ def test_http_transcription():
             headers['Content-Type'] = multipart_data.content_type
             logger.info(f"使用 requests_toolbelt，Content-Type: {multipart_data.content_type}")
             
-            start_time = time.time()
+            start_time = time.perf_counter()
             response = requests.post(url, headers=headers, data=multipart_data, timeout=30)
-            end_time = time.time()
+            end_time = time.perf_counter()
             
         except ImportError:
             logger.info("requests_toolbelt 未安装，使用标准 requests")
             # 回退到标准 requests 方法
-            start_time = time.time()
+            start_time = time.perf_counter()
             response = requests.post(url, headers=headers, files=files, data=data, timeout=30)
-            end_time = time.time()
+            end_time = time.perf_counter()
         
         logger.info(f"请求完成，耗时: {end_time - start_time:.2f} 秒")
         logger.info(f"响应状态码: {response.status_code}")
@@ -11,9 +11,14 @@ import time
 import requests
 from typing import Dict, Any, Optional
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from pathlib import Path
 
+from rate_limit import TokenBucket, parse_retry_after
+from latency_metrics import MetricsRecorder, now_ns, ns_to_seconds
+from metrics_exporter import GATEWAY_METRICS
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -54,6 +59,15 @@ class WanxModelTester:
         # 确保输出目录存在
         self.output_dir = Path("test_outputs")
         self.output_dir.mkdir(exist_ok=True)
+        self.downloader = None  # 首次需要下载图像时创建
+        self.metrics = MetricsRecorder()  # 按 (模型, 接口, 阶段) 记录的延迟直方图
+    
+    def _get_downloader(self):
+        """图像下载器（下载到 test_outputs/images，按内容去重）"""
+        if self.downloader is None:
+            from image_downloader import ImageDownloader
+            self.downloader = ImageDownloader(self.output_dir / "images", timeout=self.config.timeout)
+        return self.downloader
     
     def test_model_availability(self) -> bool:
         """测试模型是否可用"""
@@ -83,8 +97,9 @@ class WanxModelTester:
             logger.error(f"❌ 测试模型可用性失败: {str(e)}")
             return False
     
-    def test_image_generation(self, prompt: str, model: str = "wanx2.1-t2i-turbo") -> Dict[str, Any]:
-        """测试图像生成功能"""
+    def test_image_generation(self, prompt: str, model: str = "wanx2.1-t2i-turbo", save_result: bool = True,
+                              download: bool = False) -> Dict[str, Any]:
+        """测试图像生成功能，download=True 时继续下载生成的图像并统计端到端耗时"""
         logger.info(f"🎨 开始测试图像生成 - 模型: {model}")
         logger.info(f"📝 提示词: {prompt}")
         
@@ -100,19 +115,31 @@ class WanxModelTester:
                 "response_format": "url"
             }
             
-            start_time = time.time()
-            response = self.session.post(
-                url, 
-                json=payload, 
-                timeout=self.config.timeout
-            )
-            end_time = time.time()
-            
-            response_time = end_time - start_time
+            # 单调时钟分阶段计时：响应头到达为首字节，随后读完响应体（requests 无法单独测量连接耗时，不记录 connect）
+            endpoint = "/v1/images/generations"
+            timer = self.metrics.timer(model, endpoint)
+            GATEWAY_METRICS.request_started(model, endpoint)
+            status, sent, received = 'error', 0, 0
+            try:
+                response = self.session.post(
+                    url, 
+                    json=payload, 
+                    timeout=self.config.timeout,
+                    stream=True
+                )
+                timer.first_byte()
+                status, sent, received = str(response.status_code), len(response.request.body or b''), len(response.content)
+                response_time = timer.finish()
+            except requests.exceptions.Timeout:
+                status = 'timeout'
+                raise
+            finally:
+                GATEWAY_METRICS.request_finished(model, endpoint, status, ns_to_seconds(now_ns() - timer.start_ns),
+                                                 sent, received)
             
             result = {
                 "success": False,
-                "response_time": response_time,
+                "response_time": round(response_time, 4),
                 "status_code": response.status_code,
                 "model": model,
                 "prompt": prompt
@@ -120,6 +147,8 @@ class WanxModelTester:
             
             if response.status_code == 200:
                 data = response.json()
+                # 成功生成单独记一个阶段，批量汇总的生成延迟不混入 429 和失败请求
+                self.metrics.record_ns(model, endpoint, 'generation', timer.end_ns - timer.start_ns)
                 result.update({
                     "success": True,
                     "response_data": data,
@@ -134,13 +163,25 @@ class WanxModelTester:
                 if result['revised_prompt']:
                     logger.info(f"📝 优化后提示词: {result['revised_prompt']}")
                 
-                # 保存结果
-                self._save_test_result(result)
+                if download and result['image_urls']:
+                    downloads = self._get_downloader().download_all(result['image_urls'])
+                    result.update({
+                        "downloads": downloads,
+                        "download_time": downloads['wall_time'],
+                        "end_to_end_time": round(response_time + downloads['wall_time'], 3)
+                    })
+                    logger.info(f"📥 下载耗时: {downloads['wall_time']:.2f}秒，端到端: {result['end_to_end_time']:.2f}秒")
+                
+                # 保存结果（批量模式下由最终报告统一保存）
+                if save_result:
+                    self._save_test_result(result)
                 
             else:
                 result.update({
                     "error": response.text,
-                    "headers": dict(response.headers)
+                    "headers": dict(response.headers),
+                    # 直接从大小写不敏感的响应头读取，dict() 之后字段名大小写取决于服务端
+                    "retry_after": response.headers.get('Retry-After')
                 })
                 logger.error(f"❌ 图像生成失败: {response.status_code}")
                 logger.error(f"📄 错误信息: {response.text}")
@@ -156,35 +197,93 @@ class WanxModelTester:
                 "prompt": prompt
             }
     
-    def test_multiple_prompts(self, prompts: list, model: str = "wanx2.1-t2i-turbo") -> Dict[str, Any]:
-        """测试多个提示词"""
-        logger.info(f"🔄 开始批量测试 - 共 {len(prompts)} 个提示词")
+    def _generate_scheduled(self, index: int, total: int, prompt: str, model: str,
+                            bucket: TokenBucket, max_retries: int, download: bool = False) -> Dict[str, Any]:
+        """按令牌桶排队后生成图像，429 时通知限速器并重新排队"""
+        queue_wait = 0.0
+        for attempt in range(max_retries + 1):
+            queue_wait += bucket.acquire()
+            logger.info(f"\n--- 测试 {index}/{total}（第 {attempt + 1} 次请求）---")
+            result = self.test_image_generation(prompt, model, save_result=False, download=download)
+            if result.get('status_code') != 429:
+                if result.get('success'):
+                    bucket.on_success()
+                break
+            bucket.on_throttled(parse_retry_after(result.get('retry_after')))
         
-        results = []
-        successful_tests = 0
+        result.update({
+            "queue_wait": round(queue_wait, 3),
+            "generation_time": round(result.get('response_time', 0.0), 3),
+            "attempts": attempt + 1
+        })
+        return result
+    
+    def test_multiple_prompts(self, prompts: list, model: str = "wanx2.1-t2i-turbo", concurrency: int = 1,
+                              rate: float = 1.0, burst: Optional[float] = None, max_retries: int = 3,
+                              download: bool = False) -> Dict[str, Any]:
+        """
+        测试多个提示词
+        请求由令牌桶调度：rate 为每秒请求数，concurrency 为同时在途的请求数。
+        默认 concurrency=1、rate=1.0 与逐条请求、间隔 1 秒的行为一致。
+        收到 429 时按 Retry-After 暂停并降低速率，排队等待时间与生成时间分开统计。
+        download=True 时每张图生成后立即下载，统计下载耗时和端到端耗时。
+        """
+        logger.info(f"🔄 开始批量测试 - 共 {len(prompts)} 个提示词，并发 {concurrency}，限速 {rate} 请求/秒")
         
-        for i, prompt in enumerate(prompts, 1):
-            logger.info(f"\n--- 测试 {i}/{len(prompts)} ---")
-            result = self.test_image_generation(prompt, model)
-            results.append(result)
-            
-            if result.get('success'):
-                successful_tests += 1
-            
-            # 避免请求过于频繁
-            time.sleep(1)
+        bucket = TokenBucket(rate, burst=burst if burst is not None else min(max(1.0, rate), concurrency))
+        if concurrency > requests.adapters.DEFAULT_POOLSIZE:
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+        
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            futures = [
+                executor.submit(self._generate_scheduled, i, len(prompts), prompt, model, bucket, max_retries, download)
+                for i, prompt in enumerate(prompts, 1)
+            ]
+            results = [future.result() for future in futures]
+        wall_time = time.perf_counter() - start_time
+        # 成功生成的全精度耗时直方图，SLO 按 p99 而不是平均值评估
+        latency = self.metrics.histogram(model, "/v1/images/generations", "generation")
         
+        successful_tests = sum(1 for r in results if r.get('success'))
         summary = {
             "total_tests": len(prompts),
             "successful_tests": successful_tests,
             "failed_tests": len(prompts) - successful_tests,
-            "success_rate": (successful_tests / len(prompts)) * 100,
+            "success_rate": (successful_tests / len(prompts)) * 100 if prompts else 0.0,
+            "concurrency": concurrency,
+            "wall_time": round(wall_time, 2),
+            "throughput": round(len(prompts) / wall_time, 3) if wall_time > 0 else 0.0,
+            "average_queue_wait": round(sum(r.get('queue_wait', 0.0) for r in results) / len(results), 3) if results else 0.0,
+            "average_generation_time": self._calculate_average_response_time(results),
+            "generation_latency": latency.summary(),
+            "throttled_requests": bucket.throttled,
+            "rate_limiter": bucket.stats(),
+            "latency_histograms": self.metrics.to_dict(),
             "results": results
         }
+        downloaded = [r for r in results if 'download_time' in r]
+        if downloaded:
+            summary.update({
+                "downloaded_images": sum(r['downloads']['downloaded'] for r in downloaded),
+                "average_download_time": round(sum(r['download_time'] for r in downloaded) / len(downloaded), 3),
+                "average_end_to_end_time": round(sum(r['end_to_end_time'] for r in downloaded) / len(downloaded), 3)
+            })
         
         logger.info(f"\n📊 批量测试完成:")
         logger.info(f"✅ 成功: {successful_tests}/{len(prompts)} ({summary['success_rate']:.1f}%)")
         logger.info(f"❌ 失败: {summary['failed_tests']}/{len(prompts)}")
+        logger.info(f"⏱️  总耗时: {summary['wall_time']}秒，吞吐 {summary['throughput']} 张/秒")
+        logger.info(f"⏳ 平均排队: {summary['average_queue_wait']}秒，平均生成: {summary['average_generation_time']:.2f}秒，"
+                    f"限流 {summary['throttled_requests']} 次")
+        generation_latency = summary['generation_latency']
+        logger.info(f"📈 生成延迟: p50 {generation_latency['p50_ms']}ms，p90 {generation_latency['p90_ms']}ms，"
+                    f"p99 {generation_latency['p99_ms']}ms")
+        if downloaded:
+            logger.info(f"📥 下载 {summary['downloaded_images']} 张，平均下载: {summary['average_download_time']}秒，"
+                        f"平均端到端: {summary['average_end_to_end_time']}秒")
         
         return summary
     
@@ -201,7 +300,7 @@ class WanxModelTester:
         except Exception as e:
             logger.error(f"❌ 保存测试结果失败: {str(e)}")
     
-    def run_comprehensive_test(self) -> Dict[str, Any]:
+    def run_comprehensive_test(self, concurrency: int = 1, rate: float = 1.0, download: bool = False) -> Dict[str, Any]:
         """运行综合测试"""
         logger.info("🚀 开始 wanx2.1-t2i-turbo 模型综合测试")
         logger.info("=" * 60)
@@ -222,7 +321,7 @@ class WanxModelTester:
         
         # 3. 执行图像生成测试
         logger.info(f"\n2️⃣ 开始图像生成测试...")
-        test_results = self.test_multiple_prompts(test_prompts)
+        test_results = self.test_multiple_prompts(test_prompts, concurrency=concurrency, rate=rate, download=download)
         
         # 4. 生成最终报告
         final_report = {
@@ -231,13 +330,19 @@ class WanxModelTester:
             "config": {
                 "base_url": self.config.base_url,
                 "model": "wanx2.1-t2i-turbo",
-                "timeout": self.config.timeout
+                "timeout": self.config.timeout,
+                "concurrency": concurrency,
+                "rate": rate
             },
             "results": test_results,
             "summary": {
                 "total_prompts": len(test_prompts),
                 "success_rate": test_results.get('success_rate', 0),
-                "average_response_time": self._calculate_average_response_time(test_results.get('results', []))
+                "average_response_time": self._calculate_average_response_time(test_results.get('results', [])),
+                "response_time_percentiles": test_results.get('generation_latency'),
+                "average_queue_wait": test_results.get('average_queue_wait', 0.0),
+                "throttled_requests": test_results.get('throttled_requests', 0),
+                "average_end_to_end_time": test_results.get('average_end_to_end_time')
             }
         }
         
@@ -293,14 +398,22 @@ def main():
     tester = WanxModelTester(config)
     
     try:
-        # 运行综合测试
-        report = tester.run_comprehensive_test()
+        # 运行综合测试（WANX_CONCURRENCY / WANX_RATE 控制并发数和每秒请求数，WANX_DOWNLOAD=1 下载生成的图像）
+        report = tester.run_comprehensive_test(
+            concurrency=int(os.getenv("WANX_CONCURRENCY", "1")),
+            rate=float(os.getenv("WANX_RATE", "1.0")),
+            download=os.getenv("WANX_DOWNLOAD") == "1"
+        )
         
         # 显示结果摘要
         print("\n" + "=" * 60)
         print("📊 测试结果摘要:")
         print(f"✅ 成功率: {report['summary']['success_rate']:.1f}%")
         print(f"⏱️  平均响应时间: {report['summary']['average_response_time']:.2f}秒")
+        print(f"⏳ 平均排队时间: {report['summary']['average_queue_wait']:.2f}秒")
+        print(f"🚦 限流次数: {report['summary']['throttled_requests']}")
+        if report['summary']['average_end_to_end_time'] is not None:
+            print(f"📥 平均端到端时间（生成 + 下载）: {report['summary']['average_end_to_end_time']:.2f}秒")
         print(f"📝 总测试数: {report['summary']['total_prompts']}")
         print("=" * 60)
         
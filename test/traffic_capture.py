@@ -0,0 +1,679 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流量录制与回放
+录制格式：只追加的压缩日志，每批记录是一个独立的 gzip member，member 内每行一条 JSON：
+    {"kind": "meta",     "ts": ..., "version": 1, "pid": ...}
+    {"kind": "http",     "ts": ..., "method": ..., "endpoint": ..., "model": ..., "json"/"data"/"files"/"params": ...,
+                         "status": ..., "response_time": ..., "response_bytes": ...}
+    {"kind": "ws_open",  "ts": ..., "session": ..., "model": ...}
+    {"kind": "ws_frame", "ts": ..., "session": ..., "dir": "send" | "recv", "data": ...}
+    {"kind": "ws_close", "ts": ..., "session": ...}
+- ts 为墙钟时间（秒），由录制开始时的墙钟加单调时钟偏移得到，多次录制追加到同一文件也能排序
+- 多个 gzip member 直接拼接仍是合法的 gzip 文件；进程中断只会损坏最后一个 member，读取时丢弃即可
+- 不记录 Authorization 等请求头，回放时使用 APIConfig 中的密钥
+
+录制：设置 NEW_API_CAPTURE=<路径> 后，NewAPIClient、AsyncNewAPIClient 的 HTTP 请求
+和 realtime_load.py 的实时会话帧都会写入该文件。
+
+回放：按录制时的时间间隔（1 倍、N 倍或不限速）重新发出请求和实时会话帧，
+HTTP 通过 AsyncNewAPIClient、实时会话通过 /v1/realtime 子协议认证发送，
+输出与 TestRunner 相同格式的报告，并附上录制时与回放时的延迟对比。
+录制文件边读边回放，HTTP 在途请求数有上限，不会整体载入内存。
+
+用法：
+    NEW_API_CAPTURE=test_outputs/capture.jsonl.gz python3 load_runner.py --model text-embedding-v4 --duration 60
+    python3 traffic_capture.py info test_outputs/capture.jsonl.gz
+    python3 traffic_capture.py replay test_outputs/capture.jsonl.gz --speed 2
+"""
+
+import os
+import sys
+import json
+import time
+import gzip
+import heapq
+import uuid
+import zlib
+import base64
+import atexit
+import asyncio
+import argparse
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from latency_metrics import now_ns, percentile, request_model
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_VERSION = 1
+CAPTURE_ENV = "NEW_API_CAPTURE"
+
+def _encode_content(content) -> Optional[Dict[str, Any]]:
+    """请求体内容转为可序列化的形式；文件对象、生成器等无法录制的内容返回 None"""
+    if isinstance(content, str):
+        return {'text': content}
+    if hasattr(content, 'getbuffer'):
+        # BytesIO / 映射文件对象：整块内容可直接取得
+        content = content.getbuffer()
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        return {'b64': base64.b64encode(content).decode('ascii')}
+    return None
+
+def _decode_content(content: Dict[str, Any]):
+    return content['text'] if 'text' in content else base64.b64decode(content['b64'])
+
+class TrafficRecorder:
+    """线程安全的流量录制器，按批写入 gzip member"""
+
+    def __init__(self, path: str, batch_size: int = 256, flush_interval: float = 1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._epoch = time.time()
+        self._base_ns = now_ns()
+        self._lock = threading.Lock()
+        self._pending: List[bytes] = []
+        self._last_flush = time.monotonic()
+        self._file = None
+        self.records = 0
+        self._append({'kind': 'meta', 'ts': self.timestamp(), 'version': CAPTURE_VERSION, 'pid': os.getpid()})
+
+    def timestamp(self, ns: Optional[int] = None) -> float:
+        """单调时钟读数转换为墙钟时间（秒）"""
+        return round(self._epoch + ((ns if ns is not None else now_ns()) - self._base_ns) / 1e9, 6)
+
+    # ---- HTTP ----
+
+    def describe_request(self, method: str, endpoint: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """在请求参数被修改前提取可回放的部分（不含请求头）"""
+        record: Dict[str, Any] = {'kind': 'http', 'method': method, 'endpoint': endpoint,
+                                  'model': request_model(kwargs)}
+        if kwargs.get('params'):
+            record['params'] = dict(kwargs['params'])
+        if kwargs.get('json') is not None:
+            record['json'] = kwargs['json']
+        data = kwargs.get('data')
+        files = kwargs.get('files')
+        if isinstance(getattr(data, 'fields', None), dict):
+            # 流式 multipart 编码器按表单字段录制，回放时以 files= 发出
+            files = {name: value if isinstance(value, tuple) else (None, value)
+                     for name, value in data.fields.items()}
+        elif isinstance(data, dict):
+            record['data'] = {name: str(value) for name, value in data.items()}
+        elif data is not None:
+            record['body'] = _encode_content(data)
+        if files:
+            parts = []
+            for name, value in files.items():
+                if not isinstance(value, tuple):
+                    value = (None, value)
+                filename, content = value[0], value[1]
+                parts.append({'name': name, 'filename': filename,
+                              'content': _encode_content(content) if filename is not None else {'text': str(content)},
+                              'content_type': value[2] if len(value) > 2 else None})
+            record['files'] = parts
+        return record
+
+    def record_http(self, request: Dict[str, Any], start_ns: int, status: str,
+                    response_time: float, response_bytes: int = 0):
+        record = dict(request)
+        record.update(ts=self.timestamp(start_ns), status=status,
+                      response_time=round(response_time, 6), response_bytes=response_bytes)
+        self._append(record)
+
+    # ---- WebSocket ----
+
+    def open_session(self, model: str) -> str:
+        session_id = uuid.uuid4().hex[:16]
+        self._append({'kind': 'ws_open', 'ts': self.timestamp(), 'session': session_id, 'model': model})
+        return session_id
+
+    def record_frame(self, session_id: str, direction: str, data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            payload = {'b64': base64.b64encode(data).decode('ascii')}
+        else:
+            payload = {'data': data}
+        self._append({'kind': 'ws_frame', 'ts': self.timestamp(), 'session': session_id, 'dir': direction, **payload})
+
+    def close_session(self, session_id: str):
+        self._append({'kind': 'ws_close', 'ts': self.timestamp(), 'session': session_id})
+
+    def wrap_websocket(self, websocket, model: str) -> "CapturedWebSocket":
+        return CapturedWebSocket(websocket, self, model)
+
+    # ---- 写入 ----
+
+    def _append(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        with self._lock:
+            self._pending.append(line)
+            self.records += 1
+            if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, 'ab')
+        # 每批一个完整的 gzip member，写完即刷盘
+        self._file.write(gzip.compress(b''.join(self._pending), compresslevel=6, mtime=0))
+        self._file.flush()
+        self._pending.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class CapturedWebSocket:
+    """录制收发帧的 WebSocket 包装，其余属性透传给原连接"""
+
+    def __init__(self, websocket, recorder: TrafficRecorder, model: str):
+        self._websocket = websocket
+        self._recorder = recorder
+        self._session_id = recorder.open_session(model)
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._websocket, name)
+
+    async def send(self, message):
+        self._recorder.record_frame(self._session_id, 'send', message)
+        await self._websocket.send(message)
+
+    async def recv(self):
+        message = await self._websocket.recv()
+        self._recorder.record_frame(self._session_id, 'recv', message)
+        return message
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        async for message in self._websocket:
+            self._recorder.record_frame(self._session_id, 'recv', message)
+            yield message
+
+    def _mark_closed(self):
+        if not self._closed:
+            self._closed = True
+            self._recorder.close_session(self._session_id)
+
+    async def close(self, *args, **kwargs):
+        self._mark_closed()
+        await self._websocket.close(*args, **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._mark_closed()
+        await self._websocket.close()
+
+_ENV_RECORDER: Optional[TrafficRecorder] = None
+_ENV_LOCK = threading.Lock()
+
+def capture_from_env() -> Optional[TrafficRecorder]:
+    """NEW_API_CAPTURE 设置时返回进程内共享的录制器，进程退出时自动刷盘"""
+    global _ENV_RECORDER
+    path = os.getenv(CAPTURE_ENV)
+    if not path:
+        return None
+    with _ENV_LOCK:
+        if _ENV_RECORDER is None:
+            _ENV_RECORDER = TrafficRecorder(path)
+            atexit.register(_ENV_RECORDER.close)
+            logger.info(f"📼 流量录制已开启: {path}")
+        return _ENV_RECORDER
+
+# ---- 读取 ----
+
+def iter_records(path: str, chunk_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """逐条读取录制记录；末尾不完整的 member（录制进程被中断）会被丢弃"""
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    buffer = bytearray()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            while data:
+                try:
+                    buffer += decompressor.decompress(data)
+                except zlib.error as e:
+                    logger.warning(f"⚠️ 录制文件损坏，停止读取: {e}")
+                    return
+                if not decompressor.eof:
+                    break
+                # 一个 member 结束，member 内都是完整的行
+                for line in bytes(buffer).splitlines():
+                    if line:
+                        yield json.loads(line)
+                buffer.clear()
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    if buffer:
+        logger.warning("⚠️ 录制文件末尾的 member 不完整，已丢弃")
+
+def summarize_capture(path: str) -> Dict[str, Any]:
+    """逐条扫描录制文件统计概况，不保留请求体和帧内容"""
+    models: Dict[str, int] = {}
+    counts = {'http': 0, 'ws_open': 0, 'frames_sent': 0}
+    start = end = None
+    for record in iter_records(path):
+        kind = record.get('kind')
+        ts = record.get('ts', 0.0)
+        start = ts if start is None else min(start, ts)
+        end = ts if end is None else max(end, ts)
+        if kind == 'http':
+            key = f"{record.get('model') or 'unknown'} {record['endpoint']}"
+        elif kind == 'ws_open':
+            key = f"{record['model']} /v1/realtime"
+        else:
+            if kind == 'ws_frame' and record['dir'] == 'send':
+                counts['frames_sent'] += 1
+            continue
+        counts[kind] += 1
+        models[key] = models.get(key, 0) + 1
+    return {
+        'http_requests': counts['http'],
+        'realtime_sessions': counts['ws_open'],
+        'frames_sent': counts['frames_sent'],
+        'duration': round((end or 0.0) - (start or 0.0), 3),
+        'by_model': models,
+    }
+
+# ---- 回放 ----
+
+def _request_kwargs(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """录制记录还原为 requests 风格参数；含无法录制的内容时返回 None"""
+    kwargs: Dict[str, Any] = {}
+    if 'params' in record:
+        kwargs['params'] = record['params']
+    if 'json' in record:
+        kwargs['json'] = record['json']
+    if 'data' in record:
+        kwargs['data'] = record['data']
+    if 'body' in record:
+        if record['body'] is None:
+            return None
+        kwargs['data'] = _decode_content(record['body'])
+    if 'files' in record:
+        files = {}
+        for part in record['files']:
+            if part['content'] is None:
+                return None
+            content = _decode_content(part['content'])
+            files[part['name']] = ((part['filename'], content, part['content_type']) if part['content_type']
+                                   else (part['filename'], content))
+        kwargs['files'] = files
+    return kwargs
+
+def _audio_size(frame, loads) -> int:
+    """append 帧中 PCM 的字节数，其他帧（包括二进制帧）返回 0"""
+    if not isinstance(frame, str) or '"input_audio_buffer.append"' not in frame:
+        return 0
+    audio = loads(frame).get('audio', '')
+    return len(audio) // 4 * 3 - audio[-2:].count('=')
+
+def _is_commit(frame) -> bool:
+    return isinstance(frame, str) and '"input_audio_buffer.commit"' in frame
+
+def _completed_at(record: Dict[str, Any]) -> float:
+    """记录写入文件的时刻：HTTP 记录在响应结束后才写入，其余记录即时写入"""
+    ts = record.get('ts', 0.0)
+    if record.get('kind') == 'http':
+        return ts + (record.get('response_time') or 0.0)
+    return ts
+
+@dataclass
+class CapturedSession:
+    """回放中的一路实时会话：读取循环按时间推入发送帧，会话协程取出发送"""
+    session_id: str
+    model: str
+    ts: float
+    frames: asyncio.Queue = field(default_factory=asyncio.Queue)   # (相对会话开始的秒数, 帧)，None 表示结束
+    duration: float = 0.0
+    done: bool = False
+
+class TrafficReplayer:
+    """
+    按录制时间线重新发出 HTTP 请求和实时会话帧
+    录制文件边读边回放：记录先进入按 ts 排序的堆，读取位置越过 reorder_window 后才调度
+    （HTTP 记录在响应结束后才写入，文件中的顺序与开始时间不完全一致），读取只领先回放时间线
+    lookahead 秒，HTTP 在途请求数不超过 max_in_flight
+    """
+
+    def __init__(self, config, speed: float = 1.0, pool=None, transcript_timeout: float = 30.0,
+                 sample_rate: int = 8000, max_in_flight: int = 256, lookahead: float = 1.0,
+                 reorder_window: float = 30.0):
+        from async_client import PoolConfig
+        from test_new_api_models import TestRunner
+
+        self.config = config
+        self.speed = speed
+        self.pool = pool or PoolConfig(max_connections=64, max_concurrency=64)
+        self.transcript_timeout = transcript_timeout
+        self.sample_rate = sample_rate
+        self.max_in_flight = max_in_flight
+        self.lookahead = lookahead
+        self.reorder_window = reorder_window
+        self.runner = TestRunner(config)
+        self.metrics = self.runner.client.metrics
+        self.schedule_lag: List[float] = []
+        self.captured_start: Optional[float] = None
+        self.captured_end: Optional[float] = None
+
+    def _delay(self, offset: float) -> float:
+        return offset / self.speed if self.speed > 0 else 0.0
+
+    async def _wait_until(self, start: float, offset: float) -> float:
+        """等到计划时间，返回实际滞后（秒）"""
+        loop = asyncio.get_running_loop()
+        delay = start + self._delay(offset) - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+            return 0.0
+        return -delay
+
+    async def _replay_http(self, client, record: Dict[str, Any], start: float, offset: float) -> Dict[str, Any]:
+        result = {'kind': 'http', 'model': record.get('model') or 'unknown', 'endpoint': record['endpoint'],
+                  'captured_status': record.get('status'), 'captured_response_time': record.get('response_time')}
+        kwargs = _request_kwargs(record)
+        if kwargs is None:
+            result.update(success=False, skipped=True, error="录制中缺少请求体内容，无法回放")
+            return result
+        self.schedule_lag.append(await self._wait_until(start, offset))
+        start_time = time.perf_counter()
+        try:
+            response = await client.request(record['method'], record['endpoint'], **kwargs)
+        except Exception as e:
+            result.update(success=False, response_time=round(time.perf_counter() - start_time, 4),
+                          error=f"{type(e).__name__}: {e}")
+            return result
+        # elapsed 不含等待并发许可的时间，不限速回放时才能与录制值对比
+        result.update(success=response.status_code == 200, status_code=response.status_code,
+                      response_time=round(response.elapsed, 4))
+        if response.status_code != 200:
+            result['error'] = response.text[:200]
+        return result
+
+    async def _replay_session(self, session: CapturedSession, start: float, offset: float) -> Dict[str, Any]:
+        from realtime_client import connect_realtime
+        from realtime_codec import DEFAULT_CODEC
+        from realtime_events import RealtimeEventConsumer, REALTIME_ENDPOINT
+
+        result: Dict[str, Any] = {'kind': 'ws', 'model': session.model, 'endpoint': REALTIME_ENDPOINT,
+                                  'frames_sent': 0, 'success': False}
+        self.schedule_lag.append(await self._wait_until(start, offset))
+        consumer = RealtimeEventConsumer(self.sample_rate, model=session.model, recorder=self.metrics)
+        commits = 0
+        audio_offset = 0
+        loop = asyncio.get_running_loop()
+        start_time = time.perf_counter()
+        receiver = None
+        try:
+            websocket = await asyncio.wait_for(
+                connect_realtime(self.config.base_url, self.config.api_key, session.model),
+                timeout=self.config.timeout
+            )
+            async with websocket:
+                receiver = asyncio.ensure_future(consumer.consume(websocket))
+                session_start = loop.time()
+                while True:
+                    item = await session.frames.get()
+                    if item is None:
+                        break
+                    frame_offset, frame = item
+                    await self._wait_until(session_start, frame_offset)
+                    await websocket.send(frame)
+                    result['frames_sent'] += 1
+                    size = _audio_size(frame, DEFAULT_CODEC.loads)
+                    if size:
+                        consumer.mark_audio(audio_offset, size)
+                        audio_offset += size
+                    elif _is_commit(frame):
+                        commits += 1
+                if commits:
+                    deadline = loop.time() + self.transcript_timeout
+                    while len(consumer.finished_segments()) < commits and not receiver.done():
+                        if loop.time() >= deadline:
+                            raise asyncio.TimeoutError()
+                        await asyncio.sleep(0.01)
+        except asyncio.TimeoutError:
+            result['error'] = "timeout"
+        except Exception as e:
+            result['error'] = f"{type(e).__name__}: {e}"
+        finally:
+            session.done = True
+            if receiver is not None:
+                receiver.cancel()
+        segments = consumer.finished_segments()
+        result['response_time'] = round(time.perf_counter() - start_time, 4)
+        result['transcripts'] = [s.to_dict() for s in segments]
+        if 'error' not in result:
+            result['success'] = not consumer.errors and len(segments) >= commits
+            if consumer.errors:
+                result['error'] = str(consumer.errors[0])
+        return result
+
+    async def areplay(self, path: str) -> List[Dict[str, Any]]:
+        from async_client import AsyncNewAPIClient
+
+        loop = asyncio.get_running_loop()
+        results: List[Dict[str, Any]] = []
+        sessions: Dict[str, CapturedSession] = {}
+        replayed: List[Tuple[CapturedSession, Dict[str, Any]]] = []
+        tasks: set = set()
+        slots = asyncio.Semaphore(self.max_in_flight)
+        pending: List[Tuple[float, int, Dict[str, Any]]] = []   # 按 ts 排序的堆
+        origin: Optional[float] = None
+
+        async with AsyncNewAPIClient(self.config, self.pool, metrics=self.metrics) as client:
+            start = loop.time()
+
+            async def run_http(record: Dict[str, Any], offset: float):
+                try:
+                    results.append(await self._replay_http(client, record, start, offset))
+                finally:
+                    slots.release()
+
+            async def run_session(session: CapturedSession, offset: float):
+                result = await self._replay_session(session, start, offset)
+                replayed.append((session, result))
+                results.append(result)
+
+            def spawn(coro):
+                task = loop.create_task(coro)
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            async def dispatch(record: Dict[str, Any]):
+                nonlocal origin
+                if origin is None:
+                    origin = self.captured_start
+                offset = record['ts'] - origin
+                # 读取只领先回放时间线 lookahead 秒，待发送的内容不会在内存中堆积
+                lead = start + self._delay(offset) - self.lookahead - loop.time()
+                if lead > 0:
+                    await asyncio.sleep(lead)
+                kind = record['kind']
+                if kind == 'http':
+                    await slots.acquire()
+                    spawn(run_http(record, offset))
+                elif kind == 'ws_open':
+                    session = sessions[record['session']] = CapturedSession(record['session'], record['model'], record['ts'])
+                    spawn(run_session(session, offset))
+                else:
+                    session = sessions.get(record['session'])
+                    if session is None:
+                        return
+                    session.duration = record['ts'] - session.ts
+                    if kind == 'ws_close':
+                        del sessions[record['session']]
+                        session.frames.put_nowait(None)
+                    elif record['dir'] == 'send' and not session.done:
+                        data = record['data'] if 'data' in record else base64.b64decode(record['b64'])
+                        session.frames.put_nowait((session.duration, data))
+
+            horizon = float('-inf')
+            sequence = 0
+            for record in iter_records(path):
+                ts = record.get('ts', 0.0)
+                self.captured_start = ts if self.captured_start is None else min(self.captured_start, ts)
+                self.captured_end = ts if self.captured_end is None else max(self.captured_end, ts)
+                if record.get('kind') not in ('http', 'ws_open', 'ws_frame', 'ws_close'):
+                    continue
+                heapq.heappush(pending, (ts, sequence, record))
+                sequence += 1
+                horizon = max(horizon, _completed_at(record))
+                # 响应时间不超过 reorder_window 时，开始时间更早的记录不会再出现在文件后面
+                while pending and pending[0][0] <= horizon - self.reorder_window:
+                    await dispatch(heapq.heappop(pending)[2])
+            while pending:
+                await dispatch(heapq.heappop(pending)[2])
+            # 录制被截断、没有 ws_close 的会话
+            for session in sessions.values():
+                session.frames.put_nowait(None)
+            while tasks:
+                await asyncio.wait(list(tasks))
+
+        for session, result in replayed:
+            result['captured_duration'] = round(session.duration, 4)
+        return results
+
+    def replay(self, path: str) -> Dict[str, Any]:
+        """回放并生成 TestRunner 格式的报告，附加录制/回放延迟对比"""
+        started_at = time.perf_counter()
+        results = asyncio.run(self.areplay(path))
+        elapsed = time.perf_counter() - started_at
+
+        self.runner.results.extend(results)
+        report = self.runner.generate_report()
+        report['replay'] = self.compare(results, elapsed)
+        return report
+
+    def compare(self, results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+        """按 (记录类型, 模型, 接口) 对比录制时与回放时的响应时间分位"""
+
+        def ms(values, pct):
+            return round(percentile(sorted(values), pct) * 1000, 2)
+
+        groups: Dict[str, Dict[str, List[float]]] = {}
+        for result in results:
+            if result.get('skipped'):
+                continue
+            key = f"{result['kind']} {result['model']} {result['endpoint']}"
+            group = groups.setdefault(key, {'captured': [], 'replayed': []})
+            captured = result.get('captured_response_time' if result['kind'] == 'http' else 'captured_duration')
+            if captured is not None:
+                group['captured'].append(captured)
+            if result.get('success'):
+                group['replayed'].append(result['response_time'])
+        return {
+            'speed': self.speed if self.speed > 0 else 'max',
+            'captured_duration': round((self.captured_end or 0.0) - (self.captured_start or 0.0), 3),
+            'replay_duration': round(elapsed, 3),
+            'skipped': sum(1 for r in results if r.get('skipped')),
+            'max_schedule_lag_ms': round(max(self.schedule_lag, default=0.0) * 1000, 2),
+            'response_time': {
+                key: {
+                    'captured': {f'p{p}_ms': ms(values['captured'], p) for p in (50, 99)},
+                    'replayed': {f'p{p}_ms': ms(values['replayed'], p) for p in (50, 99)},
+                }
+                for key, values in groups.items()
+            },
+        }
+
+def print_replay(report: Dict[str, Any], max_results: int = 20):
+    """打印 TestRunner 格式的结果和回放对比"""
+    from test_new_api_models import print_results
+
+    results = report['test_results']
+    print_results(dict(report, test_results=results[:max_results]))
+    if len(results) > max_results:
+        print(f"\n   （详细结果仅显示前 {max_results} 条，共 {len(results)} 条）")
+
+    replay = report['replay']
+    speed = "不限速" if replay['speed'] == 'max' else f"{replay['speed']}x"
+    print(f"\n📼 回放对比（速度 {speed}，录制 {replay['captured_duration']}s，"
+          f"回放 {replay['replay_duration']}s，最大调度滞后 {replay['max_schedule_lag_ms']}ms）:")
+    for key, item in replay['response_time'].items():
+        captured, replayed = item['captured'], item['replayed']
+        print(f"   {key}: 录制 p50 {captured['p50_ms']}ms p99 {captured['p99_ms']}ms  ->  "
+              f"回放 p50 {replayed['p50_ms']}ms p99 {replayed['p99_ms']}ms")
+    if replay['skipped']:
+        print(f"   ⚠️ {replay['skipped']} 个请求缺少请求体内容，未回放")
+
+def main():
+    """主函数"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="流量录制文件查看与回放")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    info_parser = subparsers.add_parser('info', help="查看录制文件概况")
+    info_parser.add_argument('capture')
+
+    replay_parser = subparsers.add_parser('replay', help="回放录制的流量")
+    replay_parser.add_argument('capture')
+    replay_parser.add_argument('--base-url', default=os.getenv("NEW_API_BASE_URL", "http://127.0.0.1:3000"))
+    replay_parser.add_argument('--speed', type=float, default=1.0, help="回放倍速，0 表示不限速")
+    replay_parser.add_argument('--max-concurrency', type=int, default=64)
+    replay_parser.add_argument('--max-in-flight', type=int, default=256,
+                               help="已调度但未完成的 HTTP 请求上限（含等待计划时间的请求）")
+    replay_parser.add_argument('--sample-rate', type=int, default=8000, help="实时会话音频采样率")
+    replay_parser.add_argument('--timeout', type=int, default=60)
+    replay_parser.add_argument('--output', default=None, help="报告（含回放对比）输出路径")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.capture):
+        print(f"❌ 录制文件不存在: {args.capture}")
+        sys.exit(1)
+    summary = summarize_capture(args.capture)
+
+    if args.command == 'info':
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return
+
+    from async_client import PoolConfig
+    from test_new_api_models import APIConfig
+
+    config = APIConfig(
+        base_url=args.base_url,
+        api_key=os.getenv("NEW_API_KEY", "sk-WFXP99kKWeu9BhV3UiypR6wj2tb2x5d08TLGWgiLHiDG9r8Q"),
+        timeout=args.timeout
+    )
+    print(f"📼 回放 {summary['http_requests']} 个 HTTP 请求、{summary['realtime_sessions']} 路实时会话，"
+          f"录制时长 {summary['duration']}s，速度 {args.speed if args.speed > 0 else '不限速'}")
+    replayer = TrafficReplayer(config, speed=args.speed, sample_rate=args.sample_rate,
+                               pool=PoolConfig(max_connections=args.max_concurrency,
+                                               max_concurrency=args.max_concurrency),
+                               max_in_flight=args.max_in_flight)
+    try:
+        report = replayer.replay(args.capture)
+    except KeyboardInterrupt:
+        print("\n\n⏹️  回放被用户中断")
+        return
+
+    print_replay(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 报告已保存至: {args.output}")
+
+if __name__ == "__main__":
+    main()